@@ -0,0 +1,218 @@
+"""Cliente HTTP de la API de predicción.
+
+Una única instancia por ``API_BASE_URL`` (vía ``st.cache_resource``) mantiene
+una ``requests.Session`` con pool de conexiones keep-alive, de modo que los
+reruns de Streamlit y las predicciones repetidas reutilizan las conexiones
+TCP ya abiertas.
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+from metrics import count, timer
+from wire_format import RECORDS, encode_batch
+
+# Timeouts (conexión, lectura) en segundos por endpoint
+ENDPOINT_TIMEOUTS = {
+    '/': (3.05, 10),
+    '/health': (3.05, 10),
+    '/predict': (3.05, 30),
+    '/batch_predict': (3.05, 60),
+}
+DEFAULT_TIMEOUT = (3.05, 30)
+
+# Respuestas que justifican reintentar la solicitud
+RETRY_STATUSES = frozenset([500, 502, 503, 504])
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5
+DEFAULT_POOL_SIZE = 16
+
+# Un 400 solo indica un formato no soportado si el error menciona el formato
+# (un 400 por datos inválidos no debe degradar el formato de todas las sesiones)
+FORMAT_ERROR_MARKERS = ('content-type', 'content type', 'media type', 'format')
+
+# Vigencia del último estado de /health antes de refrescarlo en segundo plano
+HEALTH_TTL = 15
+
+
+class ApiClient:
+    def __init__(self, base_url, pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF):
+        self.base_url = base_url.rstrip('/')
+        self.retries = retries
+        self.backoff = backoff
+
+        # Formatos de /batch_predict que la API rechazó (se usa records en su lugar)
+        self.unsupported_formats = set()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def timeout_for(self, endpoint):
+        return ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+
+    def request(self, method, endpoint, timeout=None, retries=None, **kwargs):
+        """Ejecuta una solicitud reintentando errores de red y respuestas 5xx.
+
+        Devuelve la última ``Response`` obtenida (aunque sea un error HTTP) o
+        propaga la última excepción de ``requests`` si ningún intento respondió.
+        """
+        url = f"{self.base_url}{endpoint}"
+        timeout = timeout if timeout is not None else self.timeout_for(endpoint)
+        retries = self.retries if retries is None else retries
+
+        attempt = 0
+        while True:
+            try:
+                with timer('red', endpoint=endpoint):
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+                count('solicitudes_http', endpoint=endpoint, estado=response.status_code)
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    response.attempts = attempt + 1
+                    return response
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                count('solicitudes_http', endpoint=endpoint, estado=type(e).__name__)
+                if attempt >= retries:
+                    raise
+            count('reintentos', endpoint=endpoint)
+            attempt += 1
+            time.sleep(self.backoff * (2 ** (attempt - 1)))
+
+    def get(self, endpoint, **kwargs):
+        return self.request('GET', endpoint, **kwargs)
+
+    def post(self, endpoint, **kwargs):
+        return self.request('POST', endpoint, **kwargs)
+
+    def health(self, **kwargs):
+        return self.get('/health', **kwargs)
+
+    def root(self):
+        return self.get('/')
+
+    def predict(self, record):
+        return self.post('/predict', json=record)
+
+    def batch_predict(self, frame, wire_format=RECORDS, **kwargs):
+        """Envía un bloque (DataFrame) a ``/batch_predict`` en ``wire_format``.
+
+        Si la API rechaza un formato distinto de ``records`` (415, o 400 con un
+        error de formato), se recuerda como no soportado y el bloque se reenvía
+        como ``records``. Otros 400 se devuelven sin cambiar el formato.
+        """
+        if wire_format in self.unsupported_formats:
+            wire_format = RECORDS
+        body, headers = encode_batch(frame, wire_format)
+        response = self.post('/batch_predict', data=body, headers=headers, **kwargs)
+        if wire_format != RECORDS and rejects_format(response):
+            self.unsupported_formats.add(wire_format)
+            return self.batch_predict(frame, RECORDS, **kwargs)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+def rejects_format(response):
+    """``True`` si la respuesta rechaza el formato del cuerpo y no sus datos."""
+    if response.status_code == 415:
+        return True
+    if response.status_code != 400:
+        return False
+    error = response.text.lower()
+    return any(marker in error for marker in FORMAT_ERROR_MARKERS)
+
+
+@st.cache_resource(show_spinner=False)
+def get_api_client(base_url):
+    # Compartido entre reruns y sesiones: una sesión HTTP por URL de la API
+    return ApiClient(base_url)
+
+
+@dataclass
+class HealthStatus:
+    healthy: bool
+    data: dict
+    response_time: float
+    checked_at: float
+
+    @property
+    def age(self):
+        return time.time() - self.checked_at
+
+
+class HealthMonitor:
+    """Estado de ``/health`` cacheado con TTL y refrescado en segundo plano.
+
+    ``status()`` nunca bloquea: devuelve el último estado conocido (o ``None``
+    si aún no hay ninguno) y, si está vencido, lanza un sondeo en un hilo.
+    Solo ``wait()`` bloquea, para las páginas que van a enviar predicciones.
+    """
+
+    def __init__(self, client, ttl=HEALTH_TTL):
+        self.client = client
+        self.ttl = ttl
+        self._status = None
+        self._lock = threading.Lock()
+        self._probe_done = None
+
+    def probe(self):
+        try:
+            start_time = time.time()
+            response = self.client.health(retries=0)
+            response_time = (time.time() - start_time) * 1000
+
+            if response.status_code == 200:
+                return HealthStatus(True, response.json(), response_time, time.time())
+            return HealthStatus(False, {"error": f"Error {response.status_code}"}, response_time, time.time())
+        except requests.exceptions.Timeout:
+            read_timeout = self.client.timeout_for('/health')[1]
+            error = f"Timeout - La API no respondió en {read_timeout} segundos"
+        except requests.exceptions.ConnectionError:
+            error = "Error de conexión - Verifique la URL"
+        except Exception as e:
+            error = str(e)
+        return HealthStatus(False, {"error": error}, 0, time.time())
+
+    def _run_probe(self, done):
+        status = self.probe()
+        with self._lock:
+            self._status = status
+            self._probe_done = None
+        done.set()
+
+    def refresh(self):
+        """Lanza un sondeo en segundo plano (si no hay uno en curso)."""
+        with self._lock:
+            if self._probe_done is not None:
+                return self._probe_done
+            done = self._probe_done = threading.Event()
+        threading.Thread(target=self._run_probe, args=(done,), daemon=True).start()
+        return done
+
+    def status(self):
+        with self._lock:
+            status = self._status
+        if status is None or status.age > self.ttl:
+            self.refresh()
+        return status
+
+    def wait(self, timeout=None, force=False):
+        """Bloquea hasta tener un estado vigente y lo devuelve."""
+        status = self.status()
+        if status is not None and status.age <= self.ttl and not force:
+            return status
+        self.refresh().wait(timeout)
+        with self._lock:
+            return self._status
+
+
+@st.cache_resource(show_spinner=False)
+def get_health_monitor(base_url):
+    return HealthMonitor(get_api_client(base_url))
@@ -1,13 +1,37 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import requests
-import json
-import matplotlib.pyplot as plt
-import seaborn as sns
 from datetime import datetime
 import time
-import io
+from api_client import get_api_client, get_health_monitor
+from local_model import DEFAULT_MODEL_PATH, get_local_client, get_local_health_monitor, model_available
+from prediction_cache import PredictionCache, get_prediction_cache, model_version_of
+from prediction_log import get_prediction_log, prediction_record, read_log
+from risk_table import get_risk_tables
+from session_data import MB, current_session_id, get_session_frames, process_memory
+from wire_format import available_formats, negotiate
+from batch_engine import (
+    DEFAULT_CHUNK_SIZE, DEFAULT_MAX_WORKERS, DEFAULT_MAX_RETRIES, STREAM_PREVIEW_ROWS
+)
+from batch_jobs import DONE, FAILED, QUEUED, RUNNING, get_job_manager
+import charts
+import exports
+from charts import show_chart
+from categorical import (
+    FEATURE_VOCABULARIES, REQUIRED_COLUMNS,
+    collapse_top_n, to_categorical
+)
+from eda_stats import EdaStats, iter_csv_stats
+from metrics import METRICS, timer
+from result_store import file_fingerprint, get_result_store
+from sketches import HyperLogLog
+from synthetic import iter_population
+from validation import rejected_rows, validate_batch
+
+# Archivos por encima de este tamaño se procesan en modo streaming por defecto
+STREAMING_THRESHOLD_MB = 50
+# Registros de una consulta (corridas o predicciones guardadas) que se muestran en pantalla
+QUERY_PREVIEW_ROWS = 1_000
 
 # Configuración de la página
 st.set_page_config(
@@ -58,37 +82,64 @@ app_mode = st.sidebar.selectbox(
     ["🏠 Inicio", "📊 Análisis Exploratorio", "🔮 Predicción Individual", "📁 Predicción por Lotes", "📈 Resultados", "ℹ️ Acerca del Modelo"]
 )
 
+# Motor de inferencia: la API HTTP o el modelo cargado en este mismo proceso
+use_local_model = st.sidebar.toggle(
+    "🖥️ Modelo local (sin API)",
+    help="Predice con el modelo serializado dentro de la app, sin red ni JSON. "
+         "Requiere el archivo del modelo en el servidor"
+)
+if use_local_model:
+    # La ruta es configuración del servidor (SALUD_MODEL_PATH), no de la interfaz:
+    # cargar el modelo deserializa el archivo
+    MODEL_PATH = DEFAULT_MODEL_PATH
+    st.sidebar.caption(f"Archivo del modelo: `{MODEL_PATH}`")
+    if not model_available(MODEL_PATH):
+        st.sidebar.error(f"No se encontró el modelo en {MODEL_PATH}; se usa la API")
+        use_local_model = False
+
+if use_local_model:
+    try:
+        # Mismos métodos que el cliente HTTP; el modelo se carga una vez por proceso
+        api_client = get_local_client(MODEL_PATH)
+    except Exception as e:  # archivo dañado o que no es un modelo: se sigue con la API
+        st.sidebar.error(f"No se pudo cargar el modelo {MODEL_PATH}: {e}; se usa la API")
+        use_local_model = False
+
 # URL base de la API
-API_BASE_URL = st.sidebar.text_input("URL de la API:", "http://localhost:5000")
+API_BASE_URL = st.sidebar.text_input("URL de la API:", "http://localhost:5000", disabled=use_local_model)
+
+if use_local_model:
+    BACKEND_NAME = f"Modelo local: {MODEL_PATH}"
+else:
+    # Cliente HTTP compartido (pool de conexiones keep-alive por URL)
+    api_client = get_api_client(API_BASE_URL)
+    BACKEND_NAME = f"API: {API_BASE_URL}"
+
+# Caché de predicciones compartida entre sesiones (y tabla de riesgo) por fuente de predicciones
+PREDICTION_SOURCE = f"local:{MODEL_PATH}" if use_local_model else API_BASE_URL
+prediction_cache = get_prediction_cache(PREDICTION_SOURCE)
+# Registro persistente de las predicciones individuales guardadas
+prediction_log = get_prediction_log()
 
 # Información de conexión en sidebar
 st.sidebar.markdown("---")
 st.sidebar.subheader("Estado de Conexión")
 
-# Función mejorada para verificar estado de la API
-def check_api_health():
-    try:
-        start_time = time.time()
-        response = requests.get(f"{API_BASE_URL}/health", timeout=10)
-        response_time = (time.time() - start_time) * 1000
-        
-        if response.status_code == 200:
-            data = response.json()
-            return True, data, response_time
-        else:
-            return False, {"error": f"Error {response.status_code}"}, response_time
-    except requests.exceptions.Timeout:
-        return False, {"error": "Timeout - La API no respondió en 10 segundos"}, 0
-    except requests.exceptions.ConnectionError:
-        return False, {"error": "Error de conexión - Verifique la URL"}, 0
-    except Exception as e:
-        return False, {"error": str(e)}, 0
+# Estado de la API: último estado conocido, refrescado en segundo plano
+health_monitor = get_local_health_monitor(MODEL_PATH) if use_local_model else get_health_monitor(API_BASE_URL)
+
+def read_api_health(health):
+    if health is None:
+        return False, {}, 0
+    return health.healthy, health.data, health.response_time
 
-# Verificar estado de la API
-api_healthy, api_status, response_time = check_api_health()
+health = health_monitor.status()
+api_healthy, api_status, response_time = read_api_health(health)
 
-if api_healthy:
-    st.sidebar.success("✅ API Conectada")
+if health is None:
+    st.sidebar.info("⏳ Verificando conexión con la API...")
+elif api_healthy:
+    st.sidebar.success("✅ Modelo Local" if use_local_model else "✅ API Conectada")
     st.sidebar.metric("Tiempo Respuesta", f"{response_time:.0f} ms")
     if api_status.get('model_loaded'):
         st.sidebar.success("✅ Modelo Cargado")
@@ -98,11 +149,290 @@ else:
     st.sidebar.error("API No Disponible")
     st.sidebar.error(f"Error: {api_status.get('error', 'Desconocido')}")
 
+if health is not None:
+    st.sidebar.caption(f"Última verificación hace {health.age:.0f} s")
+if st.sidebar.button("🔄 Verificar ahora"):
+    health_monitor.wait(force=True)
+    st.rerun()
+
+# Tabla de riesgo precalculada: solo vale para la versión del modelo que reporta /health
+risk_tables = get_risk_tables(PREDICTION_SOURCE)
+has_model_version = api_healthy and bool(api_status.get('model_version'))
+risk_table = (risk_tables.current(model_version_of(api_status), api_client,
+                                  wire_format=negotiate(api_status.get('batch_formats')))
+              if has_model_version else None)
+
+with st.sidebar:
+    @st.fragment(run_every=1 if risk_tables.building is not None else None)
+    def risk_table_panel():
+        with st.expander("🧮 Tabla de Riesgo"):
+            table = risk_tables.table if has_model_version else None
+            if risk_tables.building is not None:
+                st.progress(risk_tables.progress, text=f"Calculando para el modelo {risk_tables.building}...")
+            elif table is not None and table.version == model_version_of(api_status):
+                built = f" en {risk_tables.built_in:.1f} s" if risk_tables.built_in else ""
+                st.caption(f"Vigente para el modelo {table.version}{built}: {len(table):,} combinaciones "
+                           f"({table.nbytes / 1024**2:.1f} MB). Las predicciones de esas combinaciones no "
+                           f"llaman a la API")
+            else:
+                st.caption("Sin tabla para la versión actual del modelo")
+            if risk_tables.error:
+                st.error(f"❌ {risk_tables.error}")
+            if st.button("🧮 Calcular tabla", disabled=not has_model_version or risk_tables.building is not None,
+                         help="Evalúa el modelo sobre todas las combinaciones de categorías (por municipio del "
+                              "catálogo); se recalcula sola cuando cambia la versión del modelo"):
+                risk_tables.build(api_client, model_version_of(api_status),
+                                  wire_format=negotiate(api_status.get('batch_formats')))
+                st.rerun()
+        # Terminó el cálculo para la versión actual: recargar para que las páginas usen la tabla
+        finished = risk_tables.table if risk_tables.building is None else None
+        if (risk_table is None and has_model_version and finished is not None
+                and finished.version == model_version_of(api_status)):
+            st.rerun()
+    
+    risk_table_panel()
+
+# Reporte de valores fuera del vocabulario del modelo
+def show_unknown_values(unknown):
+    if not unknown:
+        return
+    with st.expander(f"⚠️ Valores fuera del vocabulario en {len(unknown)} columna(s)"):
+        for col, values in unknown.items():
+            listed = ', '.join(f"{value} ({count:,})" for value, count in list(values.items())[:10])
+            more = f" y {len(values) - 10} más" if len(values) > 10 else ""
+            st.write(f"- **{col}**: {listed}{more}")
+
+# Trabajos por lotes en segundo plano (compartidos por proceso, ids por sesión)
+job_manager = get_job_manager()
+# Resultados guardados de trabajos anteriores (sobreviven a la sesión)
+result_store = get_result_store()
+
+JOB_STATUS_ICONS = {QUEUED: "⏳", RUNNING: "🔄", DONE: "✅", FAILED: "❌"}
+
+def render_job_progress(job):
+    """Estado, avance y conteos parciales de un trabajo."""
+    st.write(f"{JOB_STATUS_ICONS[job.status]} **{job.id}** · {job.file_name} · {job.status}")
+    if job.status == RUNNING:
+        if job.total_rows:
+            text = f"📊 {job.done_rows:,} de {job.total_rows:,} registros procesados"
+        else:
+            text = f"📊 {job.done_rows:,} registros procesados"
+        st.progress(job.progress, text=text)
+        partial = f", {job.high_risk_rows:,} de alto riesgo" if job.high_risk_rows is not None else ""
+        st.caption(f"{job.rows_per_second:,.0f} registros/s{partial} · {job.elapsed:.0f} s")
+    elif job.status == DONE:
+        st.caption(f"{job.total_rows:,} registros, {job.high_risk_rows:,} de alto riesgo en {job.elapsed:.1f} s")
+        if job.storing:
+            st.caption("💾 Guardando el resultado en el almacén...")
+        elif job.run_id is not None:
+            st.caption(f"🗄️ Guardado como corrida #{job.run_id}")
+        elif job.store_error:
+            st.warning(f"⚠️ {job.store_error}")
+    elif job.status == FAILED:
+        st.error(f"❌ {job.error}")
+        if job.error_detail is not None:
+            st.write("Detalles del error:", job.error_detail)
+
+def upload_fingerprint(uploaded_file):
+    """Huella del archivo subido, calculada una vez por archivo y sesión."""
+    fingerprints = st.session_state.setdefault('upload_fingerprints', {})
+    if uploaded_file.file_id not in fingerprints:
+        fingerprints[uploaded_file.file_id] = file_fingerprint(uploaded_file.getvalue())
+    return fingerprints[uploaded_file.file_id]
+
+def run_label(runs, run_id):
+    run = runs.loc[run_id]
+    return f"#{run_id} · {run.file_name} · {run.processed_at.replace('T', ' ')} ({run.total_rows:,} registros)"
+
+def render_batch_summary(job):
+    """Resumen, gráficos y descargas de un trabajo completado."""
+    batch_result = job.result
+    total = job.total_rows
+    alto_riesgo = job.high_risk_rows
+    result_view = batch_result.preview if job.streaming else job.data
+    processing_time = batch_result.elapsed
+    
+    st.success(
+        f"✅ {total:,} predicciones completadas en {processing_time:.1f} segundos "
+        f"({batch_result.rows_per_second:,.0f} registros/s, {batch_result.n_chunks} bloques, "
+        f"{batch_result.retries} reintentos)"
+    )
+    if job.wire_format in api_client.unsupported_formats:
+        st.caption(f"La API no aceptó el formato '{job.wire_format}'; se usó 'records'")
+    else:
+        st.caption(f"Formato de transmisión: {job.wire_format}")
+    if job.rejected_rows:
+        st.warning(f"⚠️ {job.rejected_rows:,} registros rechazados por la validación no se enviaron a la API")
+    
+    # Mostrar resumen
+    st.subheader("📈 Resumen de Predicciones")
+    
+    summary_col1, summary_col2, summary_col3, summary_col4 = st.columns(4)
+    
+    bajo_riesgo = total - alto_riesgo
+    tasa_alto_riesgo = (alto_riesgo / total) * 100 if total else 0.0
+    
+    with summary_col1:
+        st.metric("Total Procesado", f"{total:,}")
+    
+    with summary_col2:
+        st.metric("Alto Riesgo", f"{alto_riesgo:,}")
+    
+    with summary_col3:
+        st.metric("Bajo Riesgo", f"{bajo_riesgo:,}")
+    
+    with summary_col4:
+        st.metric("Tasa Alto Riesgo", f"{tasa_alto_riesgo:.1f}%")
+    
+    # Deduplicación y caché
+    dedup_col1, dedup_col2, dedup_col3, dedup_col4 = st.columns(4)
+    
+    with dedup_col1:
+        st.metric("Combinaciones Únicas", f"{batch_result.unique_rows:,}")
+    
+    with dedup_col2:
+        st.metric("Factor de Deduplicación", f"{batch_result.dedup_ratio:,.1f}x")
+    
+    with dedup_col3:
+        st.metric("Enviadas a la API", f"{batch_result.sent_rows:,}")
+    
+    with dedup_col4:
+        st.metric("Desde Caché", f"{batch_result.cache_hits:,}")
+    
+    if batch_result.table_hits:
+        st.caption(f"🧮 {batch_result.table_hits:,} combinaciones resueltas con la tabla de riesgo precalculada")
+    
+    # Visualización rápida
+    show_chart(charts.prediction_summary, bajo_riesgo, alto_riesgo, figsize=(12, 4))
+    
+    # Mostrar resultados detallados
+    st.subheader("📋 Resultados Detallados")
+    if job.streaming:
+        st.caption(f"Primeros {len(result_view):,} registros; descargue el CSV para ver el resultado completo")
+    st.dataframe(result_view, width="stretch")
+    
+    # Descargar resultados
+    st.subheader("💾 Descargar Resultados")
+    
+    # Los archivos se generan al hacer clic (y quedan en caché); no en cada rerun
+    formats = exports.available_formats()
+    export_format = st.radio(
+        "Formato:", formats, horizontal=True, key=f"export_format_{job.id}",
+        format_func=lambda fmt: exports.EXPORT_FORMATS[fmt][0],
+        help="El CSV comprimido y Parquet ocupan bastante menos y se descargan más rápido"
+    )
+    
+    def job_export(name, file_obj, frame):
+        if job.streaming:
+            return exports.csv_file_export(file_obj, f"{job.id}_{name}", export_format)
+        return exports.frame_export(frame, export_format)
+    
+    output_col1, output_col2 = st.columns(2)
+    
+    with output_col1:
+        st.download_button(
+            label="📥 Descargar Resultado Completo",
+            data=job_export('resultados', batch_result.output if job.streaming else None, job.data),
+            file_name=exports.download_name(f"resultados_prediccion_{job.id}", export_format),
+            mime=exports.mime_type(export_format),
+            key=f"download_{job.id}"
+        )
+    
+    with output_col2:
+        # Solo alto riesgo
+        if alto_riesgo > 0:
+            st.download_button(
+                label="📥 Descargar Solo Alto Riesgo",
+                data=job_export('alto_riesgo', batch_result.high_risk_output if job.streaming else None,
+                                lambda: job.data[job.data['prediccion'] == 1]),
+                file_name=exports.download_name(f"alto_riesgo_{job.id}", export_format),
+                mime=exports.mime_type(export_format),
+                key=f"download_high_{job.id}"
+            )
+    
+    if job.rejected_rows:
+        st.download_button(
+            label="📥 Descargar Filas Rechazadas",
+            data=job_export('rechazadas', batch_result.rejected_output if job.streaming else None, job.rejected),
+            file_name=exports.download_name(f"filas_rechazadas_{job.id}", export_format),
+            mime=exports.mime_type(export_format),
+            key=f"download_rejected_{job.id}"
+        )
+    
+    # Resumen ejecutivo
+    with st.expander("📊 Resumen Ejecutivo"):
+        st.write(f"""
+        **Resumen del Procesamiento por Lotes**
+        
+        - **Archivo procesado**: {job.file_name}
+        - **Total de registros**: {total:,}
+        - **Registros de alto riesgo**: {alto_riesgo:,} ({tasa_alto_riesgo:.1f}%)
+        - **Registros de bajo riesgo**: {bajo_riesgo:,} ({(100-tasa_alto_riesgo):.1f}%)
+        - **Registros rechazados**: {job.rejected_rows:,}
+        - **Tiempo de procesamiento**: {processing_time:.1f} segundos
+        - **Fecha y hora**: {datetime.fromtimestamp(job.finished_at).strftime('%Y-%m-%d %H:%M:%S')}
+        """)
+
+# Memoria: la del proceso y la de los DataFrames de esta sesión; como el panel de
+# rendimiento, se llena al final (tras cargar los de esta ejecución) o antes de ``stop_page``
+memory_panel = st.sidebar.empty()
+
+def render_memory_panel():
+    session_frames = get_session_frames()
+    process_rss = process_memory()
+    label = f"🧠 Memoria · {process_rss / MB:,.0f} MB" if process_rss else "🧠 Memoria"
+    with memory_panel.container(), st.expander(label):
+        session_id = current_session_id()
+        session_in_memory, session_on_disk = session_frames.usage(session_id)
+        total_in_memory, total_on_disk = session_frames.usage()
+        st.metric("Memoria del Proceso", f"{process_rss / MB:,.0f} MB" if process_rss else "N/A")
+        st.progress(min(session_in_memory / session_frames.session_budget, 1.0),
+                    text=f"Esta sesión: {session_in_memory / MB:,.0f} de {session_frames.session_budget / MB:,.0f} MB")
+        st.caption(f"En disco: {session_on_disk / MB:,.0f} MB de esta sesión · Todas las sesiones: "
+                   f"{total_in_memory / MB:,.0f} MB en memoria (máximo {session_frames.process_budget / MB:,.0f} MB), "
+                   f"{total_on_disk / MB:,.0f} MB en disco")
+        if st.button("💾 Liberar memoria de esta sesión", disabled=not session_in_memory,
+                     help="Manda a disco los resultados de esta sesión; se recargan al volver a consultarlos"):
+            session_frames.spill_owner(session_id)
+            st.rerun()
+
+# Panel de rendimiento: se reserva su lugar en la barra lateral y se llena al final del
+# script (o antes de ``stop_page``) para incluir las etapas de esta ejecución
+performance_panel = st.sidebar.empty()
+
+def render_performance_panel():
+    with performance_panel.container(), st.expander("⏱️ Rendimiento"):
+        stage_table = METRICS.stage_table()
+        if stage_table.empty:
+            st.caption("Aún no hay etapas medidas en este proceso.")
+        else:
+            st.dataframe(stage_table, hide_index=True, width="stretch")
+            counter_table = METRICS.counter_table()
+            if not counter_table.empty:
+                st.dataframe(counter_table, hide_index=True, width="stretch")
+        st.caption(f"Acumulado del proceso desde {datetime.fromtimestamp(METRICS.started_at):%Y-%m-%d %H:%M:%S}")
+        st.download_button(
+            label="📥 Exportar (Prometheus)",
+            data=METRICS.to_prometheus(),
+            file_name=f"metricas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prom",
+            mime="text/plain",
+            key="download_metrics"
+        )
+        if st.button("🗑️ Reiniciar métricas"):
+            METRICS.reset()
+            st.rerun()
+
+def stop_page():
+    """``st.stop()`` que antes llena los paneles de la barra lateral."""
+    render_memory_panel()
+    render_performance_panel()
+    st.stop()
+
 # Página de Inicio
 if app_mode == "🏠 Inicio":
     st.header("Bienvenido al Sistema de Clasificación de Salud")
     
-    if not api_healthy:
+    if health is not None and not api_healthy:
         st.error("""**La API no está disponible**""")
     
     # Resumen del sistema
@@ -112,7 +442,7 @@ if app_mode == "🏠 Inicio":
     
     with col1:
         st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-        st.metric("Estado API", "Operacional" if api_healthy else "Offline")
+        st.metric("Estado API", "Operacional" if api_healthy else ("Verificando" if health is None else "Offline"))
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
@@ -205,59 +535,65 @@ elif app_mode == "📊 Análisis Exploratorio":
         horizontal=True
     )
     
+    approximate = st.toggle(
+        "⚡ Modo aproximado (columnas de alta cardinalidad)",
+        help="Las columnas con más de 100 categorías se resumen con un top-K (Space-Saving) y un "
+             "conteo de valores únicos (HyperLogLog) de memoria acotada, en lugar de contarse exactamente"
+    )
+    
     if analysis_type == "Datos de Ejemplo":
+        col1, col2 = st.columns(2)
+        with col1:
+            n_samples = st.number_input("Número de registros", min_value=100, max_value=50_000_000,
+                                        value=2000, step=1000)
+        with col2:
+            seed = st.number_input("Semilla", min_value=0, value=42, step=1)
+        
         if st.button("🎲 Generar Datos de Ejemplo", type="primary"):
-            with st.spinner("Generando datos de ejemplo..."):
-                # Simular datos más realistas basados en la estructura del notebook
-                np.random.seed(42)
-                n_samples = 2000
-                
-                # Crear datos balanceados entre contributivo y subsidiado
-                regimen_choices = ['Contributivo', 'Subsidiado']
-                regimen_probs = [0.4, 0.6]  # Más subsidiado como en los datos reales
-                
-                sample_data = pd.DataFrame({
-                    'Genero': np.random.choice(['Masculino', 'Femenino'], n_samples, p=[0.48, 0.52]),
-                    'Grupo_etario': np.random.choice([
-                        '15 a 19', '19 a 45', '45 a 50', '50 a 55', 
-                        '55 a 60', '60 a 65', '65 a 70', '70 a 75', '> 75'
-                    ], n_samples, p=[0.1, 0.25, 0.15, 0.12, 0.1, 0.08, 0.07, 0.06, 0.07]),
-                    'Régimen': np.random.choice(regimen_choices, n_samples, p=regimen_probs),
-                    'Tipo_afiliado': np.random.choice([
-                        'COTIZANTE', 'BENEFICIARIO', 'CABEZA DE FAMILIA', 'ADICIONAL'
-                    ], n_samples, p=[0.4, 0.35, 0.2, 0.05]),
-                    'Departamento': np.random.choice([
-                        'BOGOTA D.C.', 'ANTIOQUIA', 'VALLE', 'CUNDINAMARCA', 
-                        'ATLANTICO', 'SANTANDER', 'BOLIVAR', 'NARIÑO'
-                    ], n_samples),
-                    'Zona': np.random.choice([
-                        'Urbana', 'Rural', 'Urbana-Cabecera Municipal'
-                    ], n_samples, p=[0.6, 0.25, 0.15]),
-                    'Nivel_Sisben': np.random.choice([
-                        '1', '2', '3', '4', 'NO APLICA'
-                    ], n_samples, p=[0.3, 0.25, 0.2, 0.15, 0.1])
-                })
-                
-                st.session_state.sample_data = sample_data
-                st.success(f"✅ Se generaron {n_samples} registros de ejemplo!")
+            # Población sintética por bloques: memoria acotada aunque se pidan millones de filas
+            progress_bar = st.progress(0.0, text="🎲 Generando datos de ejemplo...")
+            stats = EdaStats(approximate=approximate)
+            for chunk in iter_population(int(n_samples), seed=int(seed), extra_columns=True):
+                stats.update(chunk)
+                progress_bar.progress(stats.rows / n_samples, text=f"🎲 {stats.rows:,} registros generados")
+            progress_bar.empty()
+            st.session_state.eda_stats = stats
+            st.session_state.eda_source = None
+            st.success(f"✅ Se generaron {stats.rows:,} registros de ejemplo!")
     
     else:  # Subir Datos Propios
         uploaded_file = st.file_uploader("📤 Subir archivo CSV", type="csv")
-        if uploaded_file is not None:
+        eda_source = (uploaded_file.file_id, approximate) if uploaded_file is not None else None
+        if uploaded_file is not None and st.session_state.get('eda_source') != eda_source:
+            # Lectura por bloques: los gráficos parciales se refinan mientras avanza
+            progress_bar = st.progress(0.0, text="📊 Leyendo archivo...")
+            live_chart = st.empty()
             try:
-                sample_data = pd.read_csv(uploaded_file)
-                st.session_state.sample_data = sample_data
-                st.success(f"✅ Archivo cargado: {uploaded_file.name}")
+                for stats in iter_csv_stats(uploaded_file, approximate=approximate):
+                    fraction = min(uploaded_file.tell() / max(uploaded_file.size, 1), 1.0)
+                    progress_bar.progress(fraction, text=f"📊 {stats.rows:,} registros leídos")
+                    live_columns = stats.categorical_columns
+                    if live_columns:
+                        with live_chart.container():
+                            st.caption(f"Distribución parcial de {live_columns[0]}")
+                            st.bar_chart(stats.value_counts(live_columns[0]).head(30))
+                st.session_state.eda_stats = stats
+                st.session_state.eda_source = eda_source
             except Exception as e:
                 st.error(f"❌ Error al cargar el archivo: {str(e)}")
+            progress_bar.empty()
+            live_chart.empty()
+        if uploaded_file is not None and st.session_state.get('eda_source') == eda_source:
+            st.success(f"✅ Archivo cargado: {uploaded_file.name}")
+            show_unknown_values(st.session_state.eda_stats.unknown)
     
     # Mostrar análisis si hay datos
-    if 'sample_data' in st.session_state:
-        data = st.session_state.sample_data
+    if 'eda_stats' in st.session_state:
+        stats = st.session_state.eda_stats
         
         # Mostrar datos
         st.subheader("📋 Vista Previa de Datos")
-        st.dataframe(data.head(10), use_container_width=True)
+        st.dataframe(stats.preview, width="stretch")
         
         # Estadísticas básicas
         st.subheader("📊 Estadísticas Descriptivas")
@@ -266,21 +602,32 @@ elif app_mode == "📊 Análisis Exploratorio":
         
         with col1:
             st.write("**Información General**")
-            st.write(f"Registros totales: {len(data):,}")
-            st.write(f"Variables: {len(data.columns)}")
-            st.write(f"Memoria usada: {data.memory_usage(deep=True).sum() / 1024**2:.2f} MB")
+            st.write(f"Registros totales: {stats.rows:,}")
+            st.write(f"Variables: {len(stats.columns)}")
+            st.write(f"Memoria usada: {stats.memory_bytes / 1024**2:.2f} MB")
+            st.write(f"Valores nulos: {int(stats.nulls.sum()):,}")
         
         with col2:
             st.write("**Tipos de Datos**")
-            dtype_counts = data.dtypes.value_counts()
+            dtype_counts = stats.dtype_counts()
             for dtype, count in dtype_counts.items():
                 st.write(f"- {dtype}: {count}")
         
+        with st.expander("🔢 Valores únicos por columna"):
+            unique_counts = pd.DataFrame({
+                'Valores únicos': [stats.nunique(col) for col in stats.columns],
+                'Aproximado': ['≈' if stats.nunique_is_estimate(col) else '' for col in stats.columns],
+            }, index=pd.Index(stats.columns, name='Columna'))
+            st.dataframe(unique_counts, width="stretch")
+            if any(stats.nunique_is_estimate(col) for col in stats.columns):
+                error = next(iter(stats.distinct.values())).relative_error
+                st.caption(f"Los conteos aproximados (HyperLogLog) tienen un error estándar de ±{error:.1%}")
+        
         # Visualizaciones
         st.subheader("📈 Visualizaciones")
         
         # Seleccionar variables para visualizar
-        available_columns = data.select_dtypes(include=['object']).columns.tolist()
+        available_columns = stats.categorical_columns
         
         if available_columns:
             viz_col1, viz_col2 = st.columns(2)
@@ -298,24 +645,22 @@ elif app_mode == "📊 Análisis Exploratorio":
             
             with viz_col2:
                 if chart_type == "Barras":
-                    fig, ax = plt.subplots(figsize=(10, 6))
-                    data[x_axis].value_counts().plot(kind='bar', ax=ax, color='skyblue')
-                    ax.set_title(f'Distribución de {x_axis}')
-                    ax.set_ylabel('Frecuencia')
-                    plt.xticks(rotation=45)
-                    st.pyplot(fig)
+                    show_chart(charts.bar_counts, stats.value_counts(x_axis), f'Distribución de {x_axis}')
                 
                 elif chart_type == "Torta":
-                    fig, ax = plt.subplots(figsize=(8, 8))
-                    counts = data[x_axis].value_counts()
-                    ax.pie(counts.values, labels=counts.index, autopct='%1.1f%%', startangle=90)
-                    ax.set_title(f'Distribución de {x_axis}')
-                    st.pyplot(fig)
+                    show_chart(charts.pie_counts, stats.pie_counts(x_axis), f'Distribución de {x_axis}',
+                               figsize=(8, 8))
                 
                 else:  # Conteo
                     st.write(f"**Distribución de {x_axis}:**")
-                    counts = data[x_axis].value_counts()
+                    counts = stats.top_counts(x_axis) if stats.is_approximate(x_axis) else stats.value_counts(x_axis)
                     st.dataframe(counts)
+                
+                if stats.is_approximate(x_axis):
+                    sketch = stats.top[x_axis]
+                    st.caption(f"Top {sketch.k} aproximado (Space-Saving): cada conteo sobrestima a lo sumo "
+                               f"en su columna 'error'; un valor fuera del top aparece a lo sumo "
+                               f"{sketch.min_count:,} veces")
             
             # Análisis cruzado
             if len(available_columns) > 1:
@@ -324,21 +669,22 @@ elif app_mode == "📊 Análisis Exploratorio":
                 col_x = st.selectbox("Variable X:", available_columns, key='x_var')
                 col_y = st.selectbox("Variable Y:", available_columns, key='y_var')
                 
-                if col_x != col_y:
-                    crosstab = pd.crosstab(data[col_x], data[col_y], normalize='index') * 100
-                    
-                    fig, ax = plt.subplots(figsize=(12, 8))
-                    crosstab.plot(kind='bar', ax=ax, stacked=True)
-                    ax.set_title(f'Relación entre {col_x} y {col_y}')
-                    ax.set_ylabel('Porcentaje (%)')
-                    plt.xticks(rotation=45)
-                    plt.legend(title=col_y, bbox_to_anchor=(1.05, 1), loc='upper left')
-                    st.pyplot(fig)
+                if col_x != col_y and not stats.cube.has_pair(col_x, col_y):
+                    st.info("ℹ️ Estas dos variables tienen demasiadas categorías para cruzarlas")
+                elif col_x != col_y:
+                    crosstab = stats.crosstab(col_x, col_y, normalize='index') * 100
+                    show_chart(charts.stacked_percent, crosstab, f'Relación entre {col_x} y {col_y}', col_y,
+                               figsize=(12, 8))
 
 # Página de Predicción Individual
 elif app_mode == "🔮 Predicción Individual":
     st.header("Predicción Individual")
     
+    # Esta página sí necesita la API: esperar a un estado vigente
+    if health is None:
+        with st.spinner("Verificando conexión con la API..."):
+            api_healthy, api_status, response_time = read_api_health(health_monitor.wait())
+    
     if not api_healthy:
         st.error("""
         ❌ **API no disponible**
@@ -349,7 +695,7 @@ elif app_mode == "🔮 Predicción Individual":
         2. Que el modelo esté cargado
         3. La conexión de red
         """)
-        st.stop()
+        stop_page()
     
     # Formulario para entrada de datos
     with st.form("prediction_form"):
@@ -358,33 +704,15 @@ elif app_mode == "🔮 Predicción Individual":
         col1, col2 = st.columns(2)
         
         with col1:
-            genero = st.selectbox("Género *", ["Masculino", "Femenino"])
-            grupo_etario = st.selectbox("Grupo Etario *", [
-                "< 1", "1 a 5", "5 a 15", "15 a 19", "19 a 45",
-                "45 a 50", "50 a 55", "55 a 60", "60 a 65",
-                "65 a 70", "70 a 75", "> 75"
-            ])
-            tipo_afiliado = st.selectbox("Tipo de Afiliado *", [
-                "COTIZANTE", "BENEFICIARIO", "CABEZA DE FAMILIA",
-                "ADICIONAL", "OTRO MIEMBRO DEL NUCLEO FAMILIAR"
-            ])
+            genero = st.selectbox("Género *", FEATURE_VOCABULARIES['Genero'])
+            grupo_etario = st.selectbox("Grupo Etario *", FEATURE_VOCABULARIES['Grupo_etario'])
+            tipo_afiliado = st.selectbox("Tipo de Afiliado *", FEATURE_VOCABULARIES['Tipo_afiliado'])
         
         with col2:
-            departamento = st.selectbox("Departamento *", [
-                "BOGOTA D.C.", "ANTIOQUIA", "VALLE", "CUNDINAMARCA",
-                "ATLANTICO", "SANTANDER", "BOLIVAR", "NARIÑO",
-                "BOYACA", "CORDOBA", "META", "TOLIMA", "OTRO"
-            ])
-            municipio = st.text_input("Municipio *", "BOGOTA")
-            zona = st.selectbox("Zona de Afiliación *", [
-                "Urbana", "Rural", "Urbana-Cabecera Municipal",
-                "Rural - Dispersal", "Rural - Resto Rural",
-                "Urbana - Centro Poblado"
-            ])
-            nivel_sisben = st.selectbox("Nivel Sisbén *", [
-                "1", "2", "3", "4", "NO APLICA", "POBLACIÓN CON SISBEN",
-                "VÍCTIMAS DEL CONFLICTO ARMADO INTERNO", "MIGRACION"
-            ])
+            departamento = st.selectbox("Departamento *", FEATURE_VOCABULARIES['Departamento'])
+            municipio = st.text_input("Municipio *", "BOGOTA D.C.")
+            zona = st.selectbox("Zona de Afiliación *", FEATURE_VOCABULARIES['Zona'])
+            nivel_sisben = st.selectbox("Nivel Sisbén *", FEATURE_VOCABULARIES['Nivel_Sisben'])
         
         st.markdown("**Campos obligatorios ***")
         submitted = st.form_submit_button("🎯 Realizar Predicción", type="primary")
@@ -394,7 +722,7 @@ elif app_mode == "🔮 Predicción Individual":
             required_fields = [municipio]
             if not all(required_fields):
                 st.error("Por favor complete todos los campos obligatorios (*)")
-                st.stop()
+                stop_page()
             
             # Preparar datos para la API
             input_data = {
@@ -411,18 +739,34 @@ elif app_mode == "🔮 Predicción Individual":
             with st.spinner("🔍 Analizando datos y realizando predicción..."):
                 try:
                     start_time = time.time()
-                    response = requests.post(
-                        f"{API_BASE_URL}/predict",
-                        json=input_data,
-                        timeout=30
-                    )
+                    cache_key = PredictionCache.make_key(input_data, model_version_of(api_status))
+                    cached = None
+                    if risk_table is not None and risk_table.version == model_version_of(api_status):
+                        cached = risk_table.lookup_record(input_data)
+                    origin = 'tabla' if cached is not None else 'cache'
+                    if cached is None:
+                        cached = prediction_cache.get(cache_key)
+                    if cached is not None:
+                        # Misma combinación ya predicha con esta versión del modelo
+                        status_code = 200
+                        result = {'predictions': [cached[0]]}
+                        if cached[1] is not None:
+                            result['probabilities'] = [cached[1]]
+                    else:
+                        response = api_client.predict(input_data)
+                        status_code = response.status_code
+                        if status_code == 200:
+                            result = response.json()
+                            if result.get('predictions'):
+                                prediction_cache.put(cache_key, result['predictions'][0],
+                                                     result.get('probabilities', [None])[0])
                     response_time = (time.time() - start_time) * 1000
                     
-                    if response.status_code == 200:
-                        result = response.json()
-                        
+                    if status_code == 200:
                         # Mostrar resultados
-                        st.success(f"✅ Predicción completada en {response_time:.0f}ms")
+                        origin = origin if cached is not None else 'api'
+                        origin_text = {'tabla': " (desde la tabla precalculada)", 'cache': " (desde caché)"}
+                        st.success(f"✅ Predicción completada en {response_time:.0f}ms{origin_text.get(origin, '')}")
                         
                         # Layout de resultados
                         res_col1, res_col2 = st.columns(2)
@@ -454,19 +798,7 @@ elif app_mode == "🔮 Predicción Individual":
                                     st.metric("Probabilidad Alto Riesgo", f"{prob_high:.1f}%")
                                     
                                     # Gráfico de probabilidades
-                                    fig, ax = plt.subplots(figsize=(8, 3))
-                                    bars = ax.bar(['Bajo Riesgo', 'Alto Riesgo'], [prob_low, prob_high], 
-                                                 color=['#4CAF50', '#F44336'])
-                                    ax.set_ylabel('Probabilidad (%)')
-                                    ax.set_ylim(0, 100)
-                                    
-                                    # Agregar valores en las barras
-                                    for bar, value in zip(bars, [prob_low, prob_high]):
-                                        height = bar.get_height()
-                                        ax.text(bar.get_x() + bar.get_width()/2., height + 1,
-                                                f'{value:.1f}%', ha='center', va='bottom')
-                                    
-                                    st.pyplot(fig)
+                                    show_chart(charts.probability_bars, prob_low, prob_high, figsize=(8, 3))
                             
                             else:
                                 st.warning("No se pudo obtener una predicción válida")
@@ -474,20 +806,14 @@ elif app_mode == "🔮 Predicción Individual":
                         with res_col2:
                             st.subheader("📋 Datos Ingresados")
                             st.json(input_data)
-                            
-                            # Opción para guardar la predicción
-                            if st.button("💾 Guardar Predicción"):
-                                if 'saved_predictions' not in st.session_state:
-                                    st.session_state.saved_predictions = []
-                                
-                                saved_pred = {
-                                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                    'input': input_data,
-                                    'prediction': prediction,
-                                    'probabilities': result.get('probabilities', [None])[0] if 'probabilities' in result else None
-                                }
-                                st.session_state.saved_predictions.append(saved_pred)
-                                st.success("Predicción guardada en sesión")
+                        
+                        # Se guarda con el botón de abajo (los botones no pueden ir dentro del formulario)
+                        if prediction is not None:
+                            st.session_state.last_prediction = prediction_record(
+                                input_data, prediction, result.get('probabilities', [None])[0],
+                                model_version=model_version_of(api_status),
+                                origin=origin, response_ms=response_time
+                            )
                     
                     else:
                         st.error(f"❌ Error en la API: {response.status_code}")
@@ -503,14 +829,55 @@ elif app_mode == "🔮 Predicción Individual":
                     st.error("🔌 Error de conexión - Verifique que la API esté ejecutándose")
                 except Exception as e:
                     st.error(f"❌ Error inesperado: {str(e)}")
+    
+    # Guardar la última predicción en el registro persistente
+    last_prediction = st.session_state.get('last_prediction')
+    if last_prediction is not None:
+        risk = "ALTO RIESGO" if last_prediction['prediccion'] == 1 else "BAJO RIESGO"
+        st.caption(f"Última predicción ({last_prediction['fecha'][11:19]}): **{risk}** · "
+                   f"{last_prediction['Genero']}, {last_prediction['Grupo_etario']}, {last_prediction['Municipio']}")
+        if st.button("💾 Guardar Predicción", disabled=last_prediction.get('guardada', False)):
+            prediction_log.log({k: v for k, v in last_prediction.items() if k != 'guardada'})
+            last_prediction['guardada'] = True
+            st.rerun()
+        if last_prediction.get('guardada'):
+            st.success("Predicción guardada en el registro")
+    
+    # Predicciones guardadas, de esta y de otras sesiones
+    with st.expander("📜 Predicciones Guardadas"):
+        log_stats = prediction_log.stats()
+        st.caption(f"{log_stats['segmentos']} archivo(s), {log_stats['bytes'] / 1024:,.1f} KB en disco · "
+                   f"{log_stats['en_cola']} en cola de escritura")
+        if st.toggle("Cargar registro", key="load_prediction_log"):
+            saved = read_log()
+            if saved.empty:
+                st.info("Todavía no hay predicciones guardadas")
+            else:
+                log_col1, log_col2 = st.columns(2)
+                with log_col1:
+                    st.metric("Predicciones Guardadas", f"{len(saved):,}")
+                with log_col2:
+                    st.metric("Tasa Alto Riesgo", f"{saved['prediccion'].mean() * 100:.1f}%")
+                st.dataframe(saved.iloc[::-1].head(QUERY_PREVIEW_ROWS), width="stretch")
+                st.download_button(
+                    label="📥 Descargar Registro (CSV)",
+                    data=exports.frame_export(saved, exports.CSV),
+                    file_name="predicciones_guardadas.csv",
+                    mime="text/csv"
+                )
 
 # Página de Predicción por Lotes
 elif app_mode == "📁 Predicción por Lotes":
     st.header("Predicción por Lotes")
     
+    # Esta página sí necesita la API: esperar a un estado vigente
+    if health is None:
+        with st.spinner("Verificando conexión con la API..."):
+            api_healthy, api_status, response_time = read_api_health(health_monitor.wait())
+    
     if not api_healthy:
         st.error("La API no está disponible. Por favor, verifique la conexión.")
-        st.stop()
+        stop_page()
     
     st.info("""
     **📋 Instrucciones para Predicción por Lotes:**
@@ -528,7 +895,7 @@ elif app_mode == "📁 Predicción por Lotes":
             'Grupo_etario': ['19 a 45', '45 a 50'],
             'Tipo_afiliado': ['COTIZANTE', 'BENEFICIARIO'],
             'Departamento': ['BOGOTA D.C.', 'ANTIOQUIA'],
-            'Municipio': ['BOGOTA', 'MEDELLIN'],
+            'Municipio': ['BOGOTA D.C.', 'MEDELLIN'],
             'Zona': ['Urbana', 'Urbana'],
             'Nivel_Sisben': ['1', '2']
         })
@@ -550,16 +917,39 @@ elif app_mode == "📁 Predicción por Lotes":
     
     if uploaded_file is not None:
         try:
+            # Archivos grandes: leer solo una vista previa y procesar por bloques
+            streaming_mode = st.toggle(
+                "🌊 Modo streaming (archivos grandes)",
+                value=uploaded_file.size > STREAMING_THRESHOLD_MB * 1024**2,
+                help="Lee el archivo por bloques y escribe los resultados a disco sin cargarlo completo en memoria"
+            )
+            
             # Leer el archivo
-            batch_data = pd.read_csv(uploaded_file)
+            if streaming_mode:
+                batch_data = pd.read_csv(uploaded_file, nrows=STREAM_PREVIEW_ROWS)
+                uploaded_file.seek(0)
+                batch_data, unknown_values = to_categorical(batch_data)
+            else:
+                with timer('lectura_csv'):
+                    batch_data, unknown_values = to_categorical(pd.read_csv(uploaded_file))
+                METRICS.count('filas', len(batch_data), etapa='lectura_csv')
             st.success(f"✅ Archivo cargado exitosamente: {uploaded_file.name}")
             
+            # ¿Ya se procesó este mismo archivo?
+            fingerprint = upload_fingerprint(uploaded_file)
+            previous_runs = result_store.list_runs(fingerprint)
+            if not previous_runs.empty:
+                latest = previous_runs.iloc[0]
+                st.info(f"🗄️ Este archivo ya se procesó el {latest.processed_at.replace('T', ' ')} "
+                        f"(corrida #{previous_runs.index[0]}, {latest.total_rows:,} registros). Puede reabrir "
+                        f"el resultado en **📈 Resultados → Corridas Guardadas** sin volver a llamar a la API")
+            
             # Mostrar información del archivo
             st.subheader("📊 Información del Archivo")
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                st.metric("Registros", f"{len(batch_data):,}")
+                st.metric("Registros", "Por determinar" if streaming_mode else f"{len(batch_data):,}")
             
             with col2:
                 st.metric("Columnas", len(batch_data.columns))
@@ -570,12 +960,12 @@ elif app_mode == "📁 Predicción por Lotes":
             
             # Mostrar vista previa
             st.subheader("👀 Vista Previa del Archivo")
-            st.dataframe(batch_data.head(10), use_container_width=True)
+            st.dataframe(batch_data.head(10), width="stretch")
             
             # Validar datos antes de procesar
             st.subheader("🔍 Validación de Datos")
             
-            required_columns = ['Genero', 'Grupo_etario', 'Tipo_afiliado', 'Departamento', 'Municipio', 'Zona', 'Nivel_Sisben']
+            required_columns = REQUIRED_COLUMNS
             missing_columns = [col for col in required_columns if col not in batch_data.columns]
             
             if missing_columns:
@@ -586,143 +976,101 @@ elif app_mode == "📁 Predicción por Lotes":
                 
                 # Mostrar resumen de datos
                 st.write("**Resumen por columna:**")
+                approximate_unique = st.toggle("⚡ Valores únicos aproximados (HyperLogLog)",
+                                               help="Estima los valores únicos en memoria acotada (error estándar ±0.8%)")
+                if streaming_mode:
+                    st.caption(f"Calculado sobre las primeras {len(batch_data):,} filas")
                 for col in required_columns:
-                    unique_vals = batch_data[col].nunique()
+                    if approximate_unique:
+                        unique_vals = f"≈{HyperLogLog().update(batch_data[col]).estimate():,}"
+                    else:
+                        unique_vals = batch_data[col].nunique()
                     sample_vals = batch_data[col].head(3).tolist()
                     st.write(f"- **{col}**: {unique_vals} valores únicos (ej: {', '.join(map(str, sample_vals))})")
-            
-            # Procesar predicción
-            if st.button("🚀 Ejecutar Predicción por Lotes", type="primary", disabled=bool(missing_columns)):
-                with st.spinner(f"📊 Procesando {len(batch_data):,} registros..."):
-                    try:
-                        # Convertir a formato JSON para la API - CORREGIDO
-                        records = batch_data.to_dict('records')
-                        
-                        start_time = time.time()
-                        response = requests.post(
-                            f"{API_BASE_URL}/batch_predict",
-                            json={"records": records},  # CORREGIDO: Cambiado de "data" a "records"
-                            timeout=60
+                show_unknown_values(unknown_values)
+                
+                # Validación por fila contra el vocabulario del formulario
+                if streaming_mode:
+                    st.caption("En modo streaming cada bloque se valida al procesarse; las filas rechazadas "
+                               "se podrán descargar al terminar el trabajo")
+                else:
+                    validation = validate_batch(batch_data)
+                    n_rejected = validation.n_rejected
+                    val_col1, val_col2 = st.columns(2)
+                    with val_col1:
+                        st.metric("Filas Válidas", f"{len(batch_data) - n_rejected:,}")
+                    with val_col2:
+                        st.metric("Filas Rechazadas", f"{n_rejected:,}")
+                    if n_rejected:
+                        st.warning(f"⚠️ {n_rejected:,} filas tienen valores faltantes o fuera del vocabulario "
+                                   f"del modelo y no se enviarán a la API")
+                        error_summary = validation.summary()
+                        st.dataframe(error_summary[error_summary.sum(axis=1) > 0], width="stretch")
+                        rejected_data = rejected_rows(batch_data, validation)
+                        st.download_button(
+                            label="📥 Descargar Filas Rechazadas",
+                            data=exports.frame_export(rejected_data, exports.CSV),
+                            file_name=f"filas_rechazadas_{uploaded_file.name}",
+                            mime="text/csv"
                         )
-                        processing_time = (time.time() - start_time)
-                        
-                        if response.status_code == 200:
-                            results = response.json()
-                            predictions = results.get('predictions', [])
-                            
-                            # Agregar predicciones al DataFrame
-                            batch_data['prediccion'] = predictions
-                            batch_data['prediccion_texto'] = batch_data['prediccion'].map({0: 'Bajo Riesgo', 1: 'Alto Riesgo'})
-                            
-                            # Agregar timestamp
-                            batch_data['fecha_procesamiento'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            
-                            st.success(f"✅ {len(predictions):,} predicciones completadas en {processing_time:.1f} segundos")
-                            
-                            # Mostrar resumen
-                            st.subheader("📈 Resumen de Predicciones")
-                            
-                            summary_col1, summary_col2, summary_col3, summary_col4 = st.columns(4)
-                            
-                            total = len(batch_data)
-                            alto_riesgo = batch_data['prediccion'].sum()
-                            bajo_riesgo = total - alto_riesgo
-                            tasa_alto_riesgo = (alto_riesgo / total) * 100
-                            
-                            with summary_col1:
-                                st.metric("Total Procesado", f"{total:,}")
-                            
-                            with summary_col2:
-                                st.metric("Alto Riesgo", f"{alto_riesgo:,}")
-                            
-                            with summary_col3:
-                                st.metric("Bajo Riesgo", f"{bajo_riesgo:,}")
-                            
-                            with summary_col4:
-                                st.metric("Tasa Alto Riesgo", f"{tasa_alto_riesgo:.1f}%")
-                            
-                            # Visualización rápida
-                            fig, ax = plt.subplots(1, 2, figsize=(12, 4))
-                            
-                            # Gráfico de torta
-                            labels = ['Bajo Riesgo', 'Alto Riesgo']
-                            sizes = [bajo_riesgo, alto_riesgo]
-                            colors = ['#4CAF50', '#F44336']
-                            
-                            ax[0].pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
-                            ax[0].set_title('Distribución de Predicciones')
-                            
-                            # Gráfico de barras
-                            ax[1].bar(labels, sizes, color=colors)
-                            ax[1].set_title('Conteo de Predicciones')
-                            ax[1].set_ylabel('Número de Registros')
-                            
-                            for i, v in enumerate(sizes):
-                                ax[1].text(i, v + max(sizes)*0.01, f'{v:,}', ha='center')
-                            
-                            plt.tight_layout()
-                            st.pyplot(fig)
-                            
-                            # Mostrar resultados detallados
-                            st.subheader("📋 Resultados Detallados")
-                            st.dataframe(batch_data, use_container_width=True)
-                            
-                            # Descargar resultados
-                            st.subheader("💾 Descargar Resultados")
-                            
-                            output_col1, output_col2 = st.columns(2)
-                            
-                            with output_col1:
-                                # CSV
-                                csv = batch_data.to_csv(index=False)
-                                st.download_button(
-                                    label="📥 Descargar CSV Completo",
-                                    data=csv,
-                                    file_name=f"resultados_prediccion_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                                    mime="text/csv"
-                                )
-                            
-                            with output_col2:
-                                # Solo alto riesgo
-                                alto_riesgo_data = batch_data[batch_data['prediccion'] == 1]
-                                if not alto_riesgo_data.empty:
-                                    csv_alto = alto_riesgo_data.to_csv(index=False)
-                                    st.download_button(
-                                        label="📥 Descargar Solo Alto Riesgo",
-                                        data=csv_alto,
-                                        file_name=f"alto_riesgo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                                        mime="text/csv"
-                                    )
-                            
-                            # Guardar en session state para análisis
-                            st.session_state.batch_results = batch_data
-                            st.session_state.last_batch_file = uploaded_file.name
-                            
-                            # Resumen ejecutivo
-                            with st.expander("📊 Resumen Ejecutivo"):
-                                st.write(f"""
-                                **Resumen del Procesamiento por Lotes**
-                                
-                                - **Archivo procesado**: {uploaded_file.name}
-                                - **Total de registros**: {total:,}
-                                - **Registros de alto riesgo**: {alto_riesgo:,} ({tasa_alto_riesgo:.1f}%)
-                                - **Registros de bajo riesgo**: {bajo_riesgo:,} ({(100-tasa_alto_riesgo):.1f}%)
-                                - **Tiempo de procesamiento**: {processing_time:.1f} segundos
-                                - **Fecha y hora**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-                                """)
-                        
-                        else:
-                            st.error(f"❌ Error en la API: {response.status_code}")
-                            try:
-                                error_detail = response.json()
-                                st.write("Detalles del error:", error_detail)
-                            except:
-                                st.write("Respuesta:", response.text)
-                    
-                    except requests.exceptions.Timeout:
-                        st.error("⏰ Timeout - La API no respondió en 60 segundos")
-                    except Exception as e:
-                        st.error(f"❌ Error procesando el lote: {str(e)}")
+            
+            # Configuración del procesamiento por bloques
+            with st.expander("⚙️ Configuración del Procesamiento"):
+                cfg_col1, cfg_col2, cfg_col3 = st.columns(3)
+                with cfg_col1:
+                    chunk_size = st.number_input("Registros por bloque", min_value=100, max_value=100000,
+                                                 value=DEFAULT_CHUNK_SIZE, step=500)
+                with cfg_col2:
+                    max_workers = st.slider("Solicitudes en paralelo", 1, 16, DEFAULT_MAX_WORKERS)
+                with cfg_col3:
+                    max_retries = st.slider("Reintentos por bloque", 0, 5, DEFAULT_MAX_RETRIES)
+                use_cache = st.checkbox("Usar caché de predicciones", value=True,
+                                        help="Las combinaciones ya predichas no se reenvían a la API")
+                deduplicate = st.checkbox("Agrupar filas repetidas", value=True,
+                                          help="Envía una sola vez cada combinación distinta de las columnas del modelo")
+                wire_choice = st.selectbox(
+                    "Formato de transmisión",
+                    ["Automático"] + available_formats(),
+                    help="Automático usa el formato más compacto que anuncie la API en /health"
+                )
+                wire_format = negotiate(api_status.get('batch_formats')) if wire_choice == "Automático" else wire_choice
+            
+            # Procesar predicción en segundo plano
+            nothing_valid = not streaming_mode and not missing_columns and n_rejected == len(batch_data)
+            if st.button("🚀 Ejecutar Predicción por Lotes", type="primary",
+                         disabled=bool(missing_columns) or nothing_valid):
+                options = dict(
+                    chunk_size=chunk_size,
+                    max_workers=max_workers,
+                    max_retries=max_retries,
+                    cache=prediction_cache if use_cache else None,
+                    model_version=model_version_of(api_status),
+                    deduplicate=deduplicate,
+                    wire_format=wire_format,
+                    risk_table=risk_table if risk_table is not None and
+                    risk_table.version == model_version_of(api_status) else None
+                )
+                if streaming_mode:
+                    job = job_manager.submit_file(uploaded_file, api_client, uploaded_file.name, fingerprint=fingerprint,
+                                                 **options)
+                else:
+                    job = job_manager.submit_frame(batch_data[validation.valid_mask], api_client, uploaded_file.name,
+                                                   rejected=rejected_data if n_rejected else None,
+                                                   fingerprint=fingerprint, **options)
+                st.session_state.setdefault('batch_jobs', []).append(job.id)
+                st.session_state.last_batch_file = uploaded_file.name
+                
+                st.success(f"✅ Trabajo **{job.id}** enviado. Puede seguir su avance en **📈 Resultados**")
+                if job_manager.running_count() >= job_manager.max_concurrent:
+                    st.info(f"ℹ️ Hay {job_manager.max_concurrent} trabajos en curso; este esperará su turno en la cola")
+            
+            # Trabajos de esta sesión enviados desde esta página
+            session_jobs = [job_manager.get(job_id) for job_id in st.session_state.get('batch_jobs', [])]
+            session_jobs = [job for job in session_jobs if job is not None]
+            if session_jobs:
+                st.subheader("🗂️ Trabajos Enviados")
+                for job in reversed(session_jobs[-3:]):
+                    render_job_progress(job)
         
         except Exception as e:
             st.error(f"❌ Error leyendo el archivo: {str(e)}")
@@ -732,26 +1080,142 @@ elif app_mode == "📁 Predicción por Lotes":
 elif app_mode == "📈 Resultados":
     st.header("Análisis de Resultados")
     
-    if 'batch_results' not in st.session_state:
+    # Trabajos por lotes de esta sesión
+    session_jobs = [job_manager.get(job_id) for job_id in st.session_state.get('batch_jobs', [])]
+    session_jobs = [job for job in session_jobs if job is not None]
+    saved_runs = result_store.list_runs()
+    
+    # Origen de los resultados a analizar
+    sources = []
+    if session_jobs:
+        sources.append("🗂️ Trabajos de esta sesión")
+    if not saved_runs.empty:
+        sources.append("🗄️ Corridas guardadas")
+    source = st.radio("Resultados a analizar:", sources, horizontal=True) if len(sources) > 1 else \
+        (sources[0] if sources else None)
+    
+    if source == "🗂️ Trabajos de esta sesión":
+        def jobs_state():
+            # (terminados, guardándose en el almacén)
+            return ({job.id for job in session_jobs if job.finished}, {job.id for job in session_jobs if job.storing})
+        
+        finished_ids, storing_ids = jobs_state()
+        
+        # Solo este panel se refresca mientras haya trabajos en curso o guardándose
+        @st.fragment(run_every=2 if len(finished_ids) < len(session_jobs) or storing_ids else None)
+        def jobs_panel():
+            st.subheader("🗂️ Trabajos por Lotes")
+            st.caption(f"{job_manager.running_count()} en curso y {job_manager.queued_count()} en cola "
+                       f"(máximo {job_manager.max_concurrent} simultáneos)")
+            for job in reversed(session_jobs):
+                render_job_progress(job)
+            # Un trabajo terminó (o terminó de guardarse): recargar la página completa para poder analizarlo
+            if jobs_state() != (finished_ids, storing_ids):
+                st.rerun()
+        
+        jobs_panel()
+        
+        completed = {job.id: job for job in reversed(session_jobs) if job.status == DONE}
+        if completed:
+            selected_id = st.selectbox(
+                "Trabajo a analizar:",
+                list(completed),
+                format_func=lambda job_id: f"{job_id} · {completed[job_id].file_name} "
+                                           f"({completed[job_id].total_rows:,} registros)"
+            )
+            selected_job = completed[selected_id]
+            render_batch_summary(selected_job)
+            if selected_job.cube is not None:
+                st.session_state.results_cube = selected_job.cube
+                st.session_state.last_batch_file = selected_job.file_name
+            st.markdown("---")
+    
+    elif source == "🗄️ Corridas guardadas":
+        st.subheader("🗄️ Corridas Guardadas")
+        st.caption("Resultados de trabajos anteriores guardados en el almacén local; se reabren sin llamar a la API. "
+                   "Las corridas guardadas son reducidas: los registros conservan las columnas del modelo, la "
+                   "predicción y la probabilidad (las columnas adicionales del archivo solo quedan en el análisis)")
+        selected_runs = st.multiselect(
+            "Corridas a analizar (varias se combinan):",
+            list(saved_runs.index), default=list(saved_runs.index[:1]),
+            format_func=lambda run_id: run_label(saved_runs, run_id)
+        )
+        if selected_runs:
+            runs_table = saved_runs.loc[selected_runs, ['file_name', 'processed_at', 'model_version', 'total_rows',
+                                                        'high_risk_rows', 'rejected_rows']]
+            st.dataframe(runs_table.rename(columns={
+                'file_name': 'Archivo', 'processed_at': 'Procesado', 'model_version': 'Modelo',
+                'total_rows': 'Registros', 'high_risk_rows': 'Alto riesgo', 'rejected_rows': 'Rechazados'
+            }), width="stretch")
+            if len(set(saved_runs.loc[selected_runs, 'model_version'].fillna(''))) > 1:
+                st.warning("⚠️ Las corridas seleccionadas se procesaron con versiones distintas del modelo")
+            
+            # El cubo guardado de cada corrida: no se leen las filas
+            st.session_state.results_cube = result_store.load_runs_cube(selected_runs)
+            st.session_state.last_batch_file = ', '.join(saved_runs.loc[selected_runs, 'file_name'].astype(str))
+            
+            # Consulta de registros sobre las corridas seleccionadas (índices por característica)
+            with st.expander("🔎 Consultar registros"):
+                filters = {}
+                filter_cols = st.columns(2)
+                for i, feature in enumerate(REQUIRED_COLUMNS):
+                    with filter_cols[i % 2]:
+                        options = result_store.labels(feature)
+                        values = st.multiselect(feature, options, key=f"run_filter_{feature}")
+                        if values:
+                            filters[feature] = values
+                matched, matched_high = result_store.count(selected_runs, filters)
+                q_col1, q_col2, q_col3 = st.columns(3)
+                with q_col1:
+                    st.metric("Registros", f"{matched:,}")
+                with q_col2:
+                    st.metric("Alto Riesgo", f"{matched_high:,}")
+                with q_col3:
+                    st.metric("Tasa Alto Riesgo", f"{matched_high / matched * 100:.1f}%" if matched else "—")
+                group_by = st.multiselect("Agrupar por:", ['run_id'] + REQUIRED_COLUMNS, key="run_group_by")
+                if group_by:
+                    st.dataframe(result_store.aggregate(group_by, selected_runs, filters), width="stretch")
+                else:
+                    records = result_store.query(selected_runs, filters, limit=QUERY_PREVIEW_ROWS)
+                    if matched > len(records):
+                        st.caption(f"Primeros {len(records):,} de {matched:,} registros")
+                    st.dataframe(records, width="stretch")
+                    st.download_button(
+                        label="📥 Descargar Registros (CSV)",
+                        data=exports.frame_export(lambda: result_store.query(selected_runs, filters, limit=None),
+                                                  exports.CSV),
+                        file_name="registros_consulta.csv",
+                        mime="text/csv",
+                        key="download_run_query"
+                    )
+            
+            if len(selected_runs) == 1 and st.button("🗑️ Eliminar corrida", key="delete_run"):
+                result_store.delete_run(selected_runs[0])
+                st.session_state.pop('results_cube', None)
+                st.rerun()
+            st.markdown("---")
+    
+    if 'results_cube' not in st.session_state:
         st.info("""
         ℹ️ **No hay resultados de predicción disponibles**
         
         Para ver análisis de resultados:
         1. Vaya a **📁 Predicción por Lotes**
         2. Suba un archivo CSV y procese las predicciones
-        3. Los resultados estarán disponibles para análisis en esta sección
+        3. Cuando el trabajo termine, los resultados estarán disponibles para análisis en esta sección
         """)
-        st.stop()
+        stop_page()
     
-    results = st.session_state.batch_results
+    # Cubo pre-agregado del trabajo: las vistas no recorren las filas
+    cube = st.session_state.results_cube
     
     # Estadísticas de resultados
     st.subheader("📊 Estadísticas de Predicciones")
     
-    total = len(results)
-    alto_riesgo = results['prediccion'].sum() if results['prediccion'].dtype != 'object' else len(results[results['prediccion'] == 1])
+    total = cube.total
+    alto_riesgo = cube.total_high_risk
     bajo_riesgo = total - alto_riesgo
-    tasa_alto_riesgo = (alto_riesgo / total) * 100
+    tasa_alto_riesgo = (alto_riesgo / total) * 100 if total else 0.0
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -780,56 +1244,31 @@ elif app_mode == "📈 Resultados":
         
         with col1:
             # Gráfico de torta mejorado
-            fig, ax = plt.subplots(figsize=(8, 8))
-            labels = ['Bajo Riesgo', 'Alto Riesgo']
-            sizes = [bajo_riesgo, alto_riesgo]
-            colors = ['#4CAF50', '#F44336']
-            explode = (0.05, 0.05)  # resaltar las porciones
-            
-            ax.pie(sizes, explode=explode, labels=labels, colors=colors, autopct='%1.1f%%',
-                  shadow=True, startangle=90)
-            ax.axis('equal')
-            ax.set_title('Distribución de Predicciones', fontsize=16, fontweight='bold')
-            st.pyplot(fig)
+            show_chart(charts.risk_pie, bajo_riesgo, alto_riesgo, figsize=(8, 8))
         
         with col2:
             # Gráfico de barras horizontal
-            fig, ax = plt.subplots(figsize=(10, 4))
-            y_pos = np.arange(len(labels))
-            ax.barh(y_pos, sizes, color=colors)
-            ax.set_yticks(y_pos)
-            ax.set_yticklabels(labels)
-            ax.set_xlabel('Número de Registros')
-            ax.set_title('Conteo de Predicciones por Categoría')
-            
-            # Agregar valores en las barras
-            for i, v in enumerate(sizes):
-                ax.text(v + max(sizes)*0.01, i, f'{v:,}', va='center')
-            
-            st.pyplot(fig)
+            show_chart(charts.risk_barh, bajo_riesgo, alto_riesgo, figsize=(10, 4))
     
     elif viz_type == "Análisis por Característica":
         # Seleccionar característica para análisis
-        available_features = [col for col in results.columns if col not in ['prediccion', 'prediccion_texto', 'fecha_procesamiento']]
+        available_features = cube.features
         
         if available_features:
             selected_feature = st.selectbox("Seleccione característica para análisis:", available_features)
             
-            # Crosstab mejorado
-            crosstab = pd.crosstab(results[selected_feature], results['prediccion'], normalize='index') * 100
-            
-            fig, ax = plt.subplots(figsize=(12, 8))
-            crosstab.plot(kind='bar', ax=ax, color=['#4CAF50', '#F44336'])
-            ax.set_ylabel('Porcentaje (%)')
-            ax.set_title(f'Distribución de Predicciones por {selected_feature}', fontweight='bold')
-            ax.legend(['Bajo Riesgo', 'Alto Riesgo'])
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            st.pyplot(fig)
+            # Crosstab mejorado (solo las categorías con más registros si son demasiadas)
+            count_table = cube.feature_table(selected_feature)
+            chart_table = count_table
+            if len(count_table) > charts.HEATMAP_MAX_CATEGORIES:
+                st.caption(f"Se grafican las {charts.HEATMAP_MAX_CATEGORIES} categorías con más registros "
+                           f"de {len(count_table):,}")
+                chart_table = count_table.loc[count_table.sum(axis=1).nlargest(charts.HEATMAP_MAX_CATEGORIES).index]
+            crosstab = chart_table.div(chart_table.sum(axis=1), axis=0) * 100
+            show_chart(charts.feature_risk_bars, crosstab, selected_feature, figsize=(12, 8))
             
             # Tabla detallada
             st.subheader("📋 Tabla de Distribución")
-            count_table = pd.crosstab(results[selected_feature], results['prediccion'])
             count_table['Total'] = count_table.sum(axis=1)
             count_table['% Alto Riesgo'] = (count_table[1] / count_table['Total'] * 100).round(1)
             st.dataframe(count_table.style.background_gradient(subset=['% Alto Riesgo'], cmap='Reds'))
@@ -838,7 +1277,7 @@ elif app_mode == "📈 Resultados":
         st.subheader("🔍 Análisis Comparativo Detallado")
         
         # Seleccionar dos características para comparar
-        available_features = [col for col in results.columns if col not in ['prediccion', 'prediccion_texto', 'fecha_procesamiento']]
+        available_features = cube.features
         
         if len(available_features) >= 2:
             col1, col2 = st.columns(2)
@@ -849,38 +1288,21 @@ elif app_mode == "📈 Resultados":
             with col2:
                 feature2 = st.selectbox("Segunda característica:", available_features, key='feat2')
             
-            if feature1 != feature2:
-                # Heatmap de correlación
-                pivot_table = results.pivot_table(
-                    index=feature1, 
-                    columns=feature2, 
-                    values='prediccion', 
-                    aggfunc='mean'
-                ) * 100
-                
-                fig, ax = plt.subplots(figsize=(12, 8))
-                im = ax.imshow(pivot_table.values, cmap='Reds', aspect='auto')
-                
-                # Etiquetas
-                ax.set_xticks(np.arange(len(pivot_table.columns)))
-                ax.set_yticks(np.arange(len(pivot_table.index)))
-                ax.set_xticklabels(pivot_table.columns, rotation=45, ha='right')
-                ax.set_yticklabels(pivot_table.index)
-                ax.set_xlabel(feature2)
-                ax.set_ylabel(feature1)
-                ax.set_title(f'Porcentaje de Alto Riesgo por {feature1} y {feature2}')
-                
-                # Barra de color
-                cbar = plt.colorbar(im, ax=ax)
-                cbar.set_label('Porcentaje de Alto Riesgo (%)')
-                
-                # Texto en las celdas
-                for i in range(len(pivot_table.index)):
-                    for j in range(len(pivot_table.columns)):
-                        text = ax.text(j, i, f'{pivot_table.iloc[i, j]:.1f}%',
-                                      ha="center", va="center", color="black", fontweight='bold')
-                
-                st.pyplot(fig)
+            if feature1 != feature2 and not cube.has_pair(feature1, feature2):
+                st.info("ℹ️ Estas dos características tienen demasiadas categorías para compararlas")
+            elif feature1 != feature2:
+                # Heatmap de correlación (ejes grandes, p. ej. Municipio, se agrupan en "Otros")
+                max_categories = st.slider("Máximo de categorías por eje:", 5, 100, charts.HEATMAP_MAX_CATEGORIES)
+                counts, sums = cube.pair_tables(feature1, feature2)
+                n_rows, n_cols = counts.shape
+                counts, sums = collapse_top_n(counts, sums, max_categories, max_categories)
+                if counts.shape != (n_rows, n_cols):
+                    st.caption(f"Se muestran las {max_categories} categorías con más registros por eje "
+                               f"({n_rows} × {n_cols} en total); el resto se agrupa en 'Otros'")
+                pivot_table = sums / counts.where(counts > 0) * 100
+                show_chart(charts.risk_heatmap, pivot_table, feature1, feature2, figsize=(12, 8))
+                if pivot_table.size > charts.HEATMAP_MAX_ANNOTATED_CELLS:
+                    st.caption("Grilla demasiado grande para mostrar el porcentaje en cada celda")
 
 # Página Acerca del Modelo (mejorada)
 elif app_mode == "ℹ️ Acerca del Modelo":
@@ -991,7 +1413,7 @@ elif app_mode == "ℹ️ Acerca del Modelo":
     
     if api_healthy:
         try:
-            response = requests.get(f"{API_BASE_URL}")
+            response = api_client.root()
             endpoints = response.json().get('endpoints', {})
             
             for endpoint, description in endpoints.items():
@@ -1024,9 +1446,14 @@ with footer_col1:
 
 with footer_col2:
     if api_healthy:
-        st.markdown(f"🟢 API: {API_BASE_URL}")
+        st.markdown(f"🟢 {BACKEND_NAME}")
+    elif health is None:
+        st.markdown(f"🟡 {BACKEND_NAME}")
     else:
-        st.markdown(f"🔴 API: {API_BASE_URL}")
+        st.markdown(f"🔴 {BACKEND_NAME}")
 
 with footer_col3:
     st.markdown(f"🕐 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+render_memory_panel()
+render_performance_panel()
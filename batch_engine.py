@@ -0,0 +1,441 @@
+"""Motor de predicción por lotes.
+
+Divide un DataFrame en bloques, los envía a ``/batch_predict`` en paralelo
+mediante un pool de hilos acotado (con reintentos por bloque a través de
+``ApiClient``) y reensambla las predicciones en el orden original de las filas.
+El modo streaming hace lo mismo leyendo el CSV por bloques y escribiendo los
+resultados directamente a archivos temporales, sin cargar el archivo completo.
+"""
+import time
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+
+import numpy as np
+import pandas as pd
+import requests
+
+from categorical import REQUIRED_COLUMNS, row_group_ids
+from metrics import count, timed_iter
+from prediction_cache import PredictionCache
+from validation import rejected_rows, validate_batch
+from wire_format import RECORDS, decode_predictions
+
+# Parámetros por defecto del procesamiento por lotes
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_RETRIES = 3
+
+PREDICTION_LABELS = {0: 'Bajo Riesgo', 1: 'Alto Riesgo'}
+
+# Los resultados en streaming se mantienen en memoria hasta este tamaño y luego pasan a disco
+SPOOL_MAX_SIZE = 32 * 1024 ** 2
+STREAM_PREVIEW_ROWS = 100
+
+
+class BatchPredictionError(Exception):
+    """Error definitivo al procesar un bloque (agotados los reintentos)."""
+
+    def __init__(self, message, status_code=None, detail=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class BatchResult:
+    predictions: np.ndarray
+    probabilities: np.ndarray = None
+    elapsed: float = 0.0
+    n_chunks: int = 0
+    retries: int = 0
+    chunk_times: list = field(default_factory=list)
+    sent_rows: int = 0
+    unique_rows: int = 0
+    cache_hits: int = 0
+    table_hits: int = 0
+
+    @property
+    def rows_per_second(self):
+        return len(self.predictions) / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def dedup_ratio(self):
+        # Filas del lote por cada combinación única enviada o resuelta
+        return len(self.predictions) / self.unique_rows if self.unique_rows else 1.0
+
+
+@dataclass
+class StreamResult:
+    output: SpooledTemporaryFile
+    high_risk_output: SpooledTemporaryFile
+    preview: pd.DataFrame
+    total_rows: int = 0
+    high_risk_rows: int = 0
+    rejected_rows: int = 0
+    elapsed: float = 0.0
+    n_chunks: int = 0
+    retries: int = 0
+    sent_rows: int = 0
+    unique_rows: int = 0
+    cache_hits: int = 0
+    table_hits: int = 0
+    rejected_output: SpooledTemporaryFile = None
+
+    @property
+    def rows_per_second(self):
+        return self.total_rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def dedup_ratio(self):
+        return self.total_rows / self.unique_rows if self.unique_rows else 1.0
+
+
+def split_chunks(n_rows, chunk_size):
+    """Devuelve los rangos ``(inicio, fin)`` de cada bloque."""
+    chunk_size = max(1, int(chunk_size))
+    return [(start, min(start + chunk_size, n_rows)) for start in range(0, n_rows, chunk_size)]
+
+
+def _parse_error(response):
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
+def predict_chunk(client, chunk, timeout=None, max_retries=DEFAULT_MAX_RETRIES, wire_format=RECORDS):
+    """Envía un bloque (DataFrame) a ``/batch_predict`` a través del cliente.
+
+    Devuelve ``(predicciones, probabilidades, reintentos_usados)``.
+    """
+    try:
+        response = client.batch_predict(chunk, wire_format=wire_format, timeout=timeout, retries=max_retries)
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+        raise BatchPredictionError(f"Bloque fallido tras {max_retries + 1} intentos: {e}") from e
+
+    if response.status_code != 200:
+        raise BatchPredictionError(
+            f"Error en la API: {response.status_code}",
+            status_code=response.status_code,
+            detail=_parse_error(response)
+        )
+
+    predictions, probabilities = decode_predictions(response)
+    if len(predictions) != len(chunk):
+        raise BatchPredictionError(
+            f"La API devolvió {len(predictions)} predicciones para {len(chunk)} registros"
+        )
+    return predictions, probabilities, response.attempts - 1
+
+
+def iter_predictions(chunks, client, max_workers=DEFAULT_MAX_WORKERS, max_retries=DEFAULT_MAX_RETRIES,
+                     timeout=None, wire_format=RECORDS, executor=None):
+    """Predice bloques de forma concurrente y los entrega en orden.
+
+    ``chunks`` es un iterable de DataFrames que se consume bajo demanda: como
+    mucho hay ``2 * max_workers`` bloques serializados o pendientes de entrega
+    a la vez, de modo que la memoria queda acotada por el tamaño de bloque.
+    Produce ``(bloque, predicciones, probabilidades, reintentos, segundos)``.
+    ``executor`` permite reutilizar un pool entre llamadas (modo streaming);
+    sin él se crea uno de ``max_workers`` hilos.
+    """
+    max_workers = max(1, int(max_workers))
+    window = 2 * max_workers
+    chunk_iter = enumerate(chunks)
+    pending = {}
+    completed = {}
+    next_index = 0
+
+    def submit_next(executor):
+        for index, chunk in chunk_iter:
+            future = executor.submit(predict_chunk, client, chunk, timeout, max_retries, wire_format)
+            pending[future] = (index, chunk, time.time())
+            return True
+        return False
+
+    owned = ThreadPoolExecutor(max_workers=max_workers) if executor is None else nullcontext(executor)
+    with owned as executor:
+        try:
+            while len(pending) < window and submit_next(executor):
+                pass
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, chunk, submitted_at = pending.pop(future)
+                    chunk_predictions, chunk_probabilities, retries = future.result()
+                    completed[index] = (chunk, chunk_predictions, chunk_probabilities, retries,
+                                        time.time() - submitted_at)
+
+                # Entregar en orden los bloques contiguos ya terminados
+                while next_index in completed:
+                    yield completed.pop(next_index)
+                    next_index += 1
+
+                while len(pending) + len(completed) < window and submit_next(executor):
+                    pass
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+
+def _predict_frame(data, client, chunk_size, max_workers, max_retries, timeout, progress_callback, wire_format,
+                   executor=None):
+    """Envía todas las filas de ``data`` y devuelve un ``BatchResult`` en orden."""
+    n_rows = len(data)
+    chunks = split_chunks(n_rows, chunk_size)
+    result = BatchResult(predictions=np.zeros(n_rows, dtype=np.int64), n_chunks=len(chunks))
+    done_rows = 0
+
+    start_time = time.time()
+    frames = (data.iloc[start:stop] for start, stop in chunks)
+    for chunk, chunk_predictions, chunk_probabilities, retries, duration in iter_predictions(
+            frames, client, max_workers, max_retries, timeout, wire_format, executor):
+        # Colocar el bloque en su posición original
+        start, stop = done_rows, done_rows + len(chunk)
+        result.predictions[start:stop] = chunk_predictions
+        if chunk_probabilities is not None:
+            if result.probabilities is None:
+                result.probabilities = np.full((n_rows, len(chunk_probabilities[0])), np.nan)
+            result.probabilities[start:stop] = chunk_probabilities
+
+        result.retries += retries
+        result.chunk_times.append(duration)
+        done_rows = stop
+        if progress_callback is not None:
+            progress_callback(done_rows, n_rows, time.time() - start_time)
+
+    result.sent_rows = n_rows
+    return result
+
+
+def _merge_probabilities(n_rows, sources):
+    """Probabilidades por fila a partir de las de cada fuente (API, caché, tabla).
+
+    ``sources`` son ``(nombre, filas, probabilidades)``; ``probabilidades``
+    puede ser ``None`` o, para la caché, una lista con ``None`` en las
+    entradas guardadas sin probabilidades. Cada fila se llena con su fuente
+    y las que no tienen quedan en ``NaN``. El número de clases es el de la
+    primera fuente con probabilidades; las de otra forma se descartan y se
+    cuentan en ``probabilidades_descartadas``.
+    """
+    merged = None
+    for name, rows, probabilities in sources:
+        if probabilities is None or not len(rows):
+            continue
+        rows = np.asarray(rows)
+        if isinstance(probabilities, np.ndarray):
+            widths = np.full(len(rows), probabilities.shape[1])
+        else:  # entradas de la caché: listas o None
+            widths = np.array([len(row) if row is not None else 0 for row in probabilities])
+        if merged is None:
+            if not widths.any():
+                continue
+            merged = np.full((n_rows, widths[widths > 0][0]), np.nan)
+        fits = widths == merged.shape[1]
+        if fits.all():
+            merged[rows] = probabilities
+        elif fits.any():
+            merged[rows[fits]] = [row for row, fit in zip(probabilities, fits) if fit]
+        discarded = int(((widths > 0) & ~fits).sum())
+        if discarded:
+            count('probabilidades_descartadas', discarded, fuente=name)
+    return merged
+
+
+def run_batch_prediction(data, client, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=DEFAULT_MAX_WORKERS,
+                         max_retries=DEFAULT_MAX_RETRIES, timeout=None, progress_callback=None,
+                         cache=None, model_version=None, deduplicate=True, wire_format=RECORDS,
+                         risk_table=None, executor=None):
+    """Predice todas las filas de ``data`` por bloques concurrentes.
+
+    ``progress_callback(filas_resueltas, filas_de_data, segundos)`` se invoca
+    desde el hilo que llama (seguro para actualizar elementos de Streamlit)
+    cada vez que termina un bloque. Cuenta filas de ``data``, no combinaciones
+    enviadas: las resueltas por la tabla o la caché cuentan desde el inicio.
+
+    Con ``deduplicate`` las filas se agrupan por su combinación de valores y
+    solo se envía una fila por combinación; las predicciones se replican a
+    todas las filas con un ``take`` vectorizado sobre el id de grupo. Con
+    ``cache`` (una ``PredictionCache``) las combinaciones ya conocidas
+    tampoco se envían. Con ``risk_table`` (una ``RiskTable`` de la misma
+    versión del modelo) las combinaciones que están en la tabla se resuelven
+    con un ``take`` antes de consultar la caché. ``wire_format`` es uno de
+    los formatos de ``wire_format.py``; la API puede rechazarlo y se usa
+    ``records``. ``executor`` es el pool de hilos de las solicitudes, si se
+    comparte entre varias llamadas.
+    """
+    start_time = time.time()
+    n_rows = len(data)
+    if deduplicate:
+        group_ids, first_positions = row_group_ids(data)
+        unique_rows = data.iloc[first_positions]
+    else:
+        group_ids = first_positions = np.arange(n_rows)
+        unique_rows = data
+    n_unique = len(unique_rows)
+
+    # Combinaciones en la tabla precalculada: no pasan por la caché ni por la API
+    table_found = np.zeros(n_unique, dtype=bool)
+    if risk_table is not None:
+        table_found, table_predictions, table_probabilities = risk_table.lookup(unique_rows)
+    pending = np.flatnonzero(~table_found)
+
+    cached = [None] * n_unique
+    if cache is not None and len(pending):
+        keys = [None] * n_unique
+        for i, record in zip(pending, unique_rows.iloc[pending].to_dict('records')):
+            keys[i] = PredictionCache.make_key(record, model_version)
+        for i, entry in zip(pending, cache.get_many([keys[i] for i in pending])):
+            cached[i] = entry
+    hit_mask = np.array([entry is not None for entry in cached], dtype=bool)
+    missing = np.flatnonzero(~hit_mask & ~table_found)
+
+    sent_callback = None
+    if progress_callback is not None:
+        # Filas de ``data`` cubiertas por las primeras k combinaciones enviadas
+        covered = np.concatenate([[0], np.cumsum(np.bincount(group_ids, minlength=n_unique)[missing])])
+        resolved = n_rows - int(covered[-1])
+
+        def sent_callback(sent, _, seconds):
+            progress_callback(resolved + int(covered[sent]), n_rows, seconds)
+
+    result = _predict_frame(unique_rows.iloc[missing], client, chunk_size, max_workers, max_retries, timeout,
+                            sent_callback, wire_format, executor)
+    if cache is not None and len(missing):
+        sent_probabilities = result.probabilities.tolist() if result.probabilities is not None else None
+        cache.put_many([keys[i] for i in missing], result.predictions.tolist(), sent_probabilities)
+
+    # Resultados por combinación única: caché + recién enviados
+    unique_predictions = np.zeros(n_unique, dtype=np.int64)
+    unique_predictions[missing] = result.predictions
+    hits = [entry for entry in cached if entry is not None]
+    if hits:
+        unique_predictions[hit_mask] = [entry[0] for entry in hits]
+
+    unique_probabilities = _merge_probabilities(n_unique, (
+        ('api', missing, result.probabilities),
+        ('cache', np.flatnonzero(hit_mask), [entry[1] for entry in hits]),
+        ('tabla', np.flatnonzero(table_found), table_probabilities if table_found.any() else None),
+    ))
+    if table_found.any():
+        unique_predictions[table_found] = table_predictions
+
+    # Replicar a todas las filas del lote original
+    result.predictions = unique_predictions[group_ids]
+    result.probabilities = unique_probabilities[group_ids] if unique_probabilities is not None else None
+    result.unique_rows = n_unique
+    result.cache_hits = int(hit_mask.sum())
+    result.table_hits = int(table_found.sum())
+    result.elapsed = time.time() - start_time
+    return result
+
+
+def read_csv_chunks(file_obj, chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
+    """Lee un CSV por bloques (todas las columnas, o solo las indicadas)."""
+    return pd.read_csv(file_obj, chunksize=max(1, int(chunk_size)), usecols=columns, dtype=str)
+
+
+_END = object()
+
+
+def prefetch(iterable):
+    """Itera ``iterable`` leyendo el siguiente elemento en otro hilo mientras se procesa el actual."""
+    iterator = iter(iterable)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='csv-prefetch') as reader:
+        upcoming = reader.submit(next, iterator, _END)
+        while True:
+            item = upcoming.result()
+            if item is _END:
+                return
+            upcoming = reader.submit(next, iterator, _END)
+            yield item
+
+
+def stream_batch_prediction(file_obj, client, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=DEFAULT_MAX_WORKERS,
+                            max_retries=DEFAULT_MAX_RETRIES, timeout=None, progress_callback=None,
+                            cache=None, model_version=None, deduplicate=True, wire_format=RECORDS,
+                            risk_table=None, partial_callback=None):
+    """Predice un CSV sin cargarlo completo en memoria.
+
+    El archivo se lee en bloques de ``2 * max_workers * chunk_size`` filas
+    (lo justo para llenar la ventana de solicitudes concurrentes); cada
+    bloque se valida, se predice con ``run_batch_prediction`` y se escribe
+    en orden a un ``SpooledTemporaryFile``. El siguiente bloque se lee en
+    otro hilo mientras se predice el actual, y todas las solicitudes usan un
+    mismo pool de ``max_workers`` hilos. Las filas de alto riesgo van
+    además a un segundo archivo y las rechazadas por la validación, con la
+    descripción de sus errores, a un tercero. Como en el modo en memoria, las
+    columnas que no usa el modelo se conservan en la salida. El pico de
+    memoria (dos bloques: el que se predice y el que se lee) depende del
+    tamaño de bloque y del número de hilos, no del tamaño del archivo.
+
+    ``partial_callback(resultado, bloque, probabilidad_alto)`` recibe el
+    ``StreamResult`` acumulado, el bloque recién predicho y la probabilidad
+    de alto riesgo de cada fila (última clase; ``None`` si la API no la
+    devuelve), para los conteos parciales y el almacén de resultados.
+    """
+    processed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    output = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+', encoding='utf-8', newline='')
+    high_risk_output = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+', encoding='utf-8', newline='')
+    rejected_output = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+', encoding='utf-8', newline='')
+    result = StreamResult(output=output, high_risk_output=high_risk_output, preview=pd.DataFrame(),
+                          rejected_output=rejected_output)
+    previews = []
+    preview_rows = 0
+    block_size = max(1, int(chunk_size)) * 2 * max(1, int(max_workers))
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as executor:
+        for block in prefetch(timed_iter(read_csv_chunks(file_obj, block_size), 'lectura_csv')):
+            validation = validate_batch(block)
+            if validation.n_rejected:
+                rejected_rows(block, validation).to_csv(rejected_output, index=False,
+                                                        header=result.rejected_rows == 0)
+                result.rejected_rows += validation.n_rejected
+            block = block[validation.valid_mask]
+            if block.empty:
+                continue
+
+            block_result = run_batch_prediction(block[REQUIRED_COLUMNS], client, chunk_size, max_workers,
+                                                max_retries, timeout, cache=cache, model_version=model_version,
+                                                deduplicate=deduplicate, wire_format=wire_format,
+                                                risk_table=risk_table, executor=executor)
+            block = block.assign(prediccion=block_result.predictions)
+            block['prediccion_texto'] = block['prediccion'].map(PREDICTION_LABELS)
+            block['fecha_procesamiento'] = processed_at
+
+            high_risk = block[block['prediccion'] == 1]
+            write_header = result.total_rows == 0
+            block.to_csv(output, index=False, header=write_header)
+            high_risk.to_csv(high_risk_output, index=False, header=write_header)
+
+            if preview_rows < STREAM_PREVIEW_ROWS:
+                previews.append(block.head(STREAM_PREVIEW_ROWS - preview_rows))
+                preview_rows += len(previews[-1])
+
+            result.total_rows += len(block)
+            result.high_risk_rows += len(high_risk)
+            result.retries += block_result.retries
+            result.n_chunks += block_result.n_chunks
+            result.sent_rows += block_result.sent_rows
+            result.unique_rows += block_result.unique_rows
+            result.cache_hits += block_result.cache_hits
+            result.table_hits += block_result.table_hits
+            if progress_callback is not None:
+                progress_callback(result.total_rows, None, time.time() - start_time)
+            if partial_callback is not None:
+                probabilities = block_result.probabilities
+                partial_callback(result, block, probabilities[:, -1] if probabilities is not None else None)
+
+    result.elapsed = time.time() - start_time
+    if previews:
+        result.preview = pd.concat(previews, ignore_index=True)
+    output.seek(0)
+    high_risk_output.seek(0)
+    rejected_output.seek(0)
+    return result
@@ -0,0 +1,285 @@
+"""Trabajos de predicción por lotes en segundo plano.
+
+Cada lote enviado desde la página de predicción por lotes se convierte en un
+``BatchJob`` que corre en un executor del proceso, independiente de los
+reruns de Streamlit: cambiar de página o mover un widget no interrumpe el
+trabajo. La sesión solo guarda los ids; la página de resultados consulta el
+progreso, los conteos parciales y el resultado final. Con un ``ResultStore``
+cada trabajo completado queda guardado (``run_id``) para reabrirlo después;
+el guardado ocurre después de marcarlo como completado (``storing``), así que
+el resultado se puede consultar mientras se escribe.
+
+Los DataFrames de cada trabajo (resultado y filas rechazadas) se registran en
+``SessionFrames`` a nombre de la sesión que lo envió, que los manda a disco
+si la sesión supera su presupuesto de memoria.
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import streamlit as st
+
+from batch_engine import (
+    BatchPredictionError, PREDICTION_LABELS, run_batch_prediction, stream_batch_prediction
+)
+from categorical import REQUIRED_COLUMNS
+from result_store import get_result_store
+from results_cube import ResultsCube
+from session_data import SessionFrames, current_session_id, get_session_frames
+
+# Trabajos ejecutándose a la vez por proceso (el resto espera en cola)
+MAX_CONCURRENT_JOBS = 2
+# Trabajos terminados que se conservan en memoria
+MAX_FINISHED_JOBS = 20
+# Búfer al copiar un archivo subido a disco para el modo streaming
+SPOOL_BUFFER_BYTES = 1024 ** 2
+
+QUEUED = 'En cola'
+RUNNING = 'En curso'
+DONE = 'Completado'
+FAILED = 'Error'
+
+
+@dataclass
+class BatchJob:
+    id: str
+    file_name: str
+    streaming: bool
+    wire_format: str
+    status: str = QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float = None
+    finished_at: float = None
+    done_rows: int = 0
+    total_rows: int = None
+    progress: float = 0.0
+    rows_per_second: float = 0.0
+    high_risk_rows: int = None
+    rejected_rows: int = 0
+    result: object = None
+    cube: ResultsCube = None
+    error: str = None
+    error_detail: object = None
+    fingerprint: str = None
+    run_id: int = None
+    storing: bool = False  # completado, guardándose en el almacén
+    store_error: str = None
+    owner: str = None  # sesión que envió el trabajo
+    frames: SessionFrames = field(default=None, repr=False)
+
+    @property
+    def data(self):
+        """Resultado completo (modo en memoria); se recarga desde disco si se había liberado."""
+        return self.frames.get(self.owner, f"{self.id}/resultados")
+
+    @data.setter
+    def data(self, frame):
+        self.frames.put(self.owner, f"{self.id}/resultados", frame)
+
+    @property
+    def rejected(self):
+        return self.frames.get(self.owner, f"{self.id}/rechazadas")
+
+    @rejected.setter
+    def rejected(self, frame):
+        self.frames.put(self.owner, f"{self.id}/rechazadas", frame)
+
+    def discard_frames(self):
+        for key in ('resultados', 'rechazadas'):
+            self.frames.discard(self.owner, f"{self.id}/{key}")
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def _update_progress(self, done_rows, total_rows, elapsed, fraction=None):
+        self.done_rows = done_rows
+        self.total_rows = total_rows
+        self.rows_per_second = done_rows / elapsed if elapsed > 0 else 0.0
+        self.progress = fraction if fraction is not None else (done_rows / total_rows if total_rows else 0.0)
+
+
+class JobManager:
+    def __init__(self, max_concurrent=MAX_CONCURRENT_JOBS, keep_finished=MAX_FINISHED_JOBS, store=None,
+                 frames=None):
+        self.max_concurrent = max_concurrent
+        self.keep_finished = keep_finished
+        self.store = store
+        self.frames = frames if frames is not None else SessionFrames()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='batch-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def running_count(self):
+        with self._lock:
+            return sum(job.status == RUNNING for job in self._jobs.values())
+
+    def queued_count(self):
+        with self._lock:
+            return sum(job.status == QUEUED for job in self._jobs.values())
+
+    def submit_frame(self, data, client, file_name, rejected=None, fingerprint=None, **options):
+        """Encola la predicción de un DataFrame ya validado.
+
+        ``rejected`` son las filas que no pasaron la validación (se conservan
+        para descargarlas junto con el resultado). ``fingerprint`` identifica
+        el archivo de origen en el almacén de resultados.
+        """
+        job = self._register(file_name, streaming=False, options=options)
+        job.fingerprint = fingerprint
+        if rejected is not None:
+            job.rejected, job.rejected_rows = rejected, len(rejected)
+        self._executor.submit(self._run_frame, job, data, client, options)
+        return job
+
+    def submit_file(self, file_obj, client, file_name, fingerprint=None, **options):
+        """Encola la predicción en streaming de un CSV (archivo abierto en modo binario).
+
+        El archivo se copia por bloques a un temporal que el trabajo lee desde
+        disco (y borra al terminar): el trabajo no guarda el contenido en memoria.
+        """
+        with tempfile.NamedTemporaryFile(prefix='salud_lote_', suffix='.csv', delete=False) as spool:
+            file_obj.seek(0)
+            shutil.copyfileobj(file_obj, spool, SPOOL_BUFFER_BYTES)
+        job = self._register(file_name, streaming=True, options=options)
+        job.fingerprint = fingerprint
+        self._executor.submit(self._run_file, job, spool.name, client, options)
+        return job
+
+    def _register(self, file_name, streaming, options):
+        # Se llama desde el script de la sesión que envía el trabajo
+        job = BatchJob(id=uuid.uuid4().hex[:8], file_name=file_name, streaming=streaming,
+                       wire_format=options.get('wire_format'), owner=current_session_id(), frames=self.frames)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            self._jobs.pop(job_id).discard_frames()
+
+    def _run(self, job, work):
+        """Ejecuta ``work``; si devuelve una función de guardado, la llama después de completar el trabajo."""
+        job.status = RUNNING
+        job.started_at = time.time()
+        save = None
+        try:
+            save = work()
+            job.progress = 1.0
+            job.status = DONE
+        except BatchPredictionError as e:
+            job.error, job.error_detail = str(e), e.detail
+            job.status = FAILED
+        except Exception as e:
+            job.error = f"Error procesando el lote: {e}"
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+        if save is not None and job.status == DONE:
+            job.storing = True
+            try:
+                self._store(job, save)
+            finally:
+                job.storing = False
+
+    def _run_frame(self, job, data, client, options):
+        def work():
+            result = run_batch_prediction(data[REQUIRED_COLUMNS], client, progress_callback=job._update_progress,
+                                          **options)
+            results = data.copy()
+            results['prediccion'] = result.predictions
+            results['prediccion_texto'] = results['prediccion'].map(PREDICTION_LABELS)
+            results['fecha_procesamiento'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            job.data = results
+            job.cube = ResultsCube.build(results)
+            job.total_rows = job.done_rows = len(results)
+            job.high_risk_rows = int(result.predictions.sum())
+            job.result = result
+            if self.store is not None:
+                high_risk = result.probabilities[:, -1] if result.probabilities is not None else None
+                return lambda: self.store.save_frame(results, job.fingerprint, job.file_name,
+                                                     options.get('model_version'), high_risk, job.cube,
+                                                     job.rejected_rows)
+        self._run(job, work)
+
+    def _store(self, job, save):
+        # Un error del almacén no invalida el resultado, que sigue disponible en memoria
+        try:
+            job.run_id = save()
+        except (sqlite3.Error, OSError) as e:
+            job.store_error = f"No se pudo guardar el resultado: {e}"
+
+    def _run_file(self, job, path, client, options):
+        try:
+            with open(path, 'rb') as file_obj:
+                self._stream_file(job, file_obj, max(os.path.getsize(path), 1), client, options)
+        finally:
+            os.remove(path)
+
+    def _stream_file(self, job, file_obj, size, client, options):
+
+        def on_progress(done_rows, total_rows, elapsed):
+            # Total desconocido: el avance se estima por los bytes leídos
+            job._update_progress(done_rows, total_rows, elapsed, fraction=min(file_obj.tell() / size, 1.0))
+
+        writer = None
+        if self.store is not None:
+            try:
+                writer = self.store.open_run(job.fingerprint, job.file_name, options.get('model_version'))
+            except (sqlite3.Error, OSError) as e:
+                job.store_error = f"No se pudo guardar el resultado: {e}"
+
+        def on_block(partial, block, high_risk):
+            nonlocal writer
+            if writer is not None:
+                try:
+                    writer.append(block, high_risk)
+                except (sqlite3.Error, OSError) as e:
+                    job.store_error = f"No se pudo guardar el resultado: {e}"
+                    writer.abort()
+                    writer = None
+            job.rejected_rows = partial.rejected_rows
+            # El cubo se acumula bloque a bloque: el análisis no necesita el archivo en memoria
+            if job.cube is None:
+                job.cube = ResultsCube(ResultsCube.features_of(block))
+            job.cube.update(block)
+            job.high_risk_rows = partial.high_risk_rows
+
+        def work():
+            result = stream_batch_prediction(file_obj, client, progress_callback=on_progress,
+                                             partial_callback=on_block, **options)
+            job.total_rows = job.done_rows = result.total_rows
+            job.high_risk_rows = result.high_risk_rows
+            job.rejected_rows = result.rejected_rows
+            job.result = result
+            if writer is not None:
+                return lambda: writer.finish(job.cube, job.rejected_rows) or writer.run_id
+        self._run(job, work)
+        if writer is not None and job.run_id is None:
+            writer.abort()
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_manager():
+    # Un gestor por proceso: el límite de concurrencia es global a todas las sesiones
+    return JobManager(store=get_result_store(), frames=get_session_frames())
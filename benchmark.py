@@ -0,0 +1,302 @@
+"""Benchmarks locales del flujo de predicción por lotes.
+
+Se ejecutan contra la API simulada (``mock_api.py``), sin red externa::
+
+    python benchmark.py wire --rows 100000
+    python benchmark.py pipeline --rows 10000 100000 1000000 --out resultados.json
+    python benchmark.py compare base.json resultados.json
+
+``pipeline`` recorre el flujo por lotes en memoria etapa por etapa (lectura
+del CSV, validación, agrupación de filas repetidas, serialización, ida y
+vuelta HTTP, combinación de predicciones, cubo de resultados y exportación a
+CSV) sobre archivos sintéticos, y mide el tiempo y el pico de memoria de cada
+etapa. El tiempo se mide en una pasada sin ``tracemalloc`` (que hace de 5 a
+8 veces más lentas la serialización y la exportación) y la memoria en una
+segunda pasada con el rastreo activo. Con ``--api-url`` se usa una API ya iniciada (p. ej. ``python
+mock_api.py`` en otro proceso, para que el servidor no comparta el GIL ni
+cuente en la memoria medida).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from api_client import ApiClient
+from batch_engine import (DEFAULT_CHUNK_SIZE, DEFAULT_MAX_WORKERS, PREDICTION_LABELS, BatchPredictionError,
+                          run_batch_prediction, split_chunks)
+from categorical import REQUIRED_COLUMNS, row_group_ids, to_categorical
+from mock_api import MockApiConfig, start_server
+from results_cube import ResultsCube
+from synthetic import generate_population, write_population_csv
+from validation import validate_batch
+from wire_format import RECORDS, available_formats, decode_predictions, encode_batch
+
+PIPELINE_ROWS = [10_000, 100_000, 1_000_000]
+
+
+def bench_wire_formats(n_rows=100_000, chunk_size=5000, max_workers=4, seed=42):
+    """Compara los formatos de transmisión: bytes enviados y tiempo total.
+
+    Usa la población sintética (``synthetic.py``), dentro del vocabulario que
+    acepta la validación, como ``bench_pipeline``.
+    """
+    frame = generate_population(n_rows, seed=seed)
+    server, base_url = start_server()
+    client = ApiClient(base_url)
+    results = []
+    try:
+        for fmt in available_formats():
+            payload_bytes = sum(
+                len(encode_batch(frame.iloc[start:stop], fmt)[0])
+                for start, stop in split_chunks(n_rows, chunk_size)
+            )
+            start_time = time.perf_counter()
+            # Sin deduplicar ni caché: se mide el costo de transmisión de todas las filas
+            result = run_batch_prediction(frame, client, chunk_size=chunk_size, max_workers=max_workers,
+                                          deduplicate=False, wire_format=fmt)
+            elapsed = time.perf_counter() - start_time
+            results.append({
+                'formato': fmt,
+                'filas': n_rows,
+                'bytes_enviados': payload_bytes,
+                'bytes_por_fila': payload_bytes / n_rows,
+                'segundos': elapsed,
+                'filas_por_segundo': n_rows / elapsed,
+                'alto_riesgo': int(result.predictions.sum()),
+            })
+    finally:
+        client.close()
+        server.shutdown()
+    return pd.DataFrame(results)
+
+
+class StageTimer:
+    """Tiempo de cada etapa medida con ``stage`` y, si ``tracemalloc`` está activo, su pico de memoria.
+
+    ``stage`` entrega el registro de la etapa; si el número de filas solo se
+    conoce al final, se puede asignar ``registro['filas']`` dentro del bloque.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        record = {'etapa': name, 'filas': rows}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            rows = record['filas']
+            record['segundos'] = round(elapsed, 4)
+            record['filas_por_segundo'] = round(rows / elapsed) if rows and elapsed > 0 else None
+            if tracing:
+                record['pico_mb'] = round((tracemalloc.get_traced_memory()[1] - base) / 1024 ** 2, 2)
+            self.stages.append(record)
+
+
+def _post_body(client, body, headers):
+    response = client.post('/batch_predict', data=body, headers=headers)
+    if response.status_code != 200:
+        raise BatchPredictionError(f"Error en la API: {response.status_code}", status_code=response.status_code)
+    return decode_predictions(response)
+
+
+def run_pipeline(csv_path, client, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=DEFAULT_MAX_WORKERS,
+                 wire_format=RECORDS, deduplicate=True):
+    """Ejecuta el flujo por lotes en memoria sobre ``csv_path`` midiendo cada etapa.
+
+    Las etapas usan las mismas funciones que la app (``to_categorical``,
+    ``validate_batch``, ``row_group_ids``, ``encode_batch``, ``ResultsCube``);
+    la serialización se separa del envío para medir cada una por su cuenta.
+    """
+    timer = StageTimer()
+    with timer.stage('lectura_csv') as record:
+        data, _ = to_categorical(pd.read_csv(csv_path))
+        n_rows = record['filas'] = len(data)
+
+    with timer.stage('validacion', n_rows):
+        data = data[validate_batch(data).valid_mask]
+
+    with timer.stage('agrupacion', len(data)):
+        if deduplicate:
+            group_ids, first_positions = row_group_ids(data[REQUIRED_COLUMNS])
+        else:
+            group_ids = first_positions = np.arange(len(data))
+        unique_rows = data[REQUIRED_COLUMNS].iloc[first_positions]
+
+    chunks = split_chunks(len(unique_rows), chunk_size)
+    with timer.stage('serializacion', len(unique_rows)):
+        bodies = [encode_batch(unique_rows.iloc[start:stop], wire_format) for start, stop in chunks]
+
+    with timer.stage('http', len(unique_rows)):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            responses = list(executor.map(lambda item: _post_body(client, *item), bodies))
+    del bodies
+
+    with timer.stage('combinacion', len(data)):
+        unique_predictions = np.concatenate([predictions for predictions, _ in responses])
+        results = data.copy()
+        results['prediccion'] = unique_predictions[group_ids]
+        results['prediccion_texto'] = results['prediccion'].map(PREDICTION_LABELS)
+        results['fecha_procesamiento'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    with timer.stage('cubo_resultados', len(results)):
+        ResultsCube.build(results)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with timer.stage('exportacion_csv', len(results)):
+            results.to_csv(os.path.join(tmp, 'resultados.csv'), index=False)
+
+    return {
+        'filas': n_rows,
+        'filas_validas': len(data),
+        'filas_unicas': len(unique_rows),
+        'bloques': len(chunks),
+        'alto_riesgo': int(results['prediccion'].sum()),
+        'total_segundos': round(sum(stage['segundos'] for stage in timer.stages), 4),
+        'etapas': timer.stages,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _traced_pipeline(*args):
+    tracemalloc.start()
+    try:
+        return run_pipeline(*args)
+    finally:
+        tracemalloc.stop()
+
+
+def bench_pipeline(row_counts=PIPELINE_ROWS, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=DEFAULT_MAX_WORKERS,
+                   wire_format=RECORDS, deduplicate=True, api_url=None, api_config=None, seed=42,
+                   measure_memory=True):
+    """Corre ``run_pipeline`` sobre un CSV sintético por cada tamaño; devuelve el informe completo."""
+    server = None
+    if api_url is None:
+        server, api_url = start_server(config=api_config)
+    client = ApiClient(api_url)
+    runs = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for n_rows in row_counts:
+                csv_path = os.path.join(tmp, f'poblacion_{n_rows}.csv')
+                write_population_csv(csv_path, n_rows, seed=seed)
+                pipeline_args = (csv_path, client, chunk_size, max_workers, wire_format, deduplicate)
+                run = run_pipeline(*pipeline_args)
+                if measure_memory:
+                    traced = _traced_pipeline(*pipeline_args)
+                    for stage, traced_stage in zip(run['etapas'], traced['etapas']):
+                        stage['pico_mb'] = traced_stage['pico_mb']
+                run['bytes_csv'] = os.path.getsize(csv_path)
+                runs.append(run)
+                os.remove(csv_path)
+    finally:
+        client.close()
+        if server is not None:
+            server.shutdown()
+    return {
+        'commit': _git_commit(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'parametros': {
+            'chunk_size': chunk_size,
+            'max_workers': max_workers,
+            'wire_format': wire_format,
+            'deduplicate': deduplicate,
+            'api': 'externa' if server is None else 'en proceso',
+            'api_config': vars(api_config) if api_config is not None else None,
+            'seed': seed,
+            'memoria': 'tracemalloc (pasada aparte)' if measure_memory else None,
+        },
+        'corridas': runs,
+    }
+
+
+def stage_table(report):
+    """Una fila por tamaño y etapa, para mostrar o comparar."""
+    rows = [dict(stage, tamaño=run['filas']) for run in report['corridas'] for stage in run['etapas']]
+    return pd.DataFrame(rows).set_index(['tamaño', 'etapa'])
+
+
+def compare_reports(base, new):
+    """Tiempos y picos de memoria de ``new`` relativos a ``base`` (ratio > 1 = más lento)."""
+    columns = ['segundos', 'pico_mb']
+    table = stage_table(base).reindex(columns=columns).join(
+        stage_table(new).reindex(columns=columns), lsuffix='_base', rsuffix='_nuevo', how='inner')
+    table['ratio_tiempo'] = (table['segundos_nuevo'] / table['segundos_base']).round(2)
+    table['ratio_memoria'] = (table['pico_mb_nuevo'] / table['pico_mb_base'].where(lambda x: x > 0)).round(2)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del flujo de predicción por lotes")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    wire = subparsers.add_parser('wire', help="Comparar formatos de transmisión")
+    wire.add_argument('--rows', type=int, default=100_000)
+    wire.add_argument('--chunk-size', type=int, default=5000)
+    wire.add_argument('--workers', type=int, default=4)
+    wire.add_argument('--seed', type=int, default=42)
+    pipeline = subparsers.add_parser('pipeline', help="Tiempo y memoria por etapa del flujo por lotes")
+    pipeline.add_argument('--rows', type=int, nargs='+', default=PIPELINE_ROWS)
+    pipeline.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    pipeline.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS)
+    pipeline.add_argument('--wire-format', default=RECORDS, choices=available_formats())
+    pipeline.add_argument('--no-dedup', action='store_true', help="Enviar todas las filas, sin agrupar repetidas")
+    pipeline.add_argument('--api-url', default=None, help="API ya iniciada (por defecto una simulada en proceso)")
+    pipeline.add_argument('--latency', type=float, default=0.0, help="Latencia de la API simulada en proceso")
+    pipeline.add_argument('--seed', type=int, default=42)
+    pipeline.add_argument('--no-memory', action='store_true', help="Omitir la pasada que mide memoria")
+    pipeline.add_argument('--out', default=None, help="Archivo JSON con los resultados")
+    compare = subparsers.add_parser('compare', help="Comparar dos resultados de pipeline")
+    compare.add_argument('base')
+    compare.add_argument('new')
+    args = parser.parse_args()
+
+    if args.command == 'wire':
+        print(bench_wire_formats(args.rows, args.chunk_size, args.workers, args.seed).to_string(index=False))
+    elif args.command == 'pipeline':
+        report = bench_pipeline(args.rows, args.chunk_size, args.workers, args.wire_format, not args.no_dedup,
+                                args.api_url, MockApiConfig(latency=args.latency), args.seed,
+                                measure_memory=not args.no_memory)
+        print(stage_table(report).to_string())
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, indent=2, ensure_ascii=False)
+            print(f"Resultados guardados en {args.out}")
+    elif args.command == 'compare':
+        with open(args.base, encoding='utf-8') as handle:
+            base = json.load(handle)
+        with open(args.new, encoding='utf-8') as handle:
+            new = json.load(handle)
+        print(compare_reports(base, new).to_string())
+
+
+if __name__ == '__main__':
+    main()
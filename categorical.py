@@ -0,0 +1,177 @@
+"""Vocabulario de las variables del modelo y representación categórica compacta.
+
+Las siete columnas del modelo tienen baja cardinalidad, así que se guardan
+como ``category`` con un vocabulario fijo (el mismo del formulario de
+predicción individual). Las agregaciones de las páginas de análisis operan
+sobre los códigos enteros en lugar de las cadenas.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Columnas que requiere el modelo
+REQUIRED_COLUMNS = ['Genero', 'Grupo_etario', 'Tipo_afiliado', 'Departamento', 'Municipio', 'Zona', 'Nivel_Sisben']
+
+# Opciones del formulario de predicción individual (vocabulario fijo por columna)
+FEATURE_VOCABULARIES = {
+    'Genero': ["Masculino", "Femenino"],
+    'Grupo_etario': [
+        "< 1", "1 a 5", "5 a 15", "15 a 19", "19 a 45",
+        "45 a 50", "50 a 55", "55 a 60", "60 a 65",
+        "65 a 70", "70 a 75", "> 75"
+    ],
+    'Tipo_afiliado': [
+        "COTIZANTE", "BENEFICIARIO", "CABEZA DE FAMILIA",
+        "ADICIONAL", "OTRO MIEMBRO DEL NUCLEO FAMILIAR"
+    ],
+    'Departamento': [
+        "BOGOTA D.C.", "ANTIOQUIA", "VALLE", "CUNDINAMARCA",
+        "ATLANTICO", "SANTANDER", "BOLIVAR", "NARIÑO",
+        "BOYACA", "CORDOBA", "META", "TOLIMA", "OTRO"
+    ],
+    'Zona': [
+        "Urbana", "Rural", "Urbana-Cabecera Municipal",
+        "Rural - Dispersal", "Rural - Resto Rural",
+        "Urbana - Centro Poblado"
+    ],
+    'Nivel_Sisben': [
+        "1", "2", "3", "4", "NO APLICA", "POBLACIÓN CON SISBEN",
+        "VÍCTIMAS DEL CONFLICTO ARMADO INTERNO", "MIGRACION"
+    ],
+}
+
+# Catálogo incorporado de municipios por departamento (el primero es la capital)
+DEFAULT_MUNICIPIOS = {
+    "BOGOTA D.C.": ["BOGOTA D.C."],
+    "ANTIOQUIA": ["MEDELLIN", "BELLO", "ITAGUI", "ENVIGADO", "APARTADO", "RIONEGRO", "TURBO", "CAUCASIA"],
+    "VALLE": ["CALI", "BUENAVENTURA", "PALMIRA", "TULUA", "CARTAGO", "BUGA", "JAMUNDI", "YUMBO"],
+    "CUNDINAMARCA": ["SOACHA", "FACATATIVA", "ZIPAQUIRA", "CHIA", "FUSAGASUGA", "GIRARDOT", "MOSQUERA"],
+    "ATLANTICO": ["BARRANQUILLA", "SOLEDAD", "MALAMBO", "SABANALARGA", "PUERTO COLOMBIA"],
+    "SANTANDER": ["BUCARAMANGA", "FLORIDABLANCA", "GIRON", "PIEDECUESTA", "BARRANCABERMEJA", "SAN GIL"],
+    "BOLIVAR": ["CARTAGENA", "MAGANGUE", "TURBACO", "ARJONA", "EL CARMEN DE BOLIVAR"],
+    "NARIÑO": ["PASTO", "TUMACO", "IPIALES", "TUQUERRES"],
+    "BOYACA": ["TUNJA", "DUITAMA", "SOGAMOSO", "CHIQUINQUIRA", "PAIPA"],
+    "CORDOBA": ["MONTERIA", "CERETE", "LORICA", "SAHAGUN", "MONTELIBANO"],
+    "META": ["VILLAVICENCIO", "ACACIAS", "GRANADA", "PUERTO LOPEZ"],
+    "TOLIMA": ["IBAGUE", "ESPINAL", "MELGAR", "HONDA", "CHAPARRAL"],
+    "OTRO": ["CUCUTA", "PEREIRA", "MANIZALES", "ARMENIA", "SANTA MARTA", "VALLEDUPAR", "NEIVA",
+             "POPAYAN", "SINCELEJO", "RIOHACHA", "QUIBDO", "FLORENCIA", "YOPAL"],
+}
+
+
+def load_municipios(path, defaults=DEFAULT_MUNICIPIOS):
+    """Catálogo de municipios desde un CSV con columnas ``Departamento`` y ``Municipio``.
+
+    Solo se leen los departamentos del vocabulario (los demás se rechazan en
+    la validación); los que no aparezcan en el archivo conservan el catálogo
+    incorporado.
+    """
+    frame = pd.read_csv(path, usecols=['Departamento', 'Municipio'], dtype=str).dropna()
+    catalogue = {dept: list(names) for dept, names in defaults.items()}
+    for dept, names in frame.groupby(frame['Departamento'].str.strip(), sort=False)['Municipio']:
+        if dept in FEATURE_VOCABULARIES['Departamento']:
+            catalogue[dept] = list(dict.fromkeys(names.str.strip()))
+    return catalogue
+
+
+# Catálogo vigente (tabla de riesgo y población sintética); ``SALUD_MUNICIPIOS`` apunta a un CSV propio
+MUNICIPIOS_FILE = os.environ.get('SALUD_MUNICIPIOS')
+MUNICIPIOS = load_municipios(MUNICIPIOS_FILE) if MUNICIPIOS_FILE else DEFAULT_MUNICIPIOS
+
+
+def _normalized_factorize(series):
+    # Factorizar primero y normalizar solo los valores únicos (p. ej. Nivel_Sisben
+    # leído como entero desde el CSV, espacios sobrantes, celdas vacías)
+    codes, uniques = pd.factorize(series)
+    labels = pd.Index([str(value).strip() for value in uniques], dtype=object)
+    labels = labels.where(labels != '', None)
+    return codes, labels
+
+
+def to_categorical(data, columns=REQUIRED_COLUMNS):
+    """Convierte las columnas del modelo a ``category`` con vocabulario fijo.
+
+    Los valores fuera del vocabulario no se descartan: se agregan al final de
+    las categorías (los códigos de los valores conocidos no cambian) y se
+    reportan en el segundo valor devuelto como ``{columna: {valor: conteo}}``.
+    Las columnas sin vocabulario fijo (``Municipio``) toman sus categorías de
+    los datos.
+    """
+    data = data.copy()
+    unknown = {}
+    for col in columns:
+        if col not in data.columns:
+            continue
+        codes, labels = _normalized_factorize(data[col])
+        present = labels[labels.notna()]
+
+        vocabulary = FEATURE_VOCABULARIES.get(col)
+        if vocabulary is None:
+            categories = pd.Index(sorted(set(present)), dtype=object)
+        else:
+            extra = sorted(set(present) - set(vocabulary))
+            if extra:
+                counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+                extra_counts = pd.Series(counts, index=labels).groupby(level=0).sum()[extra]
+                unknown[col] = {value: int(count) for value, count
+                                in extra_counts.sort_values(ascending=False).items()}
+            categories = pd.Index(list(vocabulary) + extra, dtype=object)
+
+        # Reasignar códigos: único factorizado -> posición en el vocabulario
+        remap = categories.get_indexer(labels)
+        new_codes = np.where(codes >= 0, remap[codes], -1)
+        data[col] = pd.Categorical.from_codes(new_codes, categories=categories)
+    return data, unknown
+
+
+def category_codes(series):
+    """Códigos enteros (``-1`` = faltante) y etiquetas de una columna."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    codes, labels = pd.factorize(series, sort=True)
+    return codes, labels
+
+
+def row_group_ids(data, columns=None):
+    """Identificador de combinación única por fila (orden de primera aparición).
+
+    Combina los códigos de cada columna en una sola clave entera,
+    refactorizando tras cada columna para que nunca desborde. Devuelve
+    ``(ids, posiciones)`` donde ``posiciones[k]`` es la primera fila con id ``k``.
+    """
+    columns = list(data.columns) if columns is None else columns
+    group_ids = np.zeros(len(data), dtype=np.int64)
+    n_groups = 1
+    for col in columns:
+        codes, labels = category_codes(data[col])
+        # -1 (faltante) se desplaza a 0 para que cuente como un valor más
+        combined = group_ids * (len(labels) + 1) + (codes.astype(np.int64) + 1)
+        group_ids, uniques = pd.factorize(combined)
+        n_groups = len(uniques)
+    _, first_positions = np.unique(group_ids, return_index=True)
+    return group_ids, first_positions[:n_groups]
+
+
+def collapse_top_n(counts, sums, max_rows, max_cols, other_label='Otros'):
+    """Conserva las ``max_rows``/``max_cols`` categorías con más registros.
+
+    El resto de cada eje se suma en una fila/columna ``other_label``; como se
+    agregan conteos y sumas (no medias), la media de la celda agrupada sigue
+    siendo exacta.
+    """
+    def collapse(frame_counts, frame_sums, limit):
+        if len(frame_counts) <= limit:
+            return frame_counts, frame_sums
+        order = np.argsort(-frame_counts.sum(axis=1).to_numpy(), kind='stable')
+        keep, rest = order[:limit], order[limit:]
+        other_counts = frame_counts.iloc[rest].sum().to_frame(other_label).T
+        other_sums = frame_sums.iloc[rest].sum().to_frame(other_label).T
+        collapsed_counts = pd.concat([frame_counts.iloc[keep], other_counts])
+        collapsed_sums = pd.concat([frame_sums.iloc[keep], other_sums])
+        collapsed_counts.index.name = collapsed_sums.index.name = frame_counts.index.name
+        return collapsed_counts, collapsed_sums
+
+    counts, sums = collapse(counts, sums, max_rows)
+    counts, sums = collapse(counts.T, sums.T, max_cols)
+    return counts.T, sums.T
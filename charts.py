@@ -0,0 +1,250 @@
+"""Gráficos de la aplicación con caché de imágenes renderizadas.
+
+Cada gráfico es una función ``dibujar(fig, *datos, **parámetros)`` que
+recibe los datos ya agregados. ``show_chart`` calcula una huella de esos
+datos y parámetros; si la imagen ya se renderizó, se sirve desde la caché
+sin tocar matplotlib. Si no, se crea la figura, se exporta a PNG o SVG y se
+cierra en el mismo paso, de modo que no quedan figuras abiertas entre reruns.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from metrics import count, timer
+
+DEFAULT_FORMAT = 'png'
+DEFAULT_DPI = 100
+MAX_CACHE_BYTES = 64 * 1024**2
+
+# Mapa de calor: categorías por eje antes de agrupar el resto y celdas con texto
+HEATMAP_MAX_CATEGORIES = 30
+HEATMAP_MAX_ANNOTATED_CELLS = 400
+
+RISK_LABELS = ['Bajo Riesgo', 'Alto Riesgo']
+RISK_COLORS = ['#4CAF50', '#F44336']
+
+# pyplot no es seguro entre hilos y cada sesión de Streamlit corre en uno propio
+_RENDER_LOCK = threading.Lock()
+
+
+def fingerprint(*parts):
+    """Huella estable de DataFrames, Series, arreglos y valores simples."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+            names = list(part.columns) if isinstance(part, pd.DataFrame) else [part.name]
+            digest.update(repr((names, list(part.index.names), part.shape)).encode('utf-8'))
+        elif isinstance(part, np.ndarray):
+            digest.update(np.ascontiguousarray(part).tobytes())
+            digest.update(repr((part.dtype.str, part.shape)).encode('utf-8'))
+        else:
+            digest.update(repr(part).encode('utf-8'))
+        digest.update(b'|')
+    return digest.hexdigest()
+
+
+class FigureCache:
+    """LRU de imágenes renderizadas acotada por tamaño total en bytes."""
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return image
+
+    def put(self, key, image):
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = image
+            self._size += len(image)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+@st.cache_resource(show_spinner=False)
+def get_figure_cache():
+    # Una caché por proceso, compartida por todas las sesiones
+    return FigureCache()
+
+
+def render_chart(draw, *data, figsize=(10, 6), fmt=DEFAULT_FORMAT, dpi=DEFAULT_DPI, **params):
+    """Renderiza ``draw`` a bytes PNG/SVG y cierra la figura."""
+    with _RENDER_LOCK, timer('render_grafico'):
+        fig = plt.figure(figsize=figsize)
+        try:
+            draw(fig, *data, **params)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+            return buffer.getvalue()
+        finally:
+            plt.close(fig)
+
+
+def cached_chart(draw, *data, figsize=(10, 6), fmt=DEFAULT_FORMAT, dpi=DEFAULT_DPI, **params):
+    """Como ``render_chart`` pero consulta primero la caché de figuras."""
+    key = (draw.__module__, draw.__qualname__, fmt, dpi,
+           fingerprint(figsize, *data, *sorted(params.items())))
+    cache = get_figure_cache()
+    image = cache.get(key)
+    count('cache_graficos', resultado='acierto' if image is not None else 'fallo')
+    if image is None:
+        image = render_chart(draw, *data, figsize=figsize, fmt=fmt, dpi=dpi, **params)
+        cache.put(key, image)
+    return image
+
+
+def show_chart(draw, *data, figsize=(10, 6), fmt=DEFAULT_FORMAT, **params):
+    """Muestra un gráfico en la página, renderizándolo solo si cambió."""
+    image = cached_chart(draw, *data, figsize=figsize, fmt=fmt, **params)
+    if fmt == 'svg':
+        image = image.decode('utf-8')
+    st.image(image, width="stretch")
+
+
+# --- Gráficos ---
+
+def bar_counts(fig, counts, title, ylabel='Frecuencia'):
+    ax = fig.subplots()
+    counts.plot(kind='bar', ax=ax, color='skyblue')
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+def pie_counts(fig, counts, title):
+    ax = fig.subplots()
+    ax.pie(counts.values, labels=counts.index, autopct='%1.1f%%', startangle=90)
+    ax.set_title(title)
+
+
+def stacked_percent(fig, table, title, legend_title):
+    ax = fig.subplots()
+    table.plot(kind='bar', ax=ax, stacked=True)
+    ax.set_title(title)
+    ax.set_ylabel('Porcentaje (%)')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.legend(title=legend_title, bbox_to_anchor=(1.05, 1), loc='upper left')
+
+
+def probability_bars(fig, prob_low, prob_high):
+    ax = fig.subplots()
+    bars = ax.bar(RISK_LABELS, [prob_low, prob_high], color=RISK_COLORS)
+    ax.set_ylabel('Probabilidad (%)')
+    ax.set_ylim(0, 100)
+
+    # Agregar valores en las barras
+    for bar, value in zip(bars, [prob_low, prob_high]):
+        ax.text(bar.get_x() + bar.get_width() / 2., bar.get_height() + 1,
+                f'{value:.1f}%', ha='center', va='bottom')
+
+
+def prediction_summary(fig, low, high):
+    """Torta y barras de la distribución de predicciones, lado a lado."""
+    pie_ax, bar_ax = fig.subplots(1, 2)
+    sizes = [low, high]
+
+    pie_ax.pie(sizes, labels=RISK_LABELS, colors=RISK_COLORS, autopct='%1.1f%%', startangle=90)
+    pie_ax.set_title('Distribución de Predicciones')
+
+    bar_ax.bar(RISK_LABELS, sizes, color=RISK_COLORS)
+    bar_ax.set_title('Conteo de Predicciones')
+    bar_ax.set_ylabel('Número de Registros')
+    for i, v in enumerate(sizes):
+        bar_ax.text(i, v + max(sizes) * 0.01, f'{v:,}', ha='center')
+    fig.tight_layout()
+
+
+def risk_pie(fig, low, high):
+    ax = fig.subplots()
+    ax.pie([low, high], explode=(0.05, 0.05), labels=RISK_LABELS, colors=RISK_COLORS, autopct='%1.1f%%',
+           shadow=True, startangle=90)
+    ax.axis('equal')
+    ax.set_title('Distribución de Predicciones', fontsize=16, fontweight='bold')
+
+
+def risk_barh(fig, low, high):
+    ax = fig.subplots()
+    sizes = [low, high]
+    y_pos = np.arange(len(RISK_LABELS))
+    ax.barh(y_pos, sizes, color=RISK_COLORS)
+    ax.set_yticks(y_pos)
+    ax.set_yticklabels(RISK_LABELS)
+    ax.set_xlabel('Número de Registros')
+    ax.set_title('Conteo de Predicciones por Categoría')
+
+    # Agregar valores en las barras
+    for i, v in enumerate(sizes):
+        ax.text(v + max(sizes) * 0.01, i, f'{v:,}', va='center')
+
+
+def feature_risk_bars(fig, table, feature):
+    ax = fig.subplots()
+    table.plot(kind='bar', ax=ax, color=RISK_COLORS)
+    ax.set_ylabel('Porcentaje (%)')
+    ax.set_title(f'Distribución de Predicciones por {feature}', fontweight='bold')
+    ax.legend(RISK_LABELS)
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+    fig.tight_layout()
+
+
+def risk_heatmap(fig, pivot_table, feature1, feature2, annotate=True):
+    """Mapa de calor con una sola llamada a ``imshow``.
+
+    Las celdas sin registros quedan en blanco; el texto por celda solo se
+    dibuja si ``annotate`` y la grilla tiene a lo sumo
+    ``HEATMAP_MAX_ANNOTATED_CELLS`` celdas.
+    """
+    ax = fig.subplots()
+    values = np.ma.masked_invalid(pivot_table.to_numpy(dtype=float))
+    im = ax.imshow(values, cmap='Reds', aspect='auto', vmin=0, vmax=100, interpolation='nearest')
+
+    # Etiquetas
+    ax.set_xticks(np.arange(len(pivot_table.columns)))
+    ax.set_yticks(np.arange(len(pivot_table.index)))
+    ax.set_xticklabels(pivot_table.columns, rotation=45, ha='right')
+    ax.set_yticklabels(pivot_table.index)
+    ax.set_xlabel(feature2)
+    ax.set_ylabel(feature1)
+    ax.set_title(f'Porcentaje de Alto Riesgo por {feature1} y {feature2}')
+
+    # Barra de color
+    cbar = fig.colorbar(im, ax=ax)
+    cbar.set_label('Porcentaje de Alto Riesgo (%)')
+
+    # Texto en las celdas (solo grillas legibles)
+    if annotate and values.size <= HEATMAP_MAX_ANNOTATED_CELLS:
+        rows, cols = np.nonzero(~np.ma.getmaskarray(values))
+        cell_values = values.data[rows, cols]
+        colors = np.where(cell_values > 60, 'white', 'black')
+        for i, j, value, color in zip(rows, cols, cell_values, colors):
+            ax.text(j, i, f'{value:.1f}%', ha="center", va="center", color=color, fontweight='bold')
@@ -0,0 +1,189 @@
+"""Estadísticas incrementales para el análisis exploratorio.
+
+``EdaStats`` acumula, bloque a bloque, el número de filas, los nulos por
+columna, los tipos de datos, la memoria de los bloques convertidos y las
+tablas de frecuencia y de contingencia por pares (un ``ResultsCube`` sin
+columna objetivo). Así la página puede mostrar gráficos parciales mientras
+el CSV se sigue leyendo, sin esperar a tener el archivo completo en memoria.
+Dos acumuladores se pueden combinar con ``merge``.
+
+En modo aproximado solo las columnas de pocas categorías entran al cubo; las
+demás se resumen con ``SpaceSaving`` (top-K) y ``HyperLogLog`` (valores
+distintos), de modo que la memoria no crece con la cardinalidad. En modo
+exacto las columnas que no entran al cubo (demasiadas categorías) también
+conservan un ``HyperLogLog`` para su conteo de valores distintos.
+"""
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from categorical import to_categorical
+from metrics import timed_iter
+from results_cube import ResultsCube
+from sketches import DEFAULT_TOP_K, HyperLogLog, SpaceSaving
+
+# Filas por bloque al leer un CSV para el análisis exploratorio
+EDA_CHUNK_ROWS = 50_000
+PREVIEW_ROWS = 10
+
+# Tipos que se ofrecen como variables categóricas en los gráficos
+CATEGORICAL_DTYPES = ('object', 'category', 'string', 'str', 'bool')
+
+# Modo aproximado: columnas con más categorías (en el primer bloque) se resumen con sketches
+APPROX_EXACT_MAX_CATEGORIES = 100
+PIE_MAX_SLICES = 10
+
+
+def _common_dtype(first, second):
+    if str(first) == str(second):  # p. ej. dos CategoricalDtype con categorías distintas
+        return first
+    try:
+        return np.result_type(first, second)
+    except TypeError:
+        return np.dtype(object)
+
+
+class EdaStats:
+    def __init__(self, approximate=False, top_k=DEFAULT_TOP_K):
+        self.approximate = approximate
+        self.top_k = top_k
+        self.top = {}
+        self.distinct = {}
+        self.rows = 0
+        self.columns = []
+        self.nulls = pd.Series(dtype=np.int64)
+        self.dtypes = {}
+        self.memory_bytes = 0
+        self.preview = pd.DataFrame()
+        self.unknown = {}
+        self.cube = None
+
+    def update(self, chunk, unknown=None):
+        """Agrega un bloque ya convertido con ``to_categorical``."""
+        if self.cube is None:
+            self._start(chunk)
+        self.cube.update(chunk, target=None)
+        for col, sketch in self.top.items():
+            sketch.update(chunk[col])
+        for col, sketch in self.distinct.items():
+            sketch.update(chunk[col])
+
+        if len(self.preview) < PREVIEW_ROWS:
+            self.preview = pd.concat([self.preview, chunk.head(PREVIEW_ROWS - len(self.preview))])
+        self.nulls = self.nulls.add(chunk.isna().sum(), fill_value=0).astype(np.int64)
+        for col, dtype in chunk.dtypes.items():
+            self.dtypes[col] = _common_dtype(self.dtypes[col], dtype) if col in self.dtypes else dtype
+        self.memory_bytes += int(chunk.memory_usage(deep=True).sum())
+        self.rows += len(chunk)
+        self._merge_unknown(unknown or {})
+        return self
+
+    def _start(self, chunk):
+        self.columns = list(chunk.columns)
+        if not self.approximate:
+            self.cube = ResultsCube(ResultsCube.features_of(chunk))
+            # Las columnas de demasiadas categorías para el cubo conservan al menos su conteo de distintos
+            self.distinct = {col: HyperLogLog() for col in chunk.columns if col not in self.cube.features}
+            return
+        exact = [col for col in chunk.columns if chunk[col].nunique() <= APPROX_EXACT_MAX_CATEGORIES]
+        self.cube = ResultsCube(exact)
+        self.distinct = {col: HyperLogLog() for col in chunk.columns}
+        self.top = {col: SpaceSaving(self.top_k) for col in chunk.columns
+                    if col not in exact and str(chunk[col].dtype) in CATEGORICAL_DTYPES}
+
+    def merge(self, other):
+        """Combina las estadísticas de otro acumulador (p. ej. de otra parte del archivo)."""
+        if other.cube is None:
+            return self
+        if self.cube is None:
+            self.columns = list(other.columns)
+            self.approximate = other.approximate
+            self.cube = ResultsCube(other.cube.features)
+            self.top = {col: SpaceSaving(sketch.k) for col, sketch in other.top.items()}
+            self.distinct = {col: HyperLogLog(sketch.precision) for col, sketch in other.distinct.items()}
+        self.cube.merge(other.cube)
+        for col, sketch in other.top.items():
+            self.top[col].merge(sketch)
+        for col, sketch in other.distinct.items():
+            self.distinct[col].merge(sketch)
+        if len(self.preview) < PREVIEW_ROWS:
+            self.preview = pd.concat([self.preview, other.preview.head(PREVIEW_ROWS - len(self.preview))])
+        self.nulls = self.nulls.add(other.nulls, fill_value=0).astype(np.int64)
+        for col, dtype in other.dtypes.items():
+            self.dtypes[col] = _common_dtype(self.dtypes[col], dtype) if col in self.dtypes else dtype
+        self.memory_bytes += other.memory_bytes
+        self.rows += other.rows
+        self._merge_unknown(other.unknown)
+        return self
+
+    def _merge_unknown(self, unknown):
+        for col, values in unknown.items():
+            merged = Counter(self.unknown.get(col, {}))
+            merged.update(values)
+            self.unknown[col] = dict(merged.most_common())
+
+    @property
+    def categorical_columns(self):
+        """Columnas con tipo categórico o de texto disponibles para graficar."""
+        columns = [col for col in self.cube.features if str(self.dtypes[col]) in CATEGORICAL_DTYPES]
+        return columns + list(self.top)
+
+    def is_approximate(self, column):
+        return column in self.top
+
+    def nunique_is_estimate(self, column):
+        return column not in self.cube.labels and column in self.distinct
+
+    def nunique(self, column):
+        """Valores distintos: exacto si la columna está en el cubo, si no estimado con HyperLogLog."""
+        if column in self.cube.labels:
+            return int(np.count_nonzero(self.cube.counts[column]))
+        if column in self.distinct:
+            return self.distinct[column].estimate()
+        return None
+
+    def top_counts(self, column, n=None):
+        """Top-K aproximado de una columna resumida: ``count`` estimado y ``error`` máximo."""
+        table = self.top[column].top(n)
+        table.index.name = column
+        return table
+
+    def dtype_counts(self):
+        return pd.Series([str(dtype) for dtype in self.dtypes.values()]).value_counts()
+
+    def value_counts(self, column):
+        """Frecuencias acumuladas, ordenadas como ``value_counts()``.
+
+        Para columnas resumidas devuelve el top-K estimado.
+        """
+        if column in self.top:
+            return self.top_counts(column)['count'].rename('count')
+        counts = self.cube.counts[column]
+        result = pd.Series(counts, index=pd.Index(self.cube.labels[column], name=column), name='count')
+        result = result[result > 0]
+        return result.sort_values(ascending=False, kind='stable')
+
+    def pie_counts(self, column, n=PIE_MAX_SLICES):
+        """Top-``n`` más una porción ``Otros`` con el resto de registros no nulos."""
+        counts = self.value_counts(column)
+        if len(counts) <= n and not self.is_approximate(column):
+            return counts
+        top = counts.head(n)
+        rest = self.rows - int(self.nulls.get(column, 0)) - int(top.sum())
+        return pd.concat([top, pd.Series({'Otros': max(rest, 0)}, name='count')])
+
+    def crosstab(self, index, columns, normalize=None):
+        """Tabla de contingencia acumulada; ``normalize='index'`` como ``pd.crosstab``."""
+        table, _ = self.cube.pair_tables(index, columns)
+        if normalize == 'index':
+            table = table.div(table.sum(axis=1), axis=0)
+        return table
+
+
+def iter_csv_stats(file_obj, chunk_rows=EDA_CHUNK_ROWS, approximate=False):
+    """Lee un CSV por bloques y entrega el acumulador tras cada bloque."""
+    stats = EdaStats(approximate=approximate)
+    for chunk in timed_iter(pd.read_csv(file_obj, chunksize=chunk_rows), 'lectura_csv'):
+        chunk, unknown = to_categorical(chunk)
+        yield stats.update(chunk, unknown)
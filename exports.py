@@ -0,0 +1,205 @@
+"""Exportaciones de resultados generadas bajo demanda y cacheadas en disco.
+
+Los botones de descarga reciben una función (``deferred``) en lugar de los
+bytes: el archivo solo se genera cuando el usuario hace clic y se escribe por
+bloques a un archivo temporal, sin armar el resultado completo en memoria.
+Streamlit sí recibe el contenido completo del archivo para servir la
+descarga (no la transmite por partes), así que lo que se evita es generarlo
+en cada rerun, no tenerlo en memoria al descargarlo. El archivo queda en una
+caché por proceso, con clave
+``(fuente, formato)``; la fuente es la huella del DataFrame de resultados (o
+el id del trabajo, para los archivos del modo streaming), de modo que varias
+descargas del mismo resultado, incluso desde otras sesiones, no lo vuelven a
+generar. La caché está acotada por el espacio total en disco.
+
+Formatos: CSV, CSV comprimido con gzip y Parquet (requiere ``pyarrow``).
+"""
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+
+from charts import fingerprint
+from metrics import timer
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional
+    pa = pq = None
+
+CSV = 'csv'
+CSV_GZIP = 'csv.gz'
+PARQUET = 'parquet'
+
+# formato -> (nombre para el usuario, tipo MIME, extensión)
+EXPORT_FORMATS = {
+    CSV: ('CSV', 'text/csv', '.csv'),
+    CSV_GZIP: ('CSV comprimido (gzip)', 'application/gzip', '.csv.gz'),
+    PARQUET: ('Parquet', 'application/vnd.apache.parquet', '.parquet'),
+}
+
+MAX_EXPORT_DISK_BYTES = 2 * 1024 ** 3
+# Filas por bloque al escribir o convertir un archivo
+EXPORT_CHUNK_ROWS = 100_000
+COPY_BUFFER_BYTES = 1024 ** 2
+# Nivel 6: casi el tamaño del nivel 9 (el de pandas) en la mitad del tiempo
+GZIP_LEVEL = 6
+
+
+def available_formats():
+    formats = [CSV, CSV_GZIP]
+    if pq is not None:
+        formats.append(PARQUET)
+    return formats
+
+
+class ExportCache:
+    """Archivos exportados en un directorio temporal, LRU acotada por bytes en disco."""
+
+    def __init__(self, max_bytes=MAX_EXPORT_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.directory = tempfile.mkdtemp(prefix='salud_exports_')
+        self._entries = OrderedDict()  # (fuente, formato) -> (ruta, bytes)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._source_locks = {}
+
+    def _source_lock(self, source):
+        with self._lock:
+            return self._source_locks.setdefault(source, threading.Lock())
+
+    def get_or_create(self, source, fmt, write):
+        """Ruta del archivo de ``(source, fmt)``; lo genera con ``write(ruta)`` si no existe.
+
+        La generación se serializa por fuente: dos clics simultáneos sobre el
+        mismo resultado no lo escriben dos veces ni leen a la vez el mismo
+        archivo de origen.
+        """
+        key = (source, fmt)
+        with self._source_lock(source):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and os.path.exists(entry[0]):
+                    self._entries.move_to_end(key)
+                    return entry[0]
+
+            path = os.path.join(self.directory, f"{source}{EXPORT_FORMATS[fmt][2]}")
+            partial = path + '.tmp'
+            try:
+                write(partial)
+                os.replace(partial, path)
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+
+            with self._lock:
+                size = os.path.getsize(path)
+                self._entries[key] = (path, size)
+                self._size += size
+                while self._size > self.max_bytes and len(self._entries) > 1:
+                    _, (evicted, evicted_size) = self._entries.popitem(last=False)
+                    self._size -= evicted_size
+                    if os.path.exists(evicted):
+                        os.remove(evicted)
+            return path
+
+    def clear(self):
+        with self._lock:
+            for path, _ in self._entries.values():
+                if os.path.exists(path):
+                    os.remove(path)
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+@st.cache_resource(show_spinner=False)
+def get_export_cache():
+    # Una caché por proceso, compartida por todas las sesiones
+    return ExportCache()
+
+
+# --- Escritura ---
+
+def _write_frame(frame, fmt, path):
+    with timer('exportacion', rows=len(frame)):
+        if fmt == PARQUET:
+            frame.to_parquet(path, index=False)
+        else:
+            compression = {'method': 'gzip', 'compresslevel': GZIP_LEVEL} if fmt == CSV_GZIP else None
+            frame.to_csv(path, index=False, chunksize=EXPORT_CHUNK_ROWS, compression=compression)
+
+
+def _write_csv_file(file_obj, fmt, path):
+    """Convierte un CSV ya escrito (archivo de texto abierto) sin cargarlo completo."""
+    with timer('exportacion'):
+        file_obj.seek(0)
+        if fmt == CSV:
+            with open(path, 'w', encoding='utf-8', newline='') as out:
+                shutil.copyfileobj(file_obj, out, COPY_BUFFER_BYTES)
+        elif fmt == CSV_GZIP:
+            with gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=GZIP_LEVEL) as out:
+                shutil.copyfileobj(file_obj, out, COPY_BUFFER_BYTES)
+        else:
+            writer = None
+            try:
+                for chunk in pd.read_csv(file_obj, chunksize=EXPORT_CHUNK_ROWS, dtype=str):
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, table.schema)
+                    writer.write_table(table)
+            finally:
+                if writer is not None:
+                    writer.close()
+            if writer is None:  # archivo vacío
+                pd.DataFrame().to_parquet(path)
+        file_obj.seek(0)
+
+
+# --- Descargas diferidas ---
+
+def _read_file(path):
+    with open(path, 'rb') as handle:
+        return handle.read()
+
+
+def frame_export(frame, fmt):
+    """Función para ``st.download_button(data=...)`` que exporta ``frame`` al hacer clic.
+
+    ``frame`` puede ser una función sin argumentos que lo construye (p. ej.
+    un filtro), para que tampoco se calcule en cada rerun.
+    """
+    def read_export():
+        data = frame() if callable(frame) else frame
+        path = get_export_cache().get_or_create(fingerprint(data), fmt,
+                                                lambda target: _write_frame(data, fmt, target))
+        return _read_file(path)
+    return read_export
+
+
+def csv_file_export(file_obj, source, fmt):
+    """Como ``frame_export`` para un CSV en disco (salidas del modo streaming).
+
+    ``source`` identifica el archivo (no cambia una vez terminado el trabajo).
+    """
+    def read_export():
+        path = get_export_cache().get_or_create(source, fmt,
+                                                lambda target: _write_csv_file(file_obj, fmt, target))
+        return _read_file(path)
+    return read_export
+
+
+def download_name(base, fmt):
+    return f"{base}{EXPORT_FORMATS[fmt][2]}"
+
+
+def mime_type(fmt):
+    return EXPORT_FORMATS[fmt][1]
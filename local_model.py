@@ -0,0 +1,228 @@
+"""Inferencia en el mismo proceso, sin pasar por la API HTTP.
+
+Cuando la app y el modelo están en el mismo contenedor, ``LocalModelClient``
+reemplaza a ``ApiClient``: tiene los mismos métodos (``health``, ``root``,
+``predict``, ``batch_predict``) y sus respuestas se consumen igual que las
+de la API, pero ``batch_predict`` codifica el bloque completo con numpy y
+llama a ``predict_proba`` una sola vez, sin serializar a JSON ni usar la
+red. El modelo se carga una vez por proceso con ``st.cache_resource``.
+
+El modelo es un archivo ``joblib`` con un diccionario::
+
+    {
+        'model': estimador de scikit-learn (predict / predict_proba),
+        'categories': {columna: [categorías]},  # codificación ordinal (opcional)
+        'encoder': transformador ajustado sobre las 7 columnas (opcional),
+        'version': 'texto',                     # opcional
+    }
+
+Con ``categories`` cada columna se codifica como el índice de su categoría
+(``-1`` si no está); con ``encoder`` se usa su ``transform``; sin ninguno
+de los dos el estimador recibe el DataFrame (p. ej. un ``Pipeline``).
+
+Para probarlo sin el modelo real::
+
+    python local_model.py --out modelo_demo.joblib
+"""
+import argparse
+import hashlib
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from api_client import HealthMonitor
+from categorical import REQUIRED_COLUMNS
+from metrics import count, timer
+
+DEFAULT_MODEL_PATH = os.environ.get('SALUD_MODEL_PATH', os.path.join('modelos', 'modelo.joblib'))
+LOCAL_CONTENT_TYPE = 'application/x-salud-local'
+HASH_BUFFER_BYTES = 1024 ** 2
+
+ENDPOINTS = {
+    'GET /': 'Información general (modelo local)',
+    'GET /health': 'Estado del modelo local',
+    'POST /predict': 'Predicciones individuales',
+    'POST /batch_predict': 'Predicciones por lotes',
+}
+
+
+class LocalResponse:
+    """Respuesta con la forma de ``requests.Response`` que usan las páginas.
+
+    Las predicciones viajan como arreglos (``arrays``); ``json()`` solo las
+    convierte a listas si alguien las pide en ese formato.
+    """
+    status_code = 200
+    attempts = 1
+    headers = {'Content-Type': LOCAL_CONTENT_TYPE}
+
+    def __init__(self, payload=None, predictions=None, probabilities=None):
+        self._payload = payload
+        self.arrays = (predictions, probabilities) if predictions is not None else None
+
+    def json(self):
+        if self._payload is not None:
+            return self._payload
+        predictions, probabilities = self.arrays
+        result = {'predictions': predictions.tolist()}
+        if probabilities is not None:
+            result['probabilities'] = probabilities.tolist()
+        return result
+
+    @property
+    def text(self):
+        return str(self.json())
+
+
+def _file_hash(path):
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(HASH_BUFFER_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class LocalModel:
+    def __init__(self, model, categories=None, encoder=None, version=None):
+        self.model = model
+        self.encoder = encoder
+        self.version = version or 'local'
+        # Índice de cada categoría por columna, para codificar por valores únicos
+        self.categories = {col: pd.Index([str(value) for value in values])
+                           for col, values in (categories or {}).items()}
+
+    @classmethod
+    def load(cls, path):
+        artifact = joblib.load(path)
+        if not isinstance(artifact, dict):  # solo el estimador
+            artifact = {'model': artifact}
+        version = artifact.get('version') or f"local-{_file_hash(path)}"
+        return cls(artifact['model'], artifact.get('categories'), artifact.get('encoder'), version)
+
+    def encode(self, frame):
+        """Matriz de entrada del estimador para un DataFrame con las columnas del modelo."""
+        frame = frame[REQUIRED_COLUMNS]
+        if self.encoder is not None:
+            return self.encoder.transform(frame)
+        if not self.categories:
+            return frame
+        encoded = np.empty((len(frame), len(REQUIRED_COLUMNS)), dtype=np.float64)
+        for j, col in enumerate(REQUIRED_COLUMNS):
+            # Se busca cada valor único una vez y se propaga a las filas
+            values = frame[col].astype('category')
+            labels = pd.Index([str(label).strip() for label in values.cat.categories])
+            lookup = np.append(self.categories[col].get_indexer(labels), -1)  # el último cubre faltantes
+            encoded[:, j] = lookup[values.cat.codes.to_numpy()]
+        return encoded
+
+    def predict(self, frame):
+        """``(predicciones, probabilidades)`` para todo el bloque en una sola llamada."""
+        with timer('inferencia_local', rows=len(frame)):
+            features = self.encode(frame)
+            if hasattr(self.model, 'predict_proba'):
+                probabilities = self.model.predict_proba(features)
+                predictions = np.asarray(self.model.classes_)[probabilities.argmax(axis=1)]
+            else:
+                probabilities = None
+                predictions = self.model.predict(features)
+        return np.asarray(predictions).astype(np.int64), probabilities
+
+
+class LocalModelClient:
+    """Mismos métodos que ``ApiClient``, resueltos con el modelo en memoria."""
+
+    base_url = 'local'
+
+    def __init__(self, model, path=None):
+        self.model = model
+        self.path = path
+        self.unsupported_formats = set()
+
+    def timeout_for(self, endpoint):
+        return (0, 0)
+
+    def health(self, **kwargs):
+        return LocalResponse({
+            'status': 'healthy',
+            'model_loaded': True,
+            'model_version': self.model.version,
+            'backend': 'local',
+            'model_path': self.path,
+        })
+
+    def root(self):
+        return LocalResponse({'message': 'Modelo local (sin API HTTP)', 'endpoints': ENDPOINTS})
+
+    def predict(self, record):
+        predictions, probabilities = self.model.predict(pd.DataFrame([record]))
+        count('predicciones_locales', endpoint='/predict')
+        return LocalResponse(predictions=predictions, probabilities=probabilities)
+
+    def batch_predict(self, frame, wire_format=None, **kwargs):
+        # El formato de transmisión no aplica: no hay serialización
+        predictions, probabilities = self.model.predict(frame)
+        count('predicciones_locales', len(frame), endpoint='/batch_predict')
+        return LocalResponse(predictions=predictions, probabilities=probabilities)
+
+    def close(self):
+        pass
+
+
+def model_available(path=DEFAULT_MODEL_PATH):
+    return os.path.isfile(path)
+
+
+@st.cache_resource(show_spinner=False)
+def _local_client(path, modified):
+    # Un modelo por proceso, compartido por todas las sesiones; ``modified`` es parte
+    # de la clave para que reemplazar el archivo recargue el modelo
+    return LocalModelClient(LocalModel.load(path), path)
+
+
+@st.cache_resource(show_spinner=False)
+def _local_health_monitor(path, modified):
+    return HealthMonitor(_local_client(path, modified))
+
+
+def get_local_client(path=DEFAULT_MODEL_PATH):
+    return _local_client(path, os.path.getmtime(path))
+
+
+def get_local_health_monitor(path=DEFAULT_MODEL_PATH):
+    return _local_health_monitor(path, os.path.getmtime(path))
+
+
+def build_demo_model(rows=200_000, seed=0):
+    """Modelo de demostración entrenado con las predicciones de ``mock_api`` sobre datos sintéticos."""
+    from sklearn.tree import DecisionTreeClassifier
+
+    from mock_api import predict_frame
+    from synthetic import generate_population
+
+    population = generate_population(rows, seed=seed)
+    labels, _ = predict_frame(population)
+    categories = {col: [str(value) for value in population[col].cat.categories] for col in REQUIRED_COLUMNS}
+    local = LocalModel(None, categories)
+    model = DecisionTreeClassifier(min_samples_leaf=20, random_state=seed).fit(local.encode(population), labels)
+    return {'model': model, 'categories': categories, 'version': f'demo-{rows}-{seed}'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un modelo local de demostración")
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=DEFAULT_MODEL_PATH)
+    args = parser.parse_args()
+
+    directory = os.path.dirname(args.out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    joblib.dump(build_demo_model(args.rows, args.seed), args.out)
+    print(f"Modelo de demostración guardado en {args.out}")
+
+
+if __name__ == '__main__':
+    main()
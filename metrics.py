@@ -0,0 +1,201 @@
+"""Instrumentación liviana del procesamiento: temporizadores y contadores.
+
+Las etapas del flujo (lectura del CSV, validación, serialización, red,
+deserialización, renderizado de gráficos y exportación) se miden con
+``timer`` en el punto donde ocurren, incluidos los hilos de los trabajos en
+segundo plano. Los valores se acumulan en un registro único por proceso
+(``METRICS``) que la barra lateral muestra en **⏱️ Rendimiento** y que se
+puede exportar en el formato de texto de Prometheus.
+
+Uso::
+
+    with timer('validacion', rows=len(data)):
+        ...
+    count('solicitudes_http', endpoint='/predict', estado='200')
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+import pandas as pd
+
+METRIC_PREFIX = 'salud_'
+
+# Límites superiores (segundos) de los buckets del histograma de duración
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+# Nombres legibles de las etapas para el panel
+STAGE_LABELS = {
+    'lectura_csv': 'Lectura CSV',
+    'validacion': 'Validación',
+    'serializacion': 'Serialización',
+    'red': 'Red (HTTP)',
+    'deserializacion': 'Deserialización',
+    'inferencia_local': 'Inferencia local',
+    'tabla_riesgo': 'Consulta de la tabla de riesgo',
+    'volcado_sesion': 'Volcado a disco de datos de sesión',
+    'recarga_sesion': 'Recarga de datos de sesión desde disco',
+    'render_grafico': 'Renderizado de gráficos',
+    'exportacion': 'Exportación',
+    'escritura_registro': 'Escritura del registro de predicciones',
+    'lectura_registro': 'Lectura del registro de predicciones',
+}
+
+COUNTER_HELP = {
+    'filas': 'Filas procesadas por etapa.',
+    'solicitudes_http': 'Solicitudes HTTP a la API por endpoint y estado.',
+    'reintentos': 'Reintentos de solicitudes HTTP por endpoint.',
+    'predicciones_locales': 'Registros predichos con el modelo local por endpoint.',
+    'tabla_riesgo': 'Consultas a la tabla de riesgo precalculada por resultado.',
+    'probabilidades_descartadas': 'Combinaciones sin probabilidades por número de clases distinto, por fuente.',
+    'memoria_sesion': 'DataFrames de sesión enviados a disco o recargados.',
+    'cache_graficos': 'Consultas a la caché de gráficos por resultado.',
+    'registro_predicciones': 'Predicciones individuales escritas o descartadas por el registro.',
+}
+
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)  # el último es +Inf
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+        self.buckets[bisect_left(DURATION_BUCKETS, seconds)] += 1
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in key)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + '}'
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}  # (etapa, etiquetas) -> StageStats
+        self.counters = {}  # (nombre, etiquetas) -> valor
+        self.started_at = time.time()
+
+    @contextmanager
+    def timer(self, stage, rows=None, **labels):
+        """Mide la duración del bloque como una observación de ``stage``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, rows, **labels)
+
+    def observe(self, stage, seconds, rows=None, **labels):
+        key = (stage, _label_key(labels))
+        with self._lock:
+            self.stages.setdefault(key, StageStats()).observe(seconds)
+            if rows:
+                counter = ('filas', _label_key({'etapa': stage}))
+                self.counters[counter] = self.counters.get(counter, 0) + rows
+
+    def count(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def timed_iter(self, iterable, stage, rows=len):
+        """Itera ``iterable`` midiendo cada ``next()`` (p. ej. un lector de CSV por bloques)."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(stage, time.perf_counter() - start, rows(item) if rows else None)
+            yield item
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+            self.started_at = time.time()
+
+    def stage_table(self):
+        """Resumen por etapa: llamadas, tiempo total, medio, máximo y último."""
+        with self._lock:
+            items = [(stage, key, stats.count, stats.total, stats.max, stats.last)
+                     for (stage, key), stats in self.stages.items()]
+            rows = {key[1]: value for key, value in self.counters.items() if key[0] == 'filas'}
+        records = []
+        for stage, key, n, total, maximum, last in items:
+            name = STAGE_LABELS.get(stage, stage)
+            if key:
+                name += ' ' + ', '.join(value for _, value in key)
+            stage_rows = rows.get(_label_key({'etapa': stage})) if not key else None
+            records.append({
+                'Etapa': name,
+                'Llamadas': n,
+                'Total (s)': round(total, 3),
+                'Media (ms)': round(total / n * 1000, 1),
+                'Máx (ms)': round(maximum * 1000, 1),
+                'Última (ms)': round(last * 1000, 1),
+                'Filas/s': round(stage_rows / total) if stage_rows and total > 0 else None,
+            })
+        table = pd.DataFrame(records, columns=['Etapa', 'Llamadas', 'Total (s)', 'Media (ms)', 'Máx (ms)',
+                                               'Última (ms)', 'Filas/s'])
+        return table.sort_values('Total (s)', ascending=False, ignore_index=True)
+
+    def counter_table(self):
+        with self._lock:
+            items = list(self.counters.items())
+        records = [{'Contador': name, 'Etiquetas': ', '.join(f"{k}={v}" for k, v in key), 'Valor': value}
+                   for (name, key), value in sorted(items)]
+        return pd.DataFrame(records, columns=['Contador', 'Etiquetas', 'Valor'])
+
+    def to_prometheus(self, prefix=METRIC_PREFIX):
+        """Volcado en el formato de exposición de texto de Prometheus."""
+        with self._lock:
+            stages = [(stage, key, stats.count, stats.total, list(stats.buckets))
+                      for (stage, key), stats in sorted(self.stages.items())]
+            counters = sorted(self.counters.items())
+
+        name = f'{prefix}etapa_segundos'
+        lines = [f'# HELP {name} Duración de cada etapa del procesamiento.', f'# TYPE {name} histogram']
+        for stage, key, n, total, buckets in stages:
+            labels = (('etapa', stage),) + key
+            cumulative = 0
+            for bound, hits in zip(DURATION_BUCKETS + ('+Inf',), buckets):
+                cumulative += hits
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {total:.6f}')
+            lines.append(f'{name}_count{_format_labels(labels)} {n}')
+
+        current = None
+        for (counter, key), value in counters:
+            name = f'{prefix}{counter}_total'
+            if counter != current:
+                lines.append(f'# HELP {name} {COUNTER_HELP.get(counter, counter)}')
+                lines.append(f'# TYPE {name} counter')
+                current = counter
+            lines.append(f'{name}{_format_labels(key)} {value}')
+
+        name = f'{prefix}inicio_metricas_segundos'
+        lines += [f'# HELP {name} Momento (epoch) del último reinicio de las métricas.',
+                  f'# TYPE {name} gauge', f'{name} {self.started_at:.0f}']
+        return '\n'.join(lines) + '\n'
+
+
+# Registro compartido por el proceso (sesiones y trabajos en segundo plano)
+METRICS = Metrics()
+timer = METRICS.timer
+count = METRICS.count
+timed_iter = METRICS.timed_iter
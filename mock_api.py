@@ -0,0 +1,269 @@
+"""API de predicción simulada para pruebas y benchmarks locales.
+
+Implementa ``/``, ``/health``, ``/predict`` y ``/batch_predict`` con las mismas
+formas de solicitud y respuesta que la API real, además de los formatos de
+transmisión de ``wire_format.py``. Las predicciones son deterministas (un
+puntaje derivado de los valores del registro), no un modelo real.
+
+``MockApiConfig`` simula las condiciones de un servicio real para medir y
+probar el cliente sin red: latencia fija y por registro (con variación),
+una fracción de solicitudes que fallan con 5xx o cortan la conexión (para
+ejercitar los reintentos), límites de tamaño que responden 413 y una lista
+de formatos aceptados (los demás responden 415, como una API anterior a
+``wire_format.py``). El servidor
+lleva la cuenta de solicitudes, registros y fallas inyectadas en ``stats``.
+
+Uso::
+
+    python mock_api.py --port 5000
+    python mock_api.py --latency 0.05 --latency-per-row 0.00001 --error-rate 0.05 --max-batch-rows 10000
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from categorical import REQUIRED_COLUMNS, category_codes
+from wire_format import UnsupportedFormatError, available_formats, decode_batch, encode_predictions, format_of
+
+MODEL_VERSION = 'mock-1.0'
+
+ENDPOINTS = {
+    'GET /': 'Información general de la API',
+    'GET /health': 'Estado del servicio y modelo',
+    'POST /predict': 'Predicciones individuales',
+    'POST /batch_predict': 'Predicciones por lotes',
+}
+
+
+@dataclass
+class MockApiConfig:
+    latency: float = 0.0  # segundos por solicitud de predicción
+    latency_per_row: float = 0.0  # segundos adicionales por registro
+    jitter: float = 0.0  # variación uniforme relativa de la latencia (0.2 = ±20 %)
+    error_rate: float = 0.0  # fracción de solicitudes que responden ``error_status``
+    error_status: int = 503
+    drop_rate: float = 0.0  # fracción de solicitudes que cierran la conexión sin responder
+    max_body_bytes: int = None  # cuerpo más grande -> 413
+    max_batch_rows: int = None  # lote con más registros -> 413
+    batch_formats: list = None  # formatos aceptados en /batch_predict (``None`` = todos); otro -> 415
+    seed: int = None
+
+
+@dataclass
+class MockApiStats:
+    requests: int = 0
+    rows: int = 0
+    injected_errors: int = 0
+    dropped: int = 0
+    rejected: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self):
+        with self.lock:
+            return {'requests': self.requests, 'rows': self.rows, 'injected_errors': self.injected_errors,
+                    'dropped': self.dropped, 'rejected': self.rejected}
+
+
+def _label_score(value):
+    return zlib.crc32(str(value).strip().encode('utf-8')) % 1000 / 1000.0
+
+
+def score_frame(frame):
+    """Probabilidad de alto riesgo por fila, determinista y vectorizada.
+
+    Cada columna aporta un puntaje por categoría (calculado una vez por valor
+    único), de modo que el costo por fila es un ``take`` sobre los códigos.
+    """
+    total = np.zeros(len(frame))
+    columns = [col for col in REQUIRED_COLUMNS if col in frame.columns]
+    for col in columns:
+        codes, labels = category_codes(frame[col])
+        scores = np.array([_label_score(label) for label in labels] + [0.5])
+        total += scores[codes]  # -1 (faltante) toma el último valor
+    mean = total / max(len(columns), 1)
+    # Estirar la media alrededor de 0.5 para que haya ambas clases
+    return np.clip(0.5 + (mean - 0.5) * 4, 0.01, 0.99)
+
+
+def predict_frame(frame):
+    high = score_frame(frame)
+    probabilities = np.column_stack([1 - high, high])
+    return (high >= 0.5).astype(np.int64), probabilities
+
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    server_version = 'MockSaludAPI/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode('utf-8'), {'Content-Type': 'application/json'})
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length)
+
+    def _inject_failure(self):
+        """Decide si esta solicitud falla; devuelve ``True`` si ya se respondió (o se cortó)."""
+        config, stats = self.server.config, self.server.stats
+        with self.server.random_lock:
+            draw = self.server.random.random()
+        if draw < config.drop_rate:
+            stats.add(dropped=1)
+            self.close_connection = True
+            return True
+        if draw < config.drop_rate + config.error_rate:
+            stats.add(injected_errors=1)
+            self._send_json(config.error_status, {'error': 'Falla simulada del servicio'})
+            return True
+        return False
+
+    def _reject(self, message):
+        self.server.stats.add(rejected=1)
+        self.close_connection = True  # el cuerpo puede no haberse leído completo
+        self._send_json(413, {'error': message})
+
+    def _simulate_latency(self, n_rows):
+        config = self.server.config
+        delay = config.latency + config.latency_per_row * n_rows
+        if config.jitter:
+            with self.server.random_lock:
+                delay *= 1 + self.server.random.uniform(-config.jitter, config.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {
+                'status': 'healthy',
+                'model_loaded': True,
+                'model_version': MODEL_VERSION,
+                'batch_formats': self.server.config.batch_formats or available_formats(),
+                'limits': {'max_body_bytes': self.server.config.max_body_bytes,
+                           'max_batch_rows': self.server.config.max_batch_rows},
+            })
+        elif self.path == '/':
+            self._send_json(200, {'message': 'API de predicción simulada', 'endpoints': ENDPOINTS})
+        else:
+            self._send_json(404, {'error': f'Ruta no encontrada: {self.path}'})
+
+    def do_POST(self):
+        config = self.server.config
+        self.server.stats.add(requests=1)
+        if config.max_body_bytes is not None and int(self.headers.get('Content-Length', 0)) > config.max_body_bytes:
+            self._reject(f'El cuerpo excede {config.max_body_bytes} bytes')
+            return
+        body = self._read_body()
+        if self._inject_failure():
+            return
+        try:
+            if self.path == '/predict':
+                frame = pd.DataFrame([json.loads(body)])
+                predictions, probabilities = predict_frame(frame)
+                self._simulate_latency(1)
+                self.server.stats.add(rows=1)
+                self._send_json(200, {'predictions': predictions.tolist(),
+                                      'probabilities': probabilities.tolist()})
+            elif self.path == '/batch_predict':
+                content_type = self.headers.get('Content-Type')
+                if config.batch_formats is not None and format_of(content_type) not in config.batch_formats:
+                    self._send_json(415, {'error': f'Content-Type no soportado: {content_type}'})
+                    return
+                frame = decode_batch(body, self.headers.get('Content-Type'),
+                                     self.headers.get('Content-Encoding'))
+                if config.max_batch_rows is not None and len(frame) > config.max_batch_rows:
+                    self._reject(f'El lote excede {config.max_batch_rows} registros')
+                    return
+                predictions, probabilities = predict_frame(frame)
+                self._simulate_latency(len(frame))
+                self.server.stats.add(rows=len(frame))
+                response_format = format_of(self.headers.get('Accept') or self.headers.get('Content-Type'))
+                self._send(200, *encode_predictions(predictions, probabilities, response_format))
+            else:
+                self._send_json(404, {'error': f'Ruta no encontrada: {self.path}'})
+        except UnsupportedFormatError as e:
+            self._send_json(415, {'error': f'Content-Type no soportado: {e}'})
+        except (ValueError, KeyError, OSError) as e:
+            self._send_json(400, {'error': f'Solicitud inválida: {e}'})
+
+
+def make_server(host='127.0.0.1', port=0, config=None):
+    """Crea el servidor (sin iniciarlo) con su configuración y contadores."""
+    server = ThreadingHTTPServer((host, port), MockApiHandler)
+    server.daemon_threads = True
+    server.config = config or MockApiConfig()
+    server.stats = MockApiStats()
+    server.random = random.Random(server.config.seed)
+    server.random_lock = threading.Lock()
+    return server
+
+
+def start_server(host='127.0.0.1', port=0, config=None):
+    """Inicia la API simulada en un hilo; devuelve ``(servidor, url_base)``.
+
+    Con ``port=0`` el sistema asigna un puerto libre. ``server.config`` se
+    puede modificar mientras el servidor corre (p. ej. para subir la latencia
+    entre dos mediciones).
+    """
+    server = make_server(host, port, config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API de predicción simulada")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.0, help="Segundos por solicitud")
+    parser.add_argument('--latency-per-row', type=float, default=0.0, help="Segundos adicionales por registro")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Variación relativa de la latencia")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fracción de respuestas con error")
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="Fracción de conexiones cortadas")
+    parser.add_argument('--max-body-bytes', type=int, default=None)
+    parser.add_argument('--max-batch-rows', type=int, default=None)
+    parser.add_argument('--batch-formats', nargs='+', default=None, help="Formatos aceptados en /batch_predict")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockApiConfig(
+        latency=args.latency, latency_per_row=args.latency_per_row, jitter=args.jitter,
+        error_rate=args.error_rate, error_status=args.error_status, drop_rate=args.drop_rate,
+        max_body_bytes=args.max_body_bytes, max_batch_rows=args.max_batch_rows,
+        batch_formats=args.batch_formats, seed=args.seed,
+    )
+    server = make_server(args.host, args.port, config)
+    print(f"API simulada escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
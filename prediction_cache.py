@@ -0,0 +1,92 @@
+"""Caché LRU de predicciones compartida entre sesiones.
+
+La clave es el registro normalizado (las siete columnas del modelo) más la
+versión del modelo que reporta ``/health``: si el modelo cambia, las
+entradas anteriores dejan de coincidir y expiran por LRU/TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+
+from categorical import REQUIRED_COLUMNS
+
+DEFAULT_MAX_ENTRIES = 200_000
+DEFAULT_TTL = 6 * 3600  # segundos
+
+
+def normalize_value(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return str(value).strip()
+
+
+def model_version_of(health_data):
+    """Versión del modelo según la respuesta de ``/health``."""
+    health_data = health_data or {}
+    return str(health_data.get('model_version') or health_data.get('version') or 'desconocida')
+
+
+class PredictionCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(record, model_version):
+        return (model_version,) + tuple(normalize_value(record.get(col)) for col in REQUIRED_COLUMNS)
+
+    def get_many(self, keys):
+        """Devuelve ``(predicción, probabilidades)`` o ``None`` por cada clave."""
+        now = time.time()
+        found = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[0] > self.ttl:
+                    del self._entries[key]
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    found.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    found.append(entry[1:])
+        return found
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def put_many(self, keys, predictions, probabilities=None):
+        now = time.time()
+        if probabilities is None:
+            probabilities = [None] * len(keys)
+        with self._lock:
+            for key, prediction, probs in zip(keys, predictions, probabilities):
+                self._entries[key] = (now, prediction, probs)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key, prediction, probabilities=None):
+        self.put_many([key], [prediction], [probabilities])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+@st.cache_resource(show_spinner=False)
+def get_prediction_cache(base_url):
+    # Una caché por URL de la API, compartida por todas las sesiones
+    return PredictionCache()
@@ -0,0 +1,228 @@
+"""Registro persistente (solo agregar) de las predicciones individuales.
+
+``log`` solo deja el registro en una cola en memoria y vuelve de inmediato:
+un hilo en segundo plano la vacía por lotes y escribe cada lote como un
+miembro gzip nuevo al final del segmento activo (JSON por líneas
+comprimido). Un segmento se rota al superar ``MAX_SEGMENT_BYTES`` y se
+conservan los ``MAX_SEGMENTS`` más recientes.
+
+Como cada lote es un miembro gzip completo, un corte del proceso solo puede
+perder el último lote a medio escribir; ``read_log`` lee los segmentos de
+todos los procesos en un DataFrame e ignora ese final truncado.
+"""
+import atexit
+import io
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from categorical import REQUIRED_COLUMNS
+from metrics import count, timer
+
+DEFAULT_LOG_DIR = os.environ.get(
+    'SALUD_PREDICTION_LOG', os.path.join(os.path.expanduser('~'), '.salud', 'predicciones')
+)
+SEGMENT_PREFIX = 'predicciones-'
+SEGMENT_SUFFIX = '.jsonl.gz'
+MAX_SEGMENT_BYTES = 8 * 1024 ** 2
+MAX_SEGMENTS = 64
+# Registros en espera como máximo; si el disco no da abasto se descartan en lugar de bloquear
+MAX_QUEUED_RECORDS = 50_000
+# Registros por lote y espera máxima antes de escribir un lote incompleto
+FLUSH_BATCH = 1_000
+FLUSH_INTERVAL = 1.0
+# Espera máxima por los registros pendientes al cerrar el proceso
+FLUSH_TIMEOUT = 5.0
+GZIP_LEVEL = 6
+
+LOG_COLUMNS = ['fecha'] + REQUIRED_COLUMNS + ['prediccion', 'probabilidad_bajo', 'probabilidad_alto',
+                                              'modelo', 'origen', 'tiempo_ms']
+
+
+def _gzip_member(lines):
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: cabecera gzip
+    return compressor.compress(''.join(lines).encode('utf-8')) + compressor.flush()
+
+
+def _read_segment(path):
+    """Contenido descomprimido de un segmento, hasta el último miembro completo."""
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    parts = []
+    while data:
+        decompressor = zlib.decompressobj(31)
+        try:
+            part = decompressor.decompress(data)
+        except zlib.error:
+            break
+        if not decompressor.eof:  # miembro truncado: escritura interrumpida
+            break
+        parts.append(part)
+        data = decompressor.unused_data
+    return b''.join(parts)
+
+
+def list_segments(directory=DEFAULT_LOG_DIR):
+    """Segmentos del registro, del más antiguo al más reciente."""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+    return [os.path.join(directory, name) for name in names]
+
+
+def read_log(directory=DEFAULT_LOG_DIR, since=None):
+    """Todas las predicciones registradas como un DataFrame (opcionalmente desde ``since``)."""
+    with timer('lectura_registro'):
+        content = b''.join(_read_segment(path) for path in list_segments(directory))
+        if not content:
+            return pd.DataFrame(columns=LOG_COLUMNS)
+        frame = pd.read_json(io.BytesIO(content), lines=True, dtype=False, convert_dates=False)
+    frame = frame.reindex(columns=LOG_COLUMNS)
+    frame['fecha'] = pd.to_datetime(frame['fecha'])
+    for col in ['prediccion', 'probabilidad_bajo', 'probabilidad_alto', 'tiempo_ms']:
+        frame[col] = pd.to_numeric(frame[col])
+    for col in REQUIRED_COLUMNS + ['modelo', 'origen']:
+        frame[col] = frame[col].astype('category')
+    if since is not None:
+        frame = frame[frame['fecha'] >= pd.Timestamp(since)]
+    return frame.sort_values('fecha', ignore_index=True)
+
+
+class PredictionLog:
+    def __init__(self, directory=DEFAULT_LOG_DIR, max_segment_bytes=MAX_SEGMENT_BYTES, max_segments=MAX_SEGMENTS,
+                 max_queued=MAX_QUEUED_RECORDS, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._segment = None
+        self._sequence = itertools.count()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def log(self, record):
+        """Encola ``record`` (un dict) para escribirlo; no espera al disco."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            count('registro_predicciones', resultado='descartada')
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """Espera a que todo lo encolado quede en disco (pruebas y cierre del proceso).
+
+        Espera como mucho ``timeout`` segundos y nada si el hilo escritor no
+        está vivo, para no colgar el cierre del intérprete. Devuelve ``True``
+        si no quedó nada pendiente.
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and self._thread is not None and self._thread.is_alive():
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(0.05)
+        return not self._queue.unfinished_tasks
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def _ensure_writer(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._writer, name='prediction-log', daemon=True)
+                    self._thread.start()
+
+    def _writer(self):
+        while True:
+            batch = [self._queue.get()]
+            # Completar el lote con lo que llegue durante el intervalo
+            try:
+                while len(batch) < FLUSH_BATCH:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            try:
+                self._write(batch)
+            except OSError:
+                # Sin disco el lote se pierde; la interfaz sigue funcionando
+                self.dropped += len(batch)
+                count('registro_predicciones', len(batch), resultado='descartada')
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        lines = [json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in batch]
+        member = _gzip_member(lines)
+        with timer('escritura_registro', rows=len(batch)):
+            if (self._segment is None or not os.path.exists(self._segment)
+                    or os.path.getsize(self._segment) + len(member) > self.max_segment_bytes):
+                self._rotate()
+            with open(self._segment, 'ab') as handle:
+                handle.write(member)
+        self.written += len(batch)
+        count('registro_predicciones', len(batch), resultado='escrita')
+
+    def _rotate(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # Un segmento por proceso: varios procesos pueden compartir el directorio. La secuencia
+        # lleva ceros a la izquierda para que el orden por nombre sea el de creación
+        name = (f"{SEGMENT_PREFIX}{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}-{next(self._sequence):06d}"
+                f"{SEGMENT_SUFFIX}")
+        self._segment = os.path.join(self.directory, name)
+        open(self._segment, 'ab').close()
+        for old in list_segments(self.directory)[:-self.max_segments]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def stats(self):
+        segments = list_segments(self.directory)
+        return {
+            'escritas': self.written,
+            'en_cola': self.pending,
+            'descartadas': self.dropped,
+            'segmentos': len(segments),
+            'bytes': sum(os.path.getsize(path) for path in segments),
+        }
+
+
+def prediction_record(input_data, prediction, probabilities=None, model_version=None, origin='api',
+                      response_ms=None):
+    """Registro de una predicción individual con las columnas de ``LOG_COLUMNS``.
+
+    Con más de dos clases se guardan la primera (bajo riesgo) y la última (alto riesgo).
+    """
+    prob_low, prob_high = (probabilities[0], probabilities[-1]) if probabilities is not None else (None, None)
+    return {
+        'fecha': datetime.now().isoformat(timespec='milliseconds'),
+        **{col: input_data.get(col) for col in REQUIRED_COLUMNS},
+        'prediccion': prediction,
+        'probabilidad_bajo': prob_low,
+        'probabilidad_alto': prob_high,
+        'modelo': model_version,
+        'origen': origin,
+        'tiempo_ms': round(response_ms, 1) if response_ms is not None else None,
+    }
+
+
+@st.cache_resource(show_spinner=False)
+def get_prediction_log():
+    # Un registro (y un hilo escritor) por proceso, compartido por todas las sesiones
+    return PredictionLog()
@@ -0,0 +1,368 @@
+"""Almacén persistente de resultados por lotes (SQLite).
+
+Cada trabajo terminado se guarda como una *corrida* identificada por la
+huella del archivo subido y la fecha de procesamiento. Las filas de cada
+corrida van a su propia tabla (``results_<run_id>``, una partición) con las
+siete características como códigos enteros (el texto de cada categoría se
+guarda una sola vez en ``labels``) y un índice por característica, de modo
+que las consultas que filtran por categoría a través de varias corridas no
+recorren las tablas completas. Los índices se construyen al terminar la
+corrida, lo que cuesta la mitad que mantenerlos fila a fila, y borrar una
+corrida es un ``DROP TABLE``.
+
+Junto a cada corrida se guarda su ``ResultsCube`` (como arreglos ``npz``,
+sin ``pickle``), así que **📈 Resultados** la reabre sin leer las filas ni
+llamar a la API. Las filas guardadas son reducidas: las siete
+características, la predicción y la probabilidad; las columnas adicionales
+del archivo solo quedan en el cubo. Se conservan las ``MAX_SAVED_RUNS``
+corridas más recientes.
+
+La base se abre en modo WAL con una conexión por operación: los trabajos en
+segundo plano escriben mientras las sesiones leen.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import zipfile
+from contextlib import closing
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from batch_engine import PREDICTION_LABELS
+from categorical import REQUIRED_COLUMNS, category_codes
+from results_cube import ResultsCube
+
+DEFAULT_STORE_PATH = os.environ.get(
+    'SALUD_RESULTS_DB', os.path.join(os.path.expanduser('~'), '.salud', 'resultados.sqlite')
+)
+# Filas devueltas como máximo por una consulta de registros
+DEFAULT_QUERY_LIMIT = 10_000
+
+RUN_COMPLETE = 'completa'
+RUN_PARTIAL = 'incompleta'
+# Las corridas incompletas más antiguas se descartan al abrir el almacén
+STALE_RUN_HOURS = 24
+# Corridas completas que se conservan; al completar una nueva se borran las más antiguas
+MAX_SAVED_RUNS = 64
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS runs (
+        run_id INTEGER PRIMARY KEY AUTOINCREMENT,  -- los ids no se reutilizan tras borrar
+        file_fingerprint TEXT NOT NULL,
+        file_name TEXT,
+        processed_at TEXT NOT NULL,
+        processed_date TEXT NOT NULL,
+        model_version TEXT,
+        status TEXT NOT NULL,
+        total_rows INTEGER NOT NULL DEFAULT 0,
+        high_risk_rows INTEGER NOT NULL DEFAULT 0,
+        rejected_rows INTEGER NOT NULL DEFAULT 0,
+        cube BLOB
+    )""",
+    "CREATE INDEX IF NOT EXISTS runs_by_file ON runs (file_fingerprint, processed_date)",
+    """CREATE TABLE IF NOT EXISTS labels (
+        feature TEXT NOT NULL,
+        code INTEGER NOT NULL,
+        label TEXT NOT NULL,
+        PRIMARY KEY (feature, code),
+        UNIQUE (feature, label)
+    )""",
+]
+
+_FEATURE_COLUMNS = ', '.join(f'"{col}"' for col in REQUIRED_COLUMNS)
+
+
+def _table(run_id):
+    return f'results_{int(run_id)}'
+
+
+# Partición vacía: las consultas sin corridas seleccionadas la usan como fuente
+_EMPTY_TABLE = 'results_empty'
+
+
+def _create_results_table(conn, table):
+    columns = ',\n    '.join(f'"{col}" INTEGER' for col in REQUIRED_COLUMNS)
+    conn.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+    row_number INTEGER PRIMARY KEY,
+    {columns},
+    prediccion INTEGER NOT NULL,
+    probabilidad REAL
+)""")
+
+
+def _create_indexes(conn, run_id):
+    for col in REQUIRED_COLUMNS:
+        # Con la predicción: los conteos de alto riesgo se resuelven solo con el índice
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {_table(run_id)}_{col.lower()} '
+                     f'ON {_table(run_id)} ("{col}", prediccion)')
+
+
+def file_fingerprint(content):
+    """Huella del contenido (bytes) de un archivo subido."""
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+class ResultStore:
+    def __init__(self, path=DEFAULT_STORE_PATH, max_runs=MAX_SAVED_RUNS):
+        self.path = path
+        self.max_runs = max_runs
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._write_lock = threading.Lock()
+        self._codes = {col: {} for col in REQUIRED_COLUMNS}  # etiqueta -> código, ya guardadas
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            _create_results_table(conn, _EMPTY_TABLE)
+            # Corridas que quedaron a medias hace tiempo (el proceso se detuvo): no se pueden reabrir
+            stale = (datetime.now() - timedelta(hours=STALE_RUN_HOURS)).isoformat(timespec='seconds')
+            self._delete_runs(conn, [row[0] for row in conn.execute(
+                'SELECT run_id FROM runs WHERE status = ? AND processed_at < ?', (RUN_PARTIAL, stale))])
+            for feature, code, label in conn.execute('SELECT feature, code, label FROM labels'):
+                self._codes.setdefault(feature, {})[label] = code
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    # --- Escritura ---
+
+    def open_run(self, fingerprint, file_name=None, model_version=None, processed_at=None):
+        """Registra una corrida incompleta; devuelve un ``RunWriter`` para agregarle filas."""
+        processed_at = processed_at or datetime.now()
+        with self._write_lock, closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                'INSERT INTO runs (file_fingerprint, file_name, processed_at, processed_date, model_version, status) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (fingerprint, file_name, processed_at.isoformat(timespec='seconds'),
+                 processed_at.date().isoformat(), model_version, RUN_PARTIAL)
+            )
+            _create_results_table(conn, _table(cursor.lastrowid))
+            return RunWriter(self, cursor.lastrowid)
+
+    def save_frame(self, data, fingerprint, file_name=None, model_version=None, probabilities=None,
+                   cube=None, rejected_rows=0):
+        """Guarda un resultado completo (con su columna ``prediccion``); devuelve el ``run_id``."""
+        writer = self.open_run(fingerprint, file_name, model_version)
+        try:
+            writer.append(data, probabilities)
+            writer.finish(cube, rejected_rows)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.run_id
+
+    def _encode(self, conn, feature, values):
+        """Códigos globales de ``feature`` para ``values``; agrega las etiquetas nuevas."""
+        codes, labels = category_codes(values)
+        known = self._codes[feature]
+        # Solo las categorías presentes (un Categorical puede traer categorías sin filas)
+        present = np.zeros(len(labels) + 1, dtype=bool)
+        present[codes] = True
+        new = [str(label) for label, hit in zip(labels, present) if hit and str(label) not in known]
+        if new:
+            # Otro proceso pudo agregar etiquetas: releer dentro de la transacción de escritura
+            known.update(conn.execute('SELECT label, code FROM labels WHERE feature = ?', (feature,)).fetchall())
+            new = [label for label in new if label not in known]
+        if new:
+            start = len(known)
+            conn.executemany('INSERT INTO labels (feature, code, label) VALUES (?, ?, ?)',
+                             [(feature, start + i, label) for i, label in enumerate(new)])
+            known.update({label: start + i for i, label in enumerate(new)})
+        mapping = np.array([known.get(str(label), -1) for label in labels] + [-1], dtype=np.int64)
+        return mapping[codes]  # -1 (faltante) sigue en -1
+
+    def delete_run(self, run_id):
+        with self._write_lock, closing(self._connect()) as conn, conn:
+            self._delete_runs(conn, [run_id])
+
+    def _prune(self, conn):
+        expired = conn.execute('SELECT run_id FROM runs WHERE status = ? ORDER BY run_id DESC LIMIT -1 OFFSET ?',
+                               (RUN_COMPLETE, self.max_runs)).fetchall()
+        self._delete_runs(conn, [row[0] for row in expired])
+
+    @staticmethod
+    def _delete_runs(conn, run_ids):
+        for run_id in run_ids:
+            conn.execute(f'DROP TABLE IF EXISTS {_table(run_id)}')
+            conn.execute('DELETE FROM runs WHERE run_id = ?', (run_id,))
+
+    # --- Lectura ---
+
+    def list_runs(self, fingerprint=None):
+        """Corridas completas, de la más reciente a la más antigua."""
+        query = ('SELECT run_id, file_name, processed_at, model_version, total_rows, high_risk_rows, '
+                 'rejected_rows, file_fingerprint FROM runs WHERE status = ?')
+        params = [RUN_COMPLETE]
+        if fingerprint is not None:
+            query += ' AND file_fingerprint = ?'
+            params.append(fingerprint)
+        with closing(self._connect()) as conn:
+            runs = pd.read_sql_query(query + ' ORDER BY run_id DESC', conn, params=params)
+        return runs.set_index('run_id')
+
+    def labels(self, feature):
+        """Categorías de ``feature`` vistas en alguna corrida guardada."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT label FROM labels WHERE feature = ? ORDER BY label', (feature,)).fetchall()
+        return [row[0] for row in rows]
+
+    def load_cube(self, run_id):
+        """Cubo guardado de la corrida (lo reconstruye desde las filas si no se puede leer)."""
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT cube FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No existe la corrida {run_id}")
+        if row[0] is not None:
+            try:
+                return ResultsCube.from_bytes(row[0])
+            except (ValueError, KeyError, OSError, zipfile.BadZipFile):
+                pass  # guardado por otra versión de la app
+        return ResultsCube.build(self.load_frame(run_id))
+
+    def load_runs_cube(self, run_ids):
+        """Un solo cubo con las corridas indicadas (las características comunes a todas)."""
+        cubes = [self.load_cube(run_id) for run_id in run_ids]
+        if len(cubes) == 1:
+            return cubes[0]
+        common = [col for col in cubes[0].features if all(col in cube.features for cube in cubes[1:])]
+        combined = cubes[0].select(common)
+        for cube in cubes[1:]:
+            combined.merge(cube.select(common))
+        return combined
+
+    def load_frame(self, run_id, limit=None):
+        """Filas de una corrida en su orden original (sin las columnas adicionales del archivo)."""
+        return self.query([run_id], limit=limit)
+
+    def _run_ids(self, conn, run_ids):
+        if run_ids is None:
+            return [row[0] for row in conn.execute('SELECT run_id FROM runs WHERE status = ? ORDER BY run_id',
+                                                   (RUN_COMPLETE,))]
+        return [int(run_id) for run_id in run_ids]
+
+    def _where(self, filters):
+        clauses, params = [], []
+        for feature, values in (filters or {}).items():
+            codes = [self._codes[feature][str(value)] for value in values if str(value) in self._codes[feature]]
+            clauses.append(f'"{feature}" IN ({",".join("?" * len(codes))})' if codes else '0')
+            params += codes
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def _union(self, conn, run_ids, filters, columns):
+        """Subconsulta ``UNION ALL`` sobre las particiones de ``run_ids`` con el filtro en cada una."""
+        where, params = self._where(filters)
+        parts = [f'SELECT {run_id} AS run_id, {columns} FROM {_table(run_id)}{where}'
+                 for run_id in self._run_ids(conn, run_ids)]
+        if not parts:
+            return f'SELECT NULL AS run_id, {columns} FROM {_EMPTY_TABLE}', []
+        return ' UNION ALL '.join(parts), params * len(parts)
+
+    def _decode(self, conn, frame, features):
+        for feature in features:
+            labels = dict(conn.execute('SELECT code, label FROM labels WHERE feature = ?', (feature,)).fetchall())
+            categories = [labels.get(code, '') for code in range(max(labels, default=-1) + 1)]
+            codes = frame[feature].fillna(-1).to_numpy(dtype=np.int64)
+            frame[feature] = pd.Categorical.from_codes(codes, categories=categories)
+        return frame
+
+    def query(self, run_ids=None, filters=None, limit=DEFAULT_QUERY_LIMIT):
+        """Registros de ``run_ids`` (todas si es ``None``) que cumplen ``filters``.
+
+        ``filters`` es ``{característica: [categorías]}``; cada filtro usa el
+        índice de su característica en cada partición. La fecha de
+        procesamiento es la de la corrida.
+        """
+        with closing(self._connect()) as conn:
+            union, params = self._union(conn, run_ids, filters,
+                                        f'row_number, {_FEATURE_COLUMNS}, prediccion, probabilidad')
+            sql = f'SELECT * FROM ({union}) ORDER BY run_id, row_number'
+            if limit is not None:
+                sql += f' LIMIT {int(limit)}'
+            frame = pd.read_sql_query(sql, conn, params=params)
+            frame = self._decode(conn, frame, REQUIRED_COLUMNS)
+            processed_at = dict(conn.execute('SELECT run_id, processed_at FROM runs').fetchall())
+        frame['prediccion_texto'] = frame['prediccion'].map(PREDICTION_LABELS)
+        frame['fecha_procesamiento'] = frame['run_id'].map(processed_at).str.replace('T', ' ')
+        if run_ids is not None and len(run_ids) == 1:
+            frame = frame.drop(columns='run_id')
+        return frame.drop(columns='row_number')
+
+    def count(self, run_ids=None, filters=None):
+        """``(registros, alto_riesgo)`` que cumplen ``filters`` sin leer las filas."""
+        with closing(self._connect()) as conn:
+            union, params = self._union(conn, run_ids, filters, 'prediccion')
+            total, high = conn.execute(
+                f'SELECT COUNT(*), COALESCE(SUM(prediccion), 0) FROM ({union})', params).fetchone()
+        return int(total), int(high)
+
+    def aggregate(self, by, run_ids=None, filters=None):
+        """Registros y alto riesgo por combinación de ``by`` (y por corrida si ``by`` incluye ``run_id``)."""
+        features = [col for col in by if col != 'run_id']
+        columns = ', '.join('run_id' if col == 'run_id' else f'"{col}"' for col in by)
+        with closing(self._connect()) as conn:
+            union, params = self._union(conn, run_ids, filters,
+                                        ', '.join([f'"{col}"' for col in features] + ['prediccion']))
+            sql = f'SELECT {columns}, COUNT(*) AS registros, SUM(prediccion) AS alto_riesgo ' \
+                  f'FROM ({union}) GROUP BY {columns}'
+            frame = pd.read_sql_query(sql, conn, params=params)
+            frame = self._decode(conn, frame, features)
+        frame['% alto riesgo'] = (frame['alto_riesgo'] / frame['registros'] * 100).round(1)
+        return frame.sort_values('registros', ascending=False, ignore_index=True)
+
+
+class RunWriter:
+    """Agrega bloques de filas a una corrida; ``finish`` la deja disponible para reabrir."""
+
+    def __init__(self, store, run_id):
+        self.store = store
+        self.run_id = run_id
+        self.rows = 0
+        self.high_risk = 0
+
+    def append(self, block, probabilities=None):
+        """Guarda un bloque con su columna ``prediccion`` (y opcionalmente la probabilidad de alto riesgo)."""
+        if block.empty:
+            return
+        store = self.store
+        with store._write_lock, closing(store._connect()) as conn, conn:
+            conn.execute('BEGIN IMMEDIATE')
+            columns = [np.arange(self.rows, self.rows + len(block))]
+            for col in REQUIRED_COLUMNS:
+                codes = store._encode(conn, col, block[col])
+                columns.append(np.where(codes >= 0, codes, None) if (codes < 0).any() else codes)
+            predictions = np.asarray(block['prediccion'], dtype=np.int64)
+            columns.append(predictions)
+            columns.append(np.full(len(block), None) if probabilities is None else np.asarray(probabilities, float))
+            placeholders = ', '.join('?' * len(columns))
+            conn.executemany(f'INSERT INTO {_table(self.run_id)} VALUES ({placeholders})',
+                             zip(*(column.tolist() for column in columns)))
+        self.rows += len(block)
+        self.high_risk += int(predictions.sum())
+
+    def finish(self, cube=None, rejected_rows=0):
+        blob = cube.to_bytes() if cube is not None else None
+        with self.store._write_lock, closing(self.store._connect()) as conn, conn:
+            _create_indexes(conn, self.run_id)
+            conn.execute(
+                'UPDATE runs SET status = ?, total_rows = ?, high_risk_rows = ?, rejected_rows = ?, cube = ? '
+                'WHERE run_id = ?',
+                (RUN_COMPLETE, self.rows, self.high_risk, rejected_rows, blob, self.run_id)
+            )
+            self.store._prune(conn)
+
+    def abort(self):
+        self.store.delete_run(self.run_id)
+
+
+@st.cache_resource(show_spinner=False)
+def get_result_store():
+    # Una conexión lógica por proceso; SQLite coordina a los procesos que compartan el archivo
+    return ResultStore()
@@ -0,0 +1,259 @@
+"""Cubo pre-agregado de los resultados por lotes.
+
+Se construye una vez cuando llegan los resultados de un trabajo y guarda,
+como arreglos de conteos, el número de registros y de registros de alto
+riesgo por cada categoría de cada característica y por cada par de
+características. Las vistas de **📈 Resultados** recortan y normalizan el
+cubo en lugar de recorrer las filas, así que su costo no depende del número
+de registros.
+
+Los conteos por par son ``int32`` y tienen un límite de celdas por par y
+para todo el cubo: un par que no cabe (p. ej. dos columnas adicionales con
+miles de categorías) se omite y ``has_pair`` lo indica, de modo que un
+archivo ancho no convierte el cubo en una copia densa de sus cruces.
+
+Los cubos son sumables (``update``): el modo streaming agrega un bloque a la
+vez y el resultado es el mismo que construirlo sobre el archivo completo.
+"""
+import io
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from categorical import REQUIRED_COLUMNS, category_codes
+
+# Columnas agregadas por la predicción que no son características
+RESULT_COLUMNS = ['prediccion', 'prediccion_texto', 'fecha_procesamiento']
+# Columnas adicionales (fuera del modelo) con más categorías no entran al cubo
+MAX_EXTRA_CATEGORIES = 2000
+# Pares cuyo producto de categorías excede este número de celdas no se agregan
+MAX_PAIR_CELLS = 250_000
+# Celdas de todos los pares juntos: los pares que ya no caben se omiten, en el
+# orden de ``features`` (primero los del modelo)
+MAX_TOTAL_PAIR_CELLS = 4_000_000
+# Los conteos por par son los arreglos más grandes del cubo
+PAIR_DTYPE = np.int32
+
+
+def _grow(array, shape):
+    """Amplía ``array`` con ceros hasta ``shape``; las celdas existentes no se mueven."""
+    if array.shape == shape:
+        return array
+    grown = np.zeros(shape, dtype=array.dtype)
+    grown[tuple(slice(0, n) for n in array.shape)] = array
+    return grown
+
+
+class ResultsCube:
+    def __init__(self, features):
+        self.features = list(features)
+        self.labels = {col: pd.Index([], dtype=object) for col in self.features}
+        self.counts = {col: np.zeros(0, dtype=np.int64) for col in self.features}
+        self.high_risk = {col: np.zeros(0, dtype=np.int64) for col in self.features}
+        self.pair_counts = {}
+        self.pair_high_risk = {}
+        self.skipped_pairs = set()
+        self.total = 0
+        self.total_high_risk = 0
+
+    @staticmethod
+    def features_of(data):
+        """Características del cubo: las del modelo y las adicionales de baja cardinalidad."""
+        features = [col for col in REQUIRED_COLUMNS if col in data.columns]
+        for col in data.columns:
+            if col in features or col in RESULT_COLUMNS:
+                continue
+            if data[col].nunique(dropna=True) <= MAX_EXTRA_CATEGORIES:
+                features.append(col)
+        return features
+
+    @classmethod
+    def build(cls, data, features=None, target='prediccion'):
+        cube = cls(cls.features_of(data) if features is None else features)
+        cube.update(data, target)
+        return cube
+
+    def update(self, data, target='prediccion'):
+        """Suma al cubo los registros de ``data`` (con su columna de predicción).
+
+        Con ``target=None`` solo se acumulan conteos (análisis exploratorio).
+        """
+        if target is None:
+            high = np.zeros(len(data), dtype=np.int64)
+        else:
+            high = (np.asarray(data[target]) == 1).astype(np.int64)
+        codes = {}
+        for col in self.features:
+            col_codes, col_labels = category_codes(data[col])
+            col_labels = pd.Index(col_labels, dtype=object)
+            # Etiquetas nuevas se agregan al final: los códigos existentes no cambian
+            labels = self.labels[col].append(col_labels.difference(self.labels[col]))
+            remap = np.append(labels.get_indexer(col_labels), -1)  # -1 (faltante) sigue en -1
+            codes[col] = remap[col_codes]
+            self.labels[col] = labels
+
+            valid = codes[col] >= 0
+            self.counts[col] = _grow(self.counts[col], (len(labels),))
+            self.high_risk[col] = _grow(self.high_risk[col], (len(labels),))
+            self.counts[col] += np.bincount(codes[col][valid], minlength=len(labels))
+            self.high_risk[col] += np.bincount(codes[col][valid], weights=high[valid],
+                                               minlength=len(labels)).astype(np.int64)
+
+        used_cells = 0
+        for a, b in combinations(self.features, 2):
+            shape = (len(self.labels[a]), len(self.labels[b]))
+            if not self._admit_pair(a, b, shape, used_cells):
+                continue
+            used_cells += shape[0] * shape[1]
+            empty = np.zeros((0, 0), dtype=PAIR_DTYPE)
+            pair_counts = _grow(self.pair_counts.get((a, b), empty), shape)
+            pair_high = _grow(self.pair_high_risk.get((a, b), empty), shape)
+
+            valid = (codes[a] >= 0) & (codes[b] >= 0)
+            flat = codes[a][valid] * shape[1] + codes[b][valid]
+            pair_counts += np.bincount(flat, minlength=pair_counts.size).reshape(shape)
+            pair_high += np.bincount(flat, weights=high[valid],
+                                     minlength=pair_counts.size).astype(np.int64).reshape(shape)
+            self.pair_counts[a, b], self.pair_high_risk[a, b] = pair_counts, pair_high
+
+        self.total += len(data)
+        self.total_high_risk += int(high.sum())
+        return self
+
+    def merge(self, other):
+        """Suma otro cubo con las mismas características (p. ej. de un bloque aparte)."""
+        if other.features != self.features:
+            raise ValueError("Los cubos no tienen las mismas características")
+        indexers = {}
+        for col in self.features:
+            labels = self.labels[col].append(other.labels[col].difference(self.labels[col]))
+            self.labels[col] = labels
+            indexers[col] = labels.get_indexer(other.labels[col])
+            self.counts[col] = _grow(self.counts[col], (len(labels),))
+            self.high_risk[col] = _grow(self.high_risk[col], (len(labels),))
+            self.counts[col][indexers[col]] += other.counts[col]
+            self.high_risk[col][indexers[col]] += other.high_risk[col]
+
+        used_cells = 0
+        for a, b in combinations(self.features, 2):
+            shape = (len(self.labels[a]), len(self.labels[b]))
+            if (a, b) in other.skipped_pairs:
+                self._skip_pair(a, b)
+            if not self._admit_pair(a, b, shape, used_cells):
+                continue
+            used_cells += shape[0] * shape[1]
+            empty = np.zeros((0, 0), dtype=PAIR_DTYPE)
+            pair_counts = _grow(self.pair_counts.get((a, b), empty), shape)
+            pair_high = _grow(self.pair_high_risk.get((a, b), empty), shape)
+            if (a, b) in other.pair_counts:
+                cells = np.ix_(indexers[a], indexers[b])
+                pair_counts[cells] += other.pair_counts[a, b]
+                pair_high[cells] += other.pair_high_risk[a, b]
+            self.pair_counts[a, b], self.pair_high_risk[a, b] = pair_counts, pair_high
+
+        self.total += other.total
+        self.total_high_risk += other.total_high_risk
+        return self
+
+    def _skip_pair(self, a, b):
+        # Una vez omitido, el par no vuelve a agregarse (quedaría incompleto)
+        self.skipped_pairs.add((a, b))
+        self.pair_counts.pop((a, b), None)
+        self.pair_high_risk.pop((a, b), None)
+
+    def _admit_pair(self, a, b, shape, used_cells):
+        """``True`` si el par se sigue agregando con ``shape`` tras ``used_cells`` celdas de otros pares."""
+        if (a, b) in self.skipped_pairs:
+            return False
+        cells = shape[0] * shape[1]
+        if cells > MAX_PAIR_CELLS or used_cells + cells > MAX_TOTAL_PAIR_CELLS:
+            self._skip_pair(a, b)
+            return False
+        return True
+
+    def select(self, features):
+        """Copia del cubo con solo ``features`` (p. ej. para combinar cubos de archivos distintos)."""
+        cube = ResultsCube([col for col in self.features if col in features])
+        for col in cube.features:
+            cube.labels[col] = self.labels[col]
+            cube.counts[col] = self.counts[col].copy()
+            cube.high_risk[col] = self.high_risk[col].copy()
+        for a, b in combinations(cube.features, 2):
+            if (a, b) in self.skipped_pairs:
+                cube.skipped_pairs.add((a, b))
+            elif (a, b) in self.pair_counts:
+                cube.pair_counts[a, b] = self.pair_counts[a, b].copy()
+                cube.pair_high_risk[a, b] = self.pair_high_risk[a, b].copy()
+        cube.total, cube.total_high_risk = self.total, self.total_high_risk
+        return cube
+
+    def has_pair(self, feature1, feature2):
+        return (feature1, feature2) in self.pair_counts or (feature2, feature1) in self.pair_counts
+
+    def feature_table(self, feature):
+        """Conteos por categoría y predicción (columnas ``0`` y ``1``), como un crosstab."""
+        counts, high = self.counts[feature], self.high_risk[feature]
+        present = counts > 0
+        return pd.DataFrame(
+            {0: (counts - high)[present], 1: high[present]},
+            index=pd.Index(np.asarray(self.labels[feature])[present], name=feature)
+        ).rename_axis(columns='prediccion')
+
+    def pair_tables(self, feature1, feature2):
+        """``(conteos, alto_riesgo)`` por celda, ``feature1`` en filas; omite filas y columnas vacías."""
+        if (feature1, feature2) in self.pair_counts:
+            counts, high = self.pair_counts[feature1, feature2], self.pair_high_risk[feature1, feature2]
+        else:
+            counts, high = self.pair_counts[feature2, feature1].T, self.pair_high_risk[feature2, feature1].T
+        rows = counts.sum(axis=1) > 0
+        cols = counts.sum(axis=0) > 0
+        index = pd.Index(np.asarray(self.labels[feature1])[rows], name=feature1)
+        columns = pd.Index(np.asarray(self.labels[feature2])[cols], name=feature2)
+        return (pd.DataFrame(counts[rows][:, cols], index=index, columns=columns),
+                pd.DataFrame(high[rows][:, cols], index=index, columns=columns))
+
+    def to_bytes(self):
+        """Arreglos del cubo en formato ``npz`` (sin ``pickle``), para guardarlo."""
+        arrays = {
+            'features': np.array(self.features, dtype=str),
+            'totals': np.array([self.total, self.total_high_risk], dtype=np.int64),
+            'skipped': np.array([(self.features.index(a), self.features.index(b)) for a, b in self.skipped_pairs],
+                                dtype=np.int64).reshape(-1, 2),
+        }
+        for i, col in enumerate(self.features):
+            labels = np.asarray(self.labels[col])
+            # Sin pickle no hay arreglos de objetos: las etiquetas no numéricas se guardan como texto
+            arrays[f'labels_{i}'] = labels if labels.dtype.kind in 'iufb' else labels.astype(str)
+            arrays[f'counts_{i}'], arrays[f'high_{i}'] = self.counts[col], self.high_risk[col]
+        for a, b in self.pair_counts:
+            key = f'{self.features.index(a)}_{self.features.index(b)}'
+            arrays[f'pair_counts_{key}'], arrays[f'pair_high_{key}'] = self.pair_counts[a, b], self.pair_high_risk[a, b]
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Cubo guardado con ``to_bytes``."""
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            cube = cls(arrays['features'].tolist())
+            for i, col in enumerate(cube.features):
+                cube.labels[col] = pd.Index(arrays[f'labels_{i}'].tolist(), dtype=object)
+                cube.counts[col], cube.high_risk[col] = arrays[f'counts_{i}'], arrays[f'high_{i}']
+            for i, j in arrays['skipped'].tolist():
+                cube.skipped_pairs.add((cube.features[i], cube.features[j]))
+            for name in arrays.files:
+                if name.startswith('pair_counts_'):
+                    i, j = map(int, name[len('pair_counts_'):].split('_'))
+                    pair = cube.features[i], cube.features[j]
+                    cube.pair_counts[pair] = arrays[name]
+                    cube.pair_high_risk[pair] = arrays[f'pair_high_{i}_{j}']
+            cube.total, cube.total_high_risk = map(int, arrays['totals'])
+        return cube
+
+    @property
+    def nbytes(self):
+        arrays = [*self.counts.values(), *self.high_risk.values(),
+                  *self.pair_counts.values(), *self.pair_high_risk.values()]
+        return sum(array.nbytes for array in arrays)
@@ -0,0 +1,279 @@
+"""Tabla de riesgo precalculada sobre todo el espacio de categorías.
+
+Las columnas del modelo tienen vocabulario fijo salvo ``Municipio``, así que
+el modelo se evalúa una sola vez, en bloque, sobre el producto cartesiano
+de las categorías: género × grupo etario × tipo de afiliado × zona × nivel
+Sisbén (5.760 combinaciones) por cada par departamento-municipio del
+catálogo de ``categorical.MUNICIPIOS`` (configurable con ``SALUD_MUNICIPIOS``). El resultado se guarda como dos arreglos compactos (predicción
+``int8`` y probabilidad de alto riesgo ``float32``) indexados por la
+posición de cada categoría, de modo que:
+
+- una predicción individual es un cálculo de índice, O(1);
+- un lote se resuelve con un ``take`` vectorizado sobre los códigos.
+
+Las combinaciones fuera de la tabla (un municipio fuera del catálogo o un
+valor fuera de vocabulario) siguen el camino normal (caché y API). La tabla
+pertenece a una versión del modelo (la que reporta ``/health``): si la
+versión cambia se vuelve a calcular en segundo plano, y la tabla anterior (en
+memoria y en disco) solo se reemplaza cuando la nueva está lista. Se guarda
+en disco para no recalcularla al reiniciar la app.
+"""
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from categorical import FEATURE_VOCABULARIES, MUNICIPIOS, REQUIRED_COLUMNS, category_codes
+from metrics import count, timer
+
+DEFAULT_TABLE_DIR = os.environ.get(
+    'SALUD_RISK_TABLE_DIR', os.path.join(os.path.expanduser('~'), '.salud', 'tablas')
+)
+# Columnas con vocabulario fijo, en el orden del índice (el departamento va en el par)
+GRID_COLUMNS = ['Genero', 'Grupo_etario', 'Tipo_afiliado', 'Zona', 'Nivel_Sisben']
+# Registros por bloque al evaluar la tabla (el modelo local acepta bloques grandes)
+BUILD_CHUNK_SIZE = 20_000
+
+
+def _table_path(directory, source, municipios=MUNICIPIOS):
+    # Un archivo por fuente y catálogo de municipios; la versión del modelo va dentro
+    digest = hashlib.blake2b(source.encode('utf-8'), digest_size=8)
+    for dept, names in sorted(municipios.items()):
+        digest.update('\x1f'.join([dept, *names]).encode('utf-8') + b'\x1e')
+    key = digest.hexdigest()
+    return os.path.join(directory, f"riesgo-{key}.npz")
+
+
+def _version_digest(version):
+    # Sufijo del archivo temporal de cada cálculo (dos versiones pueden calcularse seguidas)
+    return hashlib.blake2b(str(version).encode('utf-8'), digest_size=6).hexdigest()
+
+
+def _label_positions(vocabulary, values):
+    """Posición de cada fila de ``values`` en ``vocabulary`` (-1 si no está), por valores únicos."""
+    codes, labels = category_codes(values)
+    positions = vocabulary.get_indexer(pd.Index([str(label).strip() for label in labels], dtype=object))
+    return np.append(positions, -1)[codes]  # el último cubre los faltantes
+
+
+class RiskTable:
+    def __init__(self, version, labels, pairs, predictions, probabilities=None):
+        self.version = version
+        # Vocabulario de cada columna del índice, en el orden de sus posiciones
+        self.labels = {col: pd.Index(values, dtype=object) for col, values in labels.items()}
+        self.pairs = pairs  # (departamento, municipio) por fila de los arreglos
+        self.predictions = predictions  # int8 (pares, combinaciones)
+        self.probabilities = probabilities  # float32 con la misma forma, o None
+        self.shape = [len(self.labels[col]) for col in GRID_COLUMNS]
+        self._strides = np.cumprod([1] + self.shape[::-1])[::-1][1:]  # índice mixto (row-major)
+        # Par departamento-municipio -> fila
+        self._pair_rows = np.full((len(self.labels['Departamento']), len(self.labels['Municipio'])), -1,
+                                  dtype=np.int32)
+        self._pair_rows[pairs[:, 0], pairs[:, 1]] = np.arange(len(pairs))
+        self._positions = {col: {label: i for i, label in enumerate(index)} for col, index in self.labels.items()}
+
+    def __len__(self):
+        return self.predictions.size
+
+    @property
+    def nbytes(self):
+        return self.predictions.nbytes + (self.probabilities.nbytes if self.probabilities is not None else 0)
+
+    # --- Construcción ---
+
+    @staticmethod
+    def grid(municipios=MUNICIPIOS):
+        """Etiquetas, pares y el DataFrame del producto cartesiano a evaluar."""
+        labels = {col: list(FEATURE_VOCABULARIES[col]) for col in GRID_COLUMNS}
+        labels['Departamento'] = list(FEATURE_VOCABULARIES['Departamento'])
+        labels['Municipio'] = sorted({name for names in municipios.values() for name in names})
+        department = {name: i for i, name in enumerate(labels['Departamento'])}
+        municipio = {name: i for i, name in enumerate(labels['Municipio'])}
+        pairs = np.array([(department[dept], municipio[name]) for dept, names in municipios.items()
+                          if dept in department for name in names], dtype=np.int32)
+
+        shape = [len(labels[col]) for col in GRID_COLUMNS]
+        combos = np.indices(shape).reshape(len(shape), -1)  # una columna por combinación, row-major
+        n_combos = combos.shape[1]
+        columns = {col: np.tile(combos[j], len(pairs)) for j, col in enumerate(GRID_COLUMNS)}
+        columns['Departamento'] = np.repeat(pairs[:, 0], n_combos)
+        columns['Municipio'] = np.repeat(pairs[:, 1], n_combos)
+        frame = pd.DataFrame({col: pd.Categorical.from_codes(columns[col], categories=labels[col])
+                              for col in REQUIRED_COLUMNS})
+        return labels, pairs, frame
+
+    @classmethod
+    def build(cls, client, version, municipios=MUNICIPIOS, progress_callback=None, **options):
+        """Evalúa el producto cartesiano completo con ``client`` (API o modelo local)."""
+        from batch_engine import run_batch_prediction
+
+        labels, pairs, frame = cls.grid(municipios)
+        options.setdefault('chunk_size', BUILD_CHUNK_SIZE)
+        result = run_batch_prediction(frame, client, progress_callback=progress_callback, deduplicate=False,
+                                      **options)
+        n_combos = len(frame) // len(pairs)
+        predictions = result.predictions.astype(np.int8).reshape(len(pairs), n_combos)
+        probabilities = None
+        if result.probabilities is not None:
+            probabilities = result.probabilities[:, -1].astype(np.float32).reshape(len(pairs), n_combos)
+        return cls(version, labels, pairs, predictions, probabilities)
+
+    def save(self, path):
+        arrays = {f"labels_{col}": np.array(values, dtype=str) for col, values in self.labels.items()}
+        if self.probabilities is not None:
+            arrays['probabilities'] = self.probabilities
+        partial = path + '.tmp'
+        with open(partial, 'wb') as handle:
+            np.savez(handle, version=np.array(self.version), pairs=self.pairs, predictions=self.predictions,
+                     **arrays)
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            labels = {name[len('labels_'):]: data[name].tolist() for name in data.files if name.startswith('labels_')}
+            probabilities = data['probabilities'] if 'probabilities' in data.files else None
+            return cls(str(data['version']), labels, data['pairs'], data['predictions'], probabilities)
+
+    # --- Consulta ---
+
+    def _flat_index(self, positions):
+        pair = self._pair_rows[positions['Departamento'], positions['Municipio']]
+        combo = sum(positions[col] * stride for col, stride in zip(GRID_COLUMNS, self._strides))
+        return pair, combo
+
+    def lookup_record(self, record):
+        """``(predicción, [p_bajo, p_alto])`` de un registro, o ``None`` si no está en la tabla."""
+        positions = {}
+        for col, index in self._positions.items():
+            position = index.get(str(record.get(col, '')).strip())
+            if position is None:
+                return None
+            positions[col] = position
+        pair, combo = self._flat_index(positions)
+        if pair < 0:
+            return None
+        count('tabla_riesgo', resultado='acierto')
+        probability = None
+        if self.probabilities is not None:
+            high = float(self.probabilities[pair, combo])
+            probability = [1.0 - high, high]
+        return int(self.predictions[pair, combo]), probability
+
+    def lookup(self, frame):
+        """Predicciones de un lote con un ``take`` sobre los códigos.
+
+        Devuelve ``(encontradas, predicciones, probabilidades)``; las dos
+        últimas solo tienen las filas de la máscara ``encontradas``.
+        """
+        with timer('tabla_riesgo', rows=len(frame)):
+            positions = {col: _label_positions(index, frame[col]) for col, index in self.labels.items()}
+            known = np.logical_and.reduce([values >= 0 for values in positions.values()])
+            pair = np.full(len(frame), -1, dtype=np.int64)
+            combo = np.zeros(len(frame), dtype=np.int64)
+            if known.any():
+                pair[known], combo[known] = self._flat_index({col: values[known]
+                                                              for col, values in positions.items()})
+            found = pair >= 0
+            predictions = self.predictions[pair[found], combo[found]].astype(np.int64)
+            probabilities = None
+            if self.probabilities is not None:
+                high = self.probabilities[pair[found], combo[found]].astype(np.float64)
+                probabilities = np.column_stack([1 - high, high])
+        count('tabla_riesgo', int(found.sum()), resultado='acierto')
+        count('tabla_riesgo', int((~found).sum()), resultado='fallo')
+        return found, predictions, probabilities
+
+
+class RiskTableManager:
+    """Tabla vigente para una fuente de predicciones (URL de la API o modelo local).
+
+    ``current(version)`` nunca bloquea: devuelve la tabla si corresponde a
+    esa versión del modelo (la lee del disco si hace falta) o ``None``. Si la
+    tabla existente es de otra versión, con ``client`` se calcula la de
+    ``version`` en segundo plano con las ``options`` de ``build`` (p. ej. el
+    ``wire_format`` negociado con la API). La tabla anterior y su archivo se
+    conservan hasta que la nueva termina: una respuesta momentánea con otra
+    versión no borra una tabla válida, y un cálculo que termina cuando ya se
+    pide otra versión se descarta en lugar de reemplazarla.
+    """
+
+    def __init__(self, source, directory=DEFAULT_TABLE_DIR, municipios=MUNICIPIOS):
+        self.source = source
+        self.municipios = municipios
+        self.path = _table_path(directory, source, municipios)
+        self.table = None
+        self.building = None  # versión en cálculo
+        self.progress = 0.0
+        self.error = None
+        self.built_in = None  # segundos del último cálculo
+        self._requested = None  # última versión pedida; solo esa puede reemplazar la tabla
+        self._failed = None  # versión cuyo cálculo falló (no se reintenta sola)
+        self._lock = threading.Lock()
+
+    def current(self, version, client=None, **options):
+        with self._lock:
+            table = self.table
+            self._requested = version
+        if table is None and os.path.exists(self.path):
+            try:
+                table = RiskTable.load(self.path)
+            except (OSError, ValueError, KeyError):
+                table = None
+            with self._lock:
+                if self.table is None:
+                    self.table = table
+        if table is None or table.version == version:
+            return table
+        # Cambió la versión del modelo: la tabla no se usa, pero se conserva hasta tener la nueva
+        if client is not None and version != self._failed:
+            count('tabla_riesgo', resultado='desactualizada')
+            self.build(client, version, **options)
+        return None
+
+    def build(self, client, version, **options):
+        """Calcula la tabla de ``version`` en un hilo (si no se está calculando ya)."""
+        with self._lock:
+            self._requested = version
+            if self.building is not None:
+                return
+            self.building, self.progress, self.error = version, 0.0, None
+        threading.Thread(target=self._build, args=(client, version, options), daemon=True,
+                         name='risk-table').start()
+
+    def _build(self, client, version, options):
+        start = time.time()
+        partial = f"{self.path}.{_version_digest(version)}"
+
+        def progress(done, total, elapsed):
+            self.progress = done / total if total else 0.0
+
+        try:
+            table = RiskTable.build(client, version, self.municipios, progress_callback=progress, **options)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            table.save(partial)
+            with self._lock:
+                # Se pidió otra versión mientras se calculaba: no reemplazar la tabla
+                if version == self._requested:
+                    os.replace(partial, self.path)
+                    self.table, self.built_in, self._failed = table, time.time() - start, None
+                else:
+                    count('tabla_riesgo', resultado='descartada')
+        except Exception as e:  # el error se muestra en la barra lateral
+            with self._lock:
+                self.error, self._failed = str(e), version
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+            with self._lock:
+                self.building = None
+
+
+@st.cache_resource(show_spinner=False)
+def get_risk_tables(source):
+    # Una tabla por fuente de predicciones y proceso, compartida por todas las sesiones
+    return RiskTableManager(source)
@@ -0,0 +1,203 @@
+"""Presupuesto de memoria por sesión para los DataFrames grandes.
+
+Los resultados de los trabajos por lotes (y sus filas rechazadas) viven en
+el proceso mientras la sesión que los envió pueda consultarlos. Con varios
+usuarios procesando archivos grandes a la vez la memoria del proceso crece
+sin límite, así que cada DataFrame se registra aquí a nombre de su sesión:
+
+- se lleva la cuenta de los bytes de cada sesión contra ``session_budget``
+  (y del total del proceso contra ``process_budget``);
+- al superarlo, los DataFrames usados hace más tiempo se escriben a un
+  archivo Arrow IPC sin comprimir en un directorio temporal y se liberan;
+- al volver a leerlos (``get``) se cargan desde el archivo mapeado en
+  memoria, sin pasar el archivo completo por un búfer intermedio.
+
+Sin ``pyarrow`` los archivos se escriben con ``pickle``.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import pandas as pd
+import streamlit as st
+
+from metrics import count, timer
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow es opcional
+    pa = None
+
+MB = 1024 ** 2
+DEFAULT_SESSION_BUDGET = int(os.environ.get('SALUD_SESSION_BUDGET_MB', 512)) * MB
+DEFAULT_PROCESS_BUDGET = int(os.environ.get('SALUD_PROCESS_BUDGET_MB', 2048)) * MB
+# DataFrames más pequeños no se mandan a disco (no vale la pena)
+MIN_SPILL_BYTES = 1 * MB
+# Dueño de los DataFrames creados fuera de una sesión de Streamlit
+NO_SESSION = 'proceso'
+
+
+def current_session_id():
+    """Id de la sesión de Streamlit que ejecuta el script (o ``NO_SESSION``)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return NO_SESSION
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else NO_SESSION
+
+
+def process_memory():
+    """Memoria residente del proceso en bytes (``None`` si no se puede leer)."""
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Sin /proc: el pico (ru_maxrss está en KB en Linux y en bytes en macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if peak > 1024 ** 3 else peak * 1024
+
+
+@dataclass
+class _Entry:
+    nbytes: int
+    frame: pd.DataFrame = None
+    path: str = None
+    last_access: float = 0.0
+
+    @property
+    def in_memory(self):
+        return self.frame is not None
+
+
+def _write_spill(frame, path):
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(frame, preserve_index=True)
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            return path
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass  # columnas de tipos mixtos: se guardan con pickle
+    path = os.path.splitext(path)[0] + '.pkl'
+    frame.to_pickle(path)
+    return path
+
+
+def _read_spill(path):
+    if path.endswith('.pkl'):
+        return pd.read_pickle(path)
+    with pa.memory_map(path, 'r') as source:
+        # Las columnas numéricas pueden quedar apuntando a las páginas del archivo (sin copia)
+        return pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True, self_destruct=True)
+
+
+class SessionFrames:
+    def __init__(self, session_budget=DEFAULT_SESSION_BUDGET, process_budget=DEFAULT_PROCESS_BUDGET):
+        self.session_budget = session_budget
+        self.process_budget = process_budget
+        self.directory = tempfile.mkdtemp(prefix='salud_spill_')
+        self._entries = {}  # dueño -> OrderedDict(clave -> _Entry), del menos al más reciente
+        self._lock = threading.RLock()
+        self.spills = 0
+        self.reloads = 0
+        atexit.register(shutil.rmtree, self.directory, True)
+
+    def put(self, owner, key, frame):
+        """Registra ``frame`` a nombre de ``owner``; puede mandar a disco otros del mismo dueño."""
+        nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            self.discard(owner, key)
+            self._entries.setdefault(owner, OrderedDict())[key] = _Entry(nbytes, frame, last_access=time.time())
+            self._enforce(owner, keep=key)
+
+    def get(self, owner, key):
+        """El DataFrame de ``key`` (lo recarga desde disco si se había liberado) o ``None``."""
+        with self._lock:
+            entry = self._entries.get(owner, {}).get(key)
+            if entry is None:
+                return None
+            self._entries[owner].move_to_end(key)
+            entry.last_access = time.time()
+            if entry.in_memory:
+                return entry.frame
+            with timer('recarga_sesion'):
+                entry.frame = _read_spill(entry.path)
+            self.reloads += 1
+            count('memoria_sesion', operacion='recarga')
+            self._enforce(owner, keep=key)
+            return entry.frame
+
+    def discard(self, owner, key):
+        with self._lock:
+            entry = self._entries.get(owner, {}).pop(key, None)
+            if entry is not None and entry.path and os.path.exists(entry.path):
+                os.remove(entry.path)
+
+    def spill_owner(self, owner):
+        """Manda a disco todos los DataFrames de ``owner``."""
+        with self._lock:
+            for entry in self._entries.get(owner, {}).values():
+                self._spill(entry)
+
+    def usage(self, owner=None):
+        """``(bytes en memoria, bytes en disco)`` de ``owner`` o de todo el proceso."""
+        with self._lock:
+            owners = [owner] if owner is not None else list(self._entries)
+            entries = [entry for name in owners for entry in self._entries.get(name, {}).values()]
+            in_memory = sum(entry.nbytes for entry in entries if entry.in_memory)
+            # Un DataFrame recargado conserva su archivo (para volver a liberarlo sin reescribir),
+            # pero cuenta solo en memoria
+            on_disk = sum(os.path.getsize(entry.path) for entry in entries
+                          if not entry.in_memory and entry.path and os.path.exists(entry.path))
+        return in_memory, on_disk
+
+    def _spill(self, entry):
+        if not entry.in_memory:
+            return
+        if entry.path is None:  # los datos no cambian: el archivo se escribe una sola vez
+            path = os.path.join(self.directory, f"{id(entry):x}-{time.time_ns():x}.arrow")
+            with timer('volcado_sesion'):
+                entry.path = _write_spill(entry.frame, path)
+        entry.frame = None
+        self.spills += 1
+        count('memoria_sesion', operacion='volcado')
+
+    def _enforce(self, owner, keep=None):
+        """Libera los DataFrames usados hace más tiempo hasta cumplir los presupuestos."""
+        candidates = [(entry.last_access, key, entry) for key, entry in self._entries.get(owner, {}).items()
+                      if key != keep and entry.in_memory and entry.nbytes >= MIN_SPILL_BYTES]
+        used = self.usage(owner)[0]
+        for _, _, entry in sorted(candidates, key=lambda item: item[0]):
+            if used <= self.session_budget:
+                break
+            self._spill(entry)
+            used -= entry.nbytes
+
+        used = self.usage()[0]
+        if used <= self.process_budget:
+            return
+        candidates = [(entry.last_access, entry) for name, entries in self._entries.items()
+                      for key, entry in entries.items()
+                      if not (name == owner and key == keep) and entry.in_memory and entry.nbytes >= MIN_SPILL_BYTES]
+        for _, entry in sorted(candidates, key=lambda item: item[0]):
+            if used <= self.process_budget:
+                break
+            self._spill(entry)
+            used -= entry.nbytes
+
+
+@st.cache_resource(show_spinner=False)
+def get_session_frames():
+    # Un registro por proceso: el presupuesto total es el de la memoria del proceso
+    return SessionFrames()
@@ -0,0 +1,119 @@
+"""Resúmenes aproximados de memoria acotada para columnas de alta cardinalidad.
+
+- ``SpaceSaving(k)``: los ``k`` valores más frecuentes. Cada conteo es una
+  sobreestimación con error acotado: el valor real está en
+  ``[conteo - error, conteo]``, y cualquier valor fuera del resumen aparece a
+  lo sumo ``min_count`` veces. Para una columna con un valor dominante, los
+  primeros puestos son exactos en la práctica.
+- ``HyperLogLog(p)``: número de valores distintos con ``2**p`` registros de un
+  byte; error estándar relativo ``1.04 / sqrt(2**p)`` (0.81 % con ``p=14``,
+  16 KB por columna).
+
+Ambos se actualizan por bloques y se pueden combinar con ``merge``.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_TOP_K = 50
+DEFAULT_PRECISION = 14
+
+
+def _hash_values(values):
+    """Hash de 64 bits estable por valor (los nulos se omiten)."""
+    values = pd.Index(values).dropna()
+    return pd.util.hash_array(np.asarray(values.astype(str), dtype=object))
+
+
+def _bit_length(values):
+    # bit_length exacto para uint64: log2 en float64 es exacto por mitades de 32 bits
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide='ignore'):
+        high_bits = np.where(high > 0, np.floor(np.log2(high)) + 33, 0)
+        low_bits = np.where(low > 0, np.floor(np.log2(low)) + 1, 0)
+    return np.where(high > 0, high_bits, low_bits).astype(np.int64)
+
+
+class HyperLogLog:
+    def __init__(self, precision=DEFAULT_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self):
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def update(self, values):
+        """Agrega los valores de una columna (solo importan los distintos)."""
+        uniques = pd.unique(np.asarray(values, dtype=object))
+        hashes = _hash_values(uniques)
+        if not len(hashes):
+            return self
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        rest = hashes & ((np.uint64(1) << (np.uint64(64) - p)) - np.uint64(1))
+        rank = (64 - self.precision) - _bit_length(rest) + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Corrección de rango pequeño (conteo lineal)
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+
+class SpaceSaving:
+    def __init__(self, k=DEFAULT_TOP_K):
+        self.k = k
+        self.counts = pd.Series(dtype=np.int64)
+        self.errors = pd.Series(dtype=np.int64)
+        self.total = 0
+
+    @property
+    def min_count(self):
+        """Cota de frecuencia de cualquier valor que no está en el resumen."""
+        return int(self.counts.min()) if len(self.counts) >= self.k else 0
+
+    def update(self, values):
+        """Agrega los valores de una columna (un bloque a la vez)."""
+        counts = pd.Series(np.asarray(values, dtype=object)).value_counts(dropna=True)
+        return self._add(counts, pd.Series(0, index=counts.index, dtype=np.int64))
+
+    def merge(self, other):
+        # Los valores ausentes del otro resumen pudieron aparecer ahí hasta su min_count veces
+        missing = ~self.counts.index.isin(other.counts.index)
+        self.counts[missing] += other.min_count
+        self.errors[missing] += other.min_count
+        self._add(other.counts, other.errors)
+        self.total += other.total - int(other.counts.sum())  # _add solo sumó los conteos del resumen
+        return self
+
+    def _add(self, counts, errors):
+        floor = self.min_count
+        known = counts.index.isin(self.counts.index)
+        self.counts = self.counts.add(counts[known], fill_value=0).astype(np.int64)
+        self.errors = self.errors.add(errors[known], fill_value=0).astype(np.int64)
+        # Un valor nuevo hereda el menor contador como posible sobreconteo
+        new_counts = counts[~known] + floor
+        new_errors = errors[~known] + floor
+        pool = pd.concat([self.counts, new_counts])
+        keep = pool.sort_values(ascending=False, kind='stable').index[:self.k]
+        self.counts = pool[keep].astype(np.int64)
+        self.errors = pd.concat([self.errors, new_errors])[keep].astype(np.int64)
+        self.total += int(counts.sum())
+        return self
+
+    def top(self, n=None):
+        """``DataFrame`` con ``count`` (estimado) y ``error`` (sobreconteo máximo)."""
+        table = pd.DataFrame({'count': self.counts, 'error': self.errors})
+        table = table.sort_values('count', ascending=False, kind='stable')
+        return table if n is None else table.head(n)
@@ -0,0 +1,59 @@
+import pytest
+
+from api_client import ApiClient, rejects_format
+from mock_api import MockApiConfig, start_server
+from synthetic import generate_population
+from wire_format import COLUMNAR_JSON, RECORDS, decode_predictions
+
+
+@pytest.fixture
+def records_only_api():
+    server, base_url = start_server(config=MockApiConfig(batch_formats=[RECORDS]))
+    client = ApiClient(base_url, retries=0)
+    yield server, client
+    client.close()
+    server.shutdown()
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+
+
+def test_rejects_format_only_for_format_errors():
+    assert rejects_format(FakeResponse(415))
+    assert rejects_format(FakeResponse(400, '{"error": "Content-Type no soportado"}'))
+    assert not rejects_format(FakeResponse(400, '{"error": "Solicitud inválida: \'Genero\'"}'))
+    assert not rejects_format(FakeResponse(503, 'format'))
+    assert not rejects_format(FakeResponse(200))
+
+
+def test_unsupported_format_falls_back_to_records(records_only_api):
+    server, client = records_only_api
+    frame = generate_population(50, seed=1)
+
+    response = client.batch_predict(frame, wire_format=COLUMNAR_JSON)
+    assert response.status_code == 200
+    assert len(decode_predictions(response)[0]) == len(frame)
+    assert client.unsupported_formats == {COLUMNAR_JSON}
+
+    # Las siguientes solicitudes van directo como records
+    requests_before = server.stats.requests
+    assert client.batch_predict(frame, wire_format=COLUMNAR_JSON).status_code == 200
+    assert server.stats.requests == requests_before + 1
+
+
+def test_invalid_data_does_not_downgrade_the_format(monkeypatch):
+    client = ApiClient('http://127.0.0.1:9', retries=0)
+    sent = []
+
+    def post(endpoint, headers=None, **kwargs):
+        sent.append(headers['Content-Type'])
+        return FakeResponse(400, '{"error": "Solicitud inválida: valor nulo en el registro 3"}')
+
+    monkeypatch.setattr(client, 'post', post)
+    response = client.batch_predict(generate_population(10, seed=2), wire_format=COLUMNAR_JSON)
+    assert response.status_code == 400
+    assert len(sent) == 1
+    assert client.unsupported_formats == set()
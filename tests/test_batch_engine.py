@@ -0,0 +1,143 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_engine import BatchPredictionError, iter_predictions, run_batch_prediction, split_chunks
+from local_model import LocalResponse
+from mock_api import MockApiConfig, start_server
+from api_client import ApiClient
+from prediction_cache import PredictionCache
+from synthetic import generate_population
+
+
+class FakeClient:
+    """Cliente que predice ``valor % 2`` con demoras e intentos configurables por bloque."""
+
+    def __init__(self, delays=None, attempts=None, failing=()):
+        self.delays = delays or {}
+        self.attempts = attempts or {}
+        self.failing = set(failing)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def batch_predict(self, frame, wire_format=None, timeout=None, retries=None):
+        block = int(frame['bloque'].iloc[0])
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delays.get(block, 0))
+        if block in self.failing:
+            response = LocalResponse({'error': 'falla'})
+            response.status_code = 503
+            return response
+        values = frame['valor'].to_numpy()
+        response = LocalResponse(predictions=values % 2,
+                                 probabilities=np.column_stack([1 - values % 2, values % 2]).astype(float))
+        response.attempts = self.attempts.get(block, 1)
+        return response
+
+
+def blocks(n_blocks, rows=10):
+    return [pd.DataFrame({'bloque': i, 'valor': np.arange(i * rows, (i + 1) * rows)}) for i in range(n_blocks)]
+
+
+def test_split_chunks_covers_all_rows():
+    assert split_chunks(10, 4) == [(0, 4), (4, 8), (8, 10)]
+    assert split_chunks(0, 4) == []
+
+
+def test_iter_predictions_yields_blocks_in_order():
+    # Los primeros bloques terminan al final: la entrega debe respetar el orden original
+    client = FakeClient(delays={0: 0.2, 1: 0.1})
+    results = list(iter_predictions(blocks(6), client, max_workers=4))
+    assert [int(chunk['bloque'].iloc[0]) for chunk, *_ in results] == list(range(6))
+    for chunk, predictions, probabilities, retries, _ in results:
+        np.testing.assert_array_equal(predictions, chunk['valor'].to_numpy() % 2)
+        assert probabilities.shape == (len(chunk), 2)
+
+
+def test_iter_predictions_reports_retries_per_block():
+    client = FakeClient(attempts={1: 3, 4: 2})
+    retries = [retries for *_, retries, _ in iter_predictions(blocks(5), client, max_workers=2)]
+    assert retries == [0, 2, 0, 0, 1]
+
+
+def test_iter_predictions_propagates_failed_block():
+    client = FakeClient(failing={2})
+    with pytest.raises(BatchPredictionError) as error:
+        list(iter_predictions(blocks(8), client, max_workers=2))
+    assert error.value.status_code == 503
+
+
+def test_iter_predictions_reads_chunks_lazily():
+    client = FakeClient(delays={i: 0.01 for i in range(50)})
+    consumed = []
+
+    def produce():
+        for chunk in blocks(50):
+            consumed.append(int(chunk['bloque'].iloc[0]))
+            yield chunk
+
+    iterator = iter_predictions(produce(), client, max_workers=2)
+    next(iterator)
+    # Ventana de 2 * max_workers bloques en vuelo o pendientes de entrega
+    assert len(consumed) <= 2 * 2 + 1
+    iterator.close()
+
+
+def test_api_client_retries_server_errors_before_failing():
+    server, base_url = start_server(config=MockApiConfig(error_rate=1.0))
+    client = ApiClient(base_url, retries=2, backoff=0)
+    try:
+        with pytest.raises(BatchPredictionError):
+            list(iter_predictions([generate_population(20, seed=1)], client, max_workers=1, max_retries=2))
+        assert server.stats.injected_errors == 3
+    finally:
+        client.close()
+        server.shutdown()
+
+
+def test_run_batch_prediction_deduplicates_and_uses_cache():
+    population = generate_population(200, seed=3)
+    frame = pd.concat([population, population, population], ignore_index=True)
+    sent = []
+
+    class Client:
+        def batch_predict(self, chunk, **kwargs):
+            sent.append(len(chunk))
+            predictions = (chunk['Genero'].astype(str) == 'Femenino').to_numpy().astype(int)
+            return LocalResponse(predictions=predictions,
+                                 probabilities=np.column_stack([1 - predictions, predictions]).astype(float))
+
+    expected = (frame['Genero'].astype(str) == 'Femenino').to_numpy().astype(int)
+    n_unique = len(population.drop_duplicates())
+    cache = PredictionCache()
+    result = run_batch_prediction(frame, Client(), cache=cache, model_version='v1')
+    assert sum(sent) == n_unique == result.unique_rows
+    np.testing.assert_array_equal(result.predictions, expected)
+
+    sent.clear()
+    again = run_batch_prediction(frame, Client(), cache=cache, model_version='v1')
+    assert sent == [] and again.cache_hits == n_unique
+    np.testing.assert_array_equal(again.predictions, expected)
+
+
+def test_run_batch_prediction_reports_progress_in_data_rows():
+    population = generate_population(100, seed=4)
+    frame = pd.concat([population] * 4, ignore_index=True)
+    calls = []
+
+    class Client:
+        def batch_predict(self, chunk, **kwargs):
+            return LocalResponse(predictions=np.zeros(len(chunk), dtype=int), probabilities=np.zeros((len(chunk), 2)))
+
+    cache = PredictionCache()
+    run_batch_prediction(population.iloc[:50], Client(), cache=cache, model_version='v1')
+    run_batch_prediction(frame, Client(), chunk_size=10, cache=cache, model_version='v1',
+                         progress_callback=lambda done, total, seconds: calls.append((done, total)))
+    # Las 50 combinaciones en caché cubren 200 filas, que cuentan desde el primer bloque
+    assert calls[0] == (200 + 4 * 10, 400)
+    assert calls[-1] == (400, 400)
+    assert [done for done, _ in calls] == sorted(done for done, _ in calls)
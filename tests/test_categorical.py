@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from categorical import FEATURE_VOCABULARIES, category_codes, row_group_ids, to_categorical
+from synthetic import generate_population
+
+
+def test_to_categorical_keeps_vocabulary_codes_and_reports_unknown_values():
+    data = pd.DataFrame({
+        'Genero': ['Femenino', ' Masculino ', 'Otro', 'Otro', ''],
+        'Nivel_Sisben': [1, 2, 3, 4, 1],
+        'Municipio': ['CALI', 'PASTO', 'CALI', None, 'TUNJA'],
+    })
+    converted, unknown = to_categorical(data)
+
+    genero = converted['Genero']
+    assert list(genero.cat.categories) == FEATURE_VOCABULARIES['Genero'] + ['Otro']
+    np.testing.assert_array_equal(genero.cat.codes, [1, 0, 2, 2, -1])
+    assert unknown == {'Genero': {'Otro': 2}}
+
+    # Los enteros leídos del CSV coinciden con el vocabulario de texto
+    assert list(converted['Nivel_Sisben'].astype(str)) == ['1', '2', '3', '4', '1']
+    assert list(converted['Municipio'].cat.categories) == ['CALI', 'PASTO', 'TUNJA']
+    assert converted['Municipio'].isna().sum() == 1
+    # El DataFrame original no se modifica
+    assert not isinstance(data['Genero'].dtype, pd.CategoricalDtype)
+
+
+def test_category_codes_for_plain_and_categorical_columns():
+    codes, labels = category_codes(pd.Series(['b', 'a', None, 'b']))
+    np.testing.assert_array_equal(codes, [1, 0, -1, 1])
+    assert list(labels) == ['a', 'b']
+
+    series = pd.Series(pd.Categorical(['y', 'x'], categories=['y', 'x', 'z']))
+    codes, labels = category_codes(series)
+    np.testing.assert_array_equal(codes, [0, 1])
+    assert list(labels) == ['y', 'x', 'z']
+
+
+def test_row_group_ids_round_trip():
+    population = generate_population(300, seed=5)
+    data = pd.concat([population, population.iloc[::3], population.iloc[::7]], ignore_index=True)
+    group_ids, first_positions = row_group_ids(data)
+
+    unique_rows = data.iloc[first_positions]
+    assert len(unique_rows) == len(data.drop_duplicates())
+    assert not unique_rows.duplicated().any()
+    rebuilt = unique_rows.iloc[group_ids].reset_index(drop=True)
+    pd.testing.assert_frame_equal(rebuilt, data)
+
+
+def test_row_group_ids_first_appearance_order_and_missing_values():
+    data = pd.DataFrame({'a': ['x', None, 'x', 'y', None], 'b': [1, 2, 1, 1, 2]})
+    group_ids, first_positions = row_group_ids(data)
+    np.testing.assert_array_equal(group_ids, [0, 1, 0, 2, 1])
+    np.testing.assert_array_equal(first_positions, [0, 1, 3])
+
+
+def test_row_group_ids_subset_of_columns():
+    data = pd.DataFrame({'a': ['x', 'x', 'y'], 'b': [1, 2, 3]})
+    group_ids, first_positions = row_group_ids(data, columns=['a'])
+    np.testing.assert_array_equal(group_ids, [0, 0, 1])
+    np.testing.assert_array_equal(first_positions, [0, 2])
@@ -0,0 +1,67 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from categorical import to_categorical
+from eda_stats import EdaStats, iter_csv_stats
+from synthetic import generate_population
+
+
+def sample_csv(n_rows=6000, seed=11):
+    data = generate_population(n_rows, seed=seed).astype(object)
+    rng = np.random.default_rng(seed)
+    data['edad'] = rng.integers(0, 100, size=n_rows)
+    data['documento'] = [f'D{value}' for value in rng.integers(0, 20_000, size=n_rows)]
+    data.loc[rng.random(n_rows) < 0.05, 'Zona'] = None
+    return data.to_csv(index=False).encode('utf-8')
+
+
+def counts_of(series):
+    return {str(label): int(count) for label, count in series.items()}
+
+
+def test_incremental_stats_match_pandas():
+    body = sample_csv()
+    expected, _ = to_categorical(pd.read_csv(io.BytesIO(body)))
+    *_, stats = iter_csv_stats(io.BytesIO(body), chunk_rows=1000)
+
+    assert stats.rows == len(expected)
+    assert stats.columns == list(expected.columns)
+    pd.testing.assert_series_equal(stats.nulls.reindex(expected.columns), expected.isna().sum(), check_dtype=False)
+
+    for col in ['Genero', 'Zona', 'Municipio', 'edad']:
+        assert counts_of(stats.value_counts(col)) == counts_of(expected[col].value_counts())
+        assert stats.nunique(col) == expected[col].nunique()
+        assert not stats.nunique_is_estimate(col)
+
+    crosstab = stats.crosstab('Departamento', 'Zona')
+    direct = pd.crosstab(expected['Departamento'].astype(str), expected['Zona'].astype(str))
+    pd.testing.assert_frame_equal(crosstab.sort_index().sort_index(axis=1).astype(np.int64),
+                                  direct.sort_index().sort_index(axis=1), check_names=False)
+
+
+def test_high_cardinality_column_keeps_an_estimated_distinct_count():
+    body = sample_csv()
+    expected = pd.read_csv(io.BytesIO(body))
+    # El primer bloque ya tiene más categorías de las que admite el cubo
+    *_, stats = iter_csv_stats(io.BytesIO(body), chunk_rows=3000)
+
+    assert 'documento' not in stats.cube.features
+    assert stats.nunique_is_estimate('documento')
+    true_distinct = expected['documento'].nunique()
+    error = stats.distinct['documento'].relative_error
+    assert abs(stats.nunique('documento') - true_distinct) <= 4 * error * true_distinct
+
+
+def test_merge_equals_single_pass():
+    body = sample_csv(4000, seed=12)
+    frame, _ = to_categorical(pd.read_csv(io.BytesIO(body)).drop(columns='documento'))
+    single = EdaStats().update(frame)
+    merged = EdaStats().update(frame.iloc[:1500]).merge(EdaStats().update(frame.iloc[1500:]))
+
+    assert merged.rows == single.rows
+    pd.testing.assert_series_equal(merged.nulls, single.nulls)
+    for col in ['Grupo_etario', 'Municipio']:
+        assert counts_of(merged.value_counts(col)) == counts_of(single.value_counts(col))
+    assert merged.nunique('edad') == single.nunique('edad')
@@ -0,0 +1,95 @@
+import gzip
+import io
+import os
+
+import pandas as pd
+import pytest
+
+import exports
+from exports import CSV, CSV_GZIP, PARQUET, ExportCache, csv_file_export, frame_export
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ExportCache()
+    monkeypatch.setattr(exports, 'get_export_cache', lambda: cache)
+    yield cache
+    cache.clear()
+
+
+def results(n_rows=50):
+    return pd.DataFrame({'Genero': ['Femenino', 'Masculino'] * (n_rows // 2), 'prediccion': range(n_rows)})
+
+
+def test_get_or_create_writes_once_per_source_and_format(cache):
+    writes = []
+
+    def write(path):
+        writes.append(path)
+        with open(path, 'w') as handle:
+            handle.write('datos')
+
+    first = cache.get_or_create('fuente', CSV, write)
+    assert cache.get_or_create('fuente', CSV, write) == first
+    assert len(writes) == 1
+    cache.get_or_create('fuente', CSV_GZIP, write)
+    assert len(writes) == 2 and len(cache) == 2
+
+    # Si el archivo desaparece se vuelve a generar
+    os.remove(first)
+    cache.get_or_create('fuente', CSV, write)
+    assert len(writes) == 3
+
+
+def test_changed_frame_is_exported_again(cache):
+    frame = results()
+    read = frame_export(frame, CSV)
+    assert pd.read_csv(io.BytesIO(read())).equals(frame)
+    assert len(cache) == 1
+    frame_export(frame.copy(), CSV)()
+    assert len(cache) == 1  # misma huella: mismo archivo
+
+    changed = frame.copy()
+    changed.loc[0, 'prediccion'] = 99
+    assert pd.read_csv(io.BytesIO(frame_export(changed, CSV)())).loc[0, 'prediccion'] == 99
+    assert len(cache) == 2
+
+
+def test_deferred_frame_is_built_only_on_click(cache):
+    calls = []
+
+    def build():
+        calls.append(1)
+        return results()
+
+    read = frame_export(build, CSV_GZIP)
+    assert calls == []
+    assert pd.read_csv(io.BytesIO(gzip.decompress(read()))).equals(results())
+    assert calls == [1]
+
+
+def test_eviction_keeps_the_cache_under_its_byte_limit(monkeypatch):
+    cache = ExportCache(max_bytes=150)
+    monkeypatch.setattr(exports, 'get_export_cache', lambda: cache)
+
+    def write(path):
+        with open(path, 'wb') as handle:
+            handle.write(b'x' * 100)
+
+    first = cache.get_or_create('a', CSV, write)
+    cache.get_or_create('b', CSV, write)
+    assert len(cache) == 1 and not os.path.exists(first)
+    cache.clear()
+
+
+@pytest.mark.parametrize('fmt', exports.available_formats())
+def test_csv_file_export_converts_streaming_output(cache, tmp_path, fmt):
+    source = tmp_path / 'resultados.csv'
+    results().to_csv(source, index=False)
+    with open(source, encoding='utf-8') as file_obj:
+        data = csv_file_export(file_obj, 'trabajo-1', fmt)()
+    if fmt == PARQUET:
+        exported = pd.read_parquet(io.BytesIO(data))
+    else:
+        exported = pd.read_csv(io.BytesIO(gzip.decompress(data) if fmt == CSV_GZIP else data))
+    pd.testing.assert_frame_equal(exported.astype(str), results().astype(str))
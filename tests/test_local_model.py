@@ -0,0 +1,91 @@
+import joblib
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import OrdinalEncoder
+
+from api_client import ApiClient
+from batch_engine import predict_chunk, run_batch_prediction
+from categorical import REQUIRED_COLUMNS
+from local_model import LocalModel, LocalModelClient, build_demo_model
+from mock_api import predict_frame, start_server
+from synthetic import generate_population
+from wire_format import decode_predictions
+
+
+@pytest.fixture(scope='module')
+def demo_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('modelo') / 'modelo.joblib'
+    joblib.dump(build_demo_model(rows=20_000, seed=1), path)
+    return str(path)
+
+
+def test_load_demo_artifact(demo_path):
+    model = LocalModel.load(demo_path)
+    assert model.version == 'demo-20000-1'
+    assert set(model.categories) == set(REQUIRED_COLUMNS)
+
+    population = generate_population(2000, seed=2)
+    predictions, probabilities = model.predict(population)
+    assert predictions.dtype == np.int64 and probabilities.shape == (2000, 2)
+    expected, _ = predict_frame(population)
+    assert (predictions == expected).mean() > 0.8  # árbol entrenado con pocas filas
+
+
+def test_bare_estimator_gets_a_file_hash_version(tmp_path):
+    population = generate_population(500, seed=3)
+    encoder = OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=-1).fit(population[REQUIRED_COLUMNS])
+    labels, _ = predict_frame(population)
+    estimator = LogisticRegression().fit(encoder.transform(population[REQUIRED_COLUMNS]), labels)
+    joblib.dump({'model': estimator, 'encoder': encoder}, tmp_path / 'con_encoder.joblib')
+    joblib.dump(estimator, tmp_path / 'solo.joblib')
+
+    with_encoder = LocalModel.load(str(tmp_path / 'con_encoder.joblib'))
+    assert with_encoder.version.startswith('local-')
+    assert len(with_encoder.predict(population)[0]) == len(population)
+    assert LocalModel.load(str(tmp_path / 'solo.joblib')).encoder is None
+
+
+def test_unknown_categories_encode_as_missing(demo_path):
+    model = LocalModel.load(demo_path)
+    population = generate_population(5, seed=4).astype(object)
+    population.loc[0, 'Municipio'] = 'MUNICIPIO NUEVO'
+    population.loc[1, 'Zona'] = None
+    encoded = model.encode(population)
+    assert encoded[0, REQUIRED_COLUMNS.index('Municipio')] == -1
+    assert encoded[1, REQUIRED_COLUMNS.index('Zona')] == -1
+    assert len(model.predict(population)[0]) == 5
+
+
+def test_client_matches_the_api_client_interface(demo_path):
+    local = LocalModelClient(LocalModel.load(demo_path), demo_path)
+    health = local.health().json()
+    assert health['status'] == 'healthy' and health['model_version'] == 'demo-20000-1'
+    assert 'endpoints' in local.root().json()
+
+    population = generate_population(300, seed=5)
+    response = local.batch_predict(population, wire_format='arrow', timeout=5, retries=1)
+    predictions, probabilities = decode_predictions(response)
+    assert response.status_code == 200 and len(predictions) == 300
+    assert response.json()['predictions'] == predictions.tolist()
+
+    record = population.iloc[0].astype(str).to_dict()
+    single = local.predict(record).json()
+    assert single['predictions'] == [int(predictions[0])]
+
+    chunk_predictions, _, retries = predict_chunk(local, population, timeout=None, max_retries=0, wire_format=None)
+    np.testing.assert_array_equal(chunk_predictions, predictions)
+    assert retries == 0
+
+    # El mismo lote por el modelo local y por la API (simulada) tiene la misma forma de resultado
+    server, base_url = start_server()
+    client = ApiClient(base_url, retries=0)
+    try:
+        remote = run_batch_prediction(population, client)
+    finally:
+        client.close()
+        server.shutdown()
+    in_process = run_batch_prediction(population, local)
+    assert in_process.predictions.shape == remote.predictions.shape
+    assert in_process.probabilities.shape == remote.probabilities.shape
+    assert (in_process.predictions == remote.predictions).mean() > 0.8
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+import requests
+
+from mock_api import MockApiConfig, start_server
+from synthetic import generate_population
+from wire_format import RECORDS, decode_predictions, encode_batch
+
+
+@pytest.fixture
+def mock_api():
+    servers = []
+
+    def start(**options):
+        server, base_url = start_server(config=MockApiConfig(**options))
+        servers.append(server)
+        return server, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def post_batch(base_url, n_rows=20, seed=1):
+    body, headers = encode_batch(generate_population(n_rows, seed=seed), RECORDS)
+    return requests.post(f"{base_url}/batch_predict", data=body, headers=headers, timeout=5)
+
+
+def test_predictions_are_deterministic(mock_api):
+    _, base_url = mock_api()
+    first, second = post_batch(base_url), post_batch(base_url)
+    assert first.status_code == second.status_code == 200
+    assert decode_predictions(first)[0] == decode_predictions(second)[0]
+
+
+def test_error_rate_injects_server_errors(mock_api):
+    server, base_url = mock_api(error_rate=1.0, error_status=502)
+    response = post_batch(base_url)
+    assert response.status_code == 502
+    assert server.stats.as_dict()['injected_errors'] == 1
+    # /health no pasa por la inyección de fallas
+    assert requests.get(f"{base_url}/health", timeout=5).status_code == 200
+
+
+def test_seeded_failures_are_reproducible(mock_api):
+    statuses = []
+    for _ in range(2):
+        _, base_url = mock_api(error_rate=0.5, seed=7)
+        statuses.append([post_batch(base_url, n_rows=2).status_code for _ in range(12)])
+    assert statuses[0] == statuses[1]
+    assert set(statuses[0]) == {200, 503}
+
+
+def test_drop_rate_closes_the_connection(mock_api):
+    server, base_url = mock_api(drop_rate=1.0)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        post_batch(base_url)
+    assert server.stats.dropped == 1
+
+
+def test_size_limits_answer_413(mock_api):
+    server, base_url = mock_api(max_batch_rows=10, max_body_bytes=50_000)
+    assert post_batch(base_url, n_rows=11).status_code == 413
+    assert post_batch(base_url, n_rows=400).status_code == 413
+    assert post_batch(base_url, n_rows=10).status_code == 200
+    assert server.stats.rejected == 2 and server.stats.rows == 10
+
+
+def test_latency_per_request_and_row(mock_api):
+    _, base_url = mock_api(latency=0.05, latency_per_row=0.001)
+    start = time.perf_counter()
+    assert post_batch(base_url, n_rows=100).status_code == 200
+    assert time.perf_counter() - start >= 0.15
@@ -0,0 +1,63 @@
+import pytest
+
+import prediction_cache
+from prediction_cache import PredictionCache
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(prediction_cache.time, 'time', clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = PredictionCache(ttl=60)
+    cache.put('a', 1, [0.2, 0.8])
+    clock.now += 60
+    assert cache.get('a') == (1, [0.2, 0.8])
+    clock.now += 1
+    assert cache.get('a') is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = PredictionCache(max_entries=3)
+    cache.put_many(['a', 'b', 'c'], [0, 1, 0])
+    assert cache.get('a') == (0, None)  # 'a' pasa a ser la más reciente
+    cache.put('d', 1)
+    assert len(cache) == 3
+    assert cache.get_many(['a', 'b', 'c', 'd']) == [(0, None), None, (0, None), (1, None)]
+
+
+def test_put_refreshes_timestamp_and_value(clock):
+    cache = PredictionCache(ttl=10)
+    cache.put('a', 0)
+    clock.now += 8
+    cache.put('a', 1)
+    clock.now += 8
+    assert cache.get('a') == (1, None)
+
+
+def test_make_key_depends_on_model_version():
+    record = {'Genero': 'Femenino', 'Zona': 'Rural'}
+    assert PredictionCache.make_key(record, 'v1') != PredictionCache.make_key(record, 'v2')
+    assert PredictionCache.make_key(record, 'v1') == PredictionCache.make_key(dict(record), 'v1')
+
+
+def test_clear_resets_counters(clock):
+    cache = PredictionCache()
+    cache.put('a', 1)
+    cache.get('a')
+    cache.get('b')
+    cache.clear()
+    assert len(cache) == 0 and cache.hits == cache.misses == 0
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from prediction_log import (PredictionLog, _gzip_member, list_segments, prediction_record, read_log)
+
+
+def record(i, origin='api'):
+    data = {'Genero': 'Femenino' if i % 2 else 'Masculino', 'Municipio': f'M{i}', 'Zona': 'Urbana'}
+    return prediction_record(data, i % 2, [0.3, 0.7], model_version='v1', origin=origin, response_ms=12.34)
+
+
+def test_round_trip(tmp_path):
+    log = PredictionLog(str(tmp_path), flush_interval=0.01)
+    for i in range(25):
+        log.log(record(i))
+    assert log.flush()
+
+    frame = read_log(str(tmp_path))
+    assert len(frame) == 25 and log.written == 25
+    assert sorted(frame['Municipio'].astype(str)) == sorted(f'M{i}' for i in range(25))
+    assert frame['prediccion'].sum() == 12
+    np.testing.assert_allclose(frame['probabilidad_alto'], 0.7)
+    np.testing.assert_allclose(frame['tiempo_ms'], 12.3)
+    assert isinstance(frame['Genero'].dtype, pd.CategoricalDtype)
+    assert frame['fecha'].is_monotonic_increasing
+
+
+def test_truncated_last_member_is_ignored(tmp_path):
+    log = PredictionLog(str(tmp_path), flush_interval=0.01)
+    for i in range(5):
+        log.log(record(i))
+    assert log.flush()
+    segment, = list_segments(str(tmp_path))
+
+    # Un corte del proceso a mitad de la escritura deja un miembro incompleto al final
+    member = _gzip_member(['{"fecha": "2026-01-01T00:00:00", "Municipio": "perdido"}\n'])
+    with open(segment, 'ab') as handle:
+        handle.write(member[:len(member) // 2])
+
+    frame = read_log(str(tmp_path))
+    assert len(frame) == 5
+    assert 'perdido' not in set(frame['Municipio'].astype(str))
+
+
+def test_segments_rotate_and_oldest_are_removed(tmp_path):
+    log = PredictionLog(str(tmp_path), max_segment_bytes=300, max_segments=3, flush_interval=0.01)
+    for i in range(15):
+        log.log(record(i))
+        assert log.flush()  # un miembro por registro
+
+    segments = list_segments(str(tmp_path))
+    assert len(segments) == 3
+    assert all(os.path.getsize(path) <= 300 for path in segments)
+    # Se conservan los registros más recientes
+    kept = read_log(str(tmp_path))['Municipio'].astype(str).tolist()
+    assert kept == [f'M{i}' for i in range(15 - len(kept), 15)]
+
+
+def test_since_filters_by_date(tmp_path):
+    log = PredictionLog(str(tmp_path), flush_interval=0.01)
+    log.log(dict(record(0), fecha='2026-01-01T10:00:00.000'))
+    log.log(dict(record(1), fecha='2026-03-01T10:00:00.000'))
+    assert log.flush()
+    assert read_log(str(tmp_path), since='2026-02-01')['Municipio'].astype(str).tolist() == ['M1']
+
+
+def test_prediction_record_keeps_first_and_last_class():
+    entry = prediction_record({'Genero': 'Femenino'}, 2, [0.2, 0.3, 0.5], origin='local', response_ms=1.26)
+    assert (entry['probabilidad_bajo'], entry['probabilidad_alto']) == (0.2, 0.5)
+    assert entry['Zona'] is None and entry['tiempo_ms'] == 1.3
+    empty = read_log('/nonexistent/salud')
+    assert empty.empty and list(empty.columns)[:2] == ['fecha', 'Genero']
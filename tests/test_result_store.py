@@ -0,0 +1,121 @@
+import io
+import sqlite3
+import time
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_jobs import DONE, FAILED, JobManager
+from categorical import REQUIRED_COLUMNS
+from local_model import LocalResponse
+from result_store import ResultStore
+from results_cube import ResultsCube
+from session_data import SessionFrames
+from synthetic import generate_population
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultStore(str(tmp_path / 'resultados.sqlite'), max_runs=3)
+
+
+def predicted(n_rows, seed):
+    data = generate_population(n_rows, seed=seed)
+    data['prediccion'] = (data['Genero'].astype(str) == 'Femenino').astype(int)
+    return data
+
+
+def tables(store):
+    with closing(sqlite3.connect(store.path)) as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_each_run_gets_its_own_table(store):
+    data = predicted(200, seed=1)
+    probabilities = np.linspace(0, 1, len(data))
+    run_id = store.save_frame(data, 'huella', 'lote.csv', 'v1', probabilities, ResultsCube.build(data))
+
+    assert f'results_{run_id}' in tables(store)
+    loaded = store.load_frame(run_id)
+    for col in REQUIRED_COLUMNS:
+        assert loaded[col].astype(str).tolist() == data[col].astype(str).tolist()
+    np.testing.assert_array_equal(loaded['prediccion'], data['prediccion'])
+    np.testing.assert_allclose(loaded['probabilidad'], probabilities)
+
+    runs = store.list_runs('huella')
+    assert list(runs.index) == [run_id]
+    assert runs.loc[run_id, 'total_rows'] == 200
+    assert runs.loc[run_id, 'high_risk_rows'] == data['prediccion'].sum()
+    assert store.load_cube(run_id).total == 200
+
+
+def test_filters_match_pandas_across_runs(store):
+    first, second = predicted(300, seed=2), predicted(300, seed=3)
+    run_ids = [store.save_frame(first, 'a'), store.save_frame(second, 'b')]
+    both = pd.concat([first, second], ignore_index=True)
+
+    filters = {'Zona': ['Rural', 'Urbana'], 'Genero': ['Femenino']}
+    mask = both['Zona'].astype(str).isin(filters['Zona']) & (both['Genero'].astype(str) == 'Femenino')
+    assert store.count(run_ids, filters) == (int(mask.sum()), int(both.loc[mask, 'prediccion'].sum()))
+    assert len(store.query(run_ids, filters, limit=None)) == mask.sum()
+
+    # Una categoría que nunca se guardó no coincide con ninguna fila
+    assert store.count(run_ids, {'Zona': ['No existe']}) == (0, 0)
+    assert store.count(run_ids, {}) == (600, int(both['prediccion'].sum()))
+
+    by_zone = store.aggregate(['Zona'], run_ids).set_index('Zona')['registros']
+    expected = both['Zona'].astype(str).value_counts()
+    assert by_zone.astype(int).to_dict() == expected.to_dict()
+
+
+def test_delete_and_prune_drop_run_tables(store):
+    run_ids = [store.save_frame(predicted(20, seed=i), f'h{i}') for i in range(5)]
+    # max_runs=3: las dos corridas más antiguas se descartan al completar las nuevas
+    assert list(store.list_runs().index) == run_ids[:1:-1]
+    assert f'results_{run_ids[0]}' not in tables(store)
+
+    store.delete_run(run_ids[-1])
+    assert list(store.list_runs().index) == run_ids[3:1:-1]
+    assert f'results_{run_ids[-1]}' not in tables(store)
+    with pytest.raises(KeyError):
+        store.load_cube(run_ids[-1])
+
+
+def test_aborted_run_is_not_listed(store):
+    writer = store.open_run('huella')
+    writer.append(predicted(10, seed=4))
+    writer.abort()
+    assert store.list_runs().empty
+    assert f'results_{writer.run_id}' not in tables(store)
+
+
+class Client:
+    def batch_predict(self, chunk, **kwargs):
+        high = (chunk['Genero'].astype(str) == 'Femenino').to_numpy().astype(float) * 0.5 + 0.25
+        return LocalResponse(predictions=(high > 0.5).astype(int), probabilities=np.column_stack([1 - high, high]))
+
+
+def wait_for(job):
+    deadline = time.time() + 10
+    # El trabajo se marca completado antes de guardarse: esperar al run_id
+    while job.run_id is None and job.store_error is None and job.status != FAILED and time.time() < deadline:
+        time.sleep(0.02)
+    assert job.status == DONE and job.store_error is None
+    return job.run_id
+
+
+def test_frame_and_streaming_jobs_store_the_same_results(store):
+    manager = JobManager(store=store, frames=SessionFrames())
+    data = generate_population(500, seed=5).astype(str)
+    frame_job = manager.submit_frame(data, Client(), 'lote.csv', fingerprint='huella',
+                                   model_version='v1')
+    stream_job = manager.submit_file(io.BytesIO(data.to_csv(index=False).encode('utf-8')), Client(), 'lote.csv',
+                                     fingerprint='huella', model_version='v1', chunk_size=50)
+
+    frame_rows = store.load_frame(wait_for(frame_job))
+    stream_rows = store.load_frame(wait_for(stream_job))
+    assert stream_rows['probabilidad'].notna().all()
+    pd.testing.assert_frame_equal(frame_rows.drop(columns='fecha_procesamiento').astype(str),
+                                  stream_rows.drop(columns='fecha_procesamiento').astype(str))
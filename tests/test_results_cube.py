@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+import results_cube
+from results_cube import ResultsCube
+from synthetic import generate_population
+
+FEATURES = ['Genero', 'Grupo_etario', 'Zona', 'Municipio']
+
+
+def predicted_population(n_rows, seed):
+    data = generate_population(n_rows, seed=seed)
+    rng = np.random.default_rng(seed)
+    data['prediccion'] = rng.integers(0, 2, size=n_rows)
+    return data
+
+
+def expected_feature_table(data, feature):
+    table = pd.crosstab(data[feature].astype(str), data['prediccion']).reindex(columns=[0, 1], fill_value=0)
+    return table.rename_axis(index=feature, columns='prediccion')
+
+
+def test_merge_matches_direct_groupby():
+    first, second = predicted_population(3000, seed=1), predicted_population(2000, seed=2)
+    # Categorías que solo aparecen en el segundo bloque
+    second = second.astype(object)
+    second.loc[:9, 'Municipio'] = 'Municipio nuevo'
+    data = pd.concat([first.astype(object), second], ignore_index=True)
+
+    cube = ResultsCube.build(first, FEATURES).merge(ResultsCube.build(second, FEATURES))
+    assert cube.total == len(data)
+    assert cube.total_high_risk == int(data['prediccion'].sum())
+
+    for feature in FEATURES:
+        table = cube.feature_table(feature).sort_index()
+        pd.testing.assert_frame_equal(table, expected_feature_table(data, feature), check_dtype=False)
+
+    counts, high = cube.pair_tables('Zona', 'Municipio')
+    grouped = data.astype({'Zona': str, 'Municipio': str}).groupby(['Zona', 'Municipio'])['prediccion']
+    expected_counts = grouped.size().unstack(fill_value=0)
+    expected_high = grouped.sum().unstack(fill_value=0)
+    pd.testing.assert_frame_equal(counts.sort_index().sort_index(axis=1), expected_counts,
+                                  check_dtype=False, check_names=False)
+    pd.testing.assert_frame_equal(high.sort_index().sort_index(axis=1), expected_high,
+                                  check_dtype=False, check_names=False)
+
+
+def test_merge_equals_single_build():
+    first, second = predicted_population(1500, seed=3), predicted_population(1500, seed=4)
+    merged = ResultsCube.build(first, FEATURES).merge(ResultsCube.build(second, FEATURES))
+    single = ResultsCube.build(pd.concat([first.astype(object), second.astype(object)], ignore_index=True),
+                               FEATURES)
+    for feature in FEATURES:
+        pd.testing.assert_frame_equal(merged.feature_table(feature).sort_index(),
+                                      single.feature_table(feature).sort_index())
+    for pair in [('Genero', 'Zona'), ('Municipio', 'Grupo_etario')]:
+        for merged_table, single_table in zip(merged.pair_tables(*pair), single.pair_tables(*pair)):
+            pd.testing.assert_frame_equal(merged_table.sort_index().sort_index(axis=1),
+                                          single_table.sort_index().sort_index(axis=1))
+
+
+def test_bytes_round_trip():
+    cube = ResultsCube.build(predicted_population(1000, seed=5), FEATURES)
+    restored = ResultsCube.from_bytes(cube.to_bytes())
+    assert restored.features == cube.features
+    assert (restored.total, restored.total_high_risk) == (cube.total, cube.total_high_risk)
+    for feature in FEATURES:
+        pd.testing.assert_frame_equal(restored.feature_table(feature), cube.feature_table(feature))
+    for restored_table, table in zip(restored.pair_tables('Genero', 'Municipio'),
+                                     cube.pair_tables('Genero', 'Municipio')):
+        pd.testing.assert_frame_equal(restored_table, table)
+
+
+def test_pairs_over_the_cell_limits_are_skipped(monkeypatch):
+    monkeypatch.setattr(results_cube, 'MAX_PAIR_CELLS', 1000)
+    monkeypatch.setattr(results_cube, 'MAX_TOTAL_PAIR_CELLS', 300)
+    data = predicted_population(2000, seed=6)
+    data['codigo'] = np.arange(len(data)) % 600
+    data['lote'] = np.arange(len(data)) % 40
+
+    cube = ResultsCube.build(data, ['Genero', 'Zona', 'lote', 'codigo'])
+    assert cube.has_pair('Genero', 'Zona') and cube.has_pair('Genero', 'lote')
+    # codigo x cualquiera excede el límite por par; Zona x lote ya no cabe en el total
+    assert not cube.has_pair('Genero', 'codigo')
+    assert not cube.has_pair('Zona', 'lote')
+    assert all(counts.dtype == results_cube.PAIR_DTYPE for counts in cube.pair_counts.values())
+    assert sum(counts.size for counts in cube.pair_counts.values()) <= 300
+
+    # Un par omitido en un bloque queda omitido al combinar
+    first, second = data.iloc[:1000], data.iloc[1000:]
+    merged = ResultsCube.build(first, cube.features).merge(ResultsCube.build(second, cube.features))
+    assert set(merged.pair_counts) == set(cube.pair_counts)
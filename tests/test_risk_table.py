@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from local_model import LocalResponse
+from mock_api import score_frame
+from risk_table import RiskTable, RiskTableManager
+
+MUNICIPIOS = {'ANTIOQUIA': ['MEDELLIN', 'BELLO'], 'VALLE': ['CALI']}
+
+
+class Client:
+    """Tres clases (la última es alto riesgo), con el puntaje determinista de la API simulada."""
+
+    def __init__(self, gate=None):
+        self.gate = gate
+
+    def batch_predict(self, chunk, **kwargs):
+        if self.gate is not None:
+            self.gate.wait(10)
+        high = score_frame(chunk)
+        probabilities = np.column_stack([(1 - high) * 0.75, (1 - high) * 0.25, high])
+        return LocalResponse(predictions=probabilities.argmax(axis=1), probabilities=probabilities)
+
+
+@pytest.fixture(scope='module')
+def table():
+    return RiskTable.build(Client(), 'v1', MUNICIPIOS)
+
+
+def records(table, n_rows=500, seed=0):
+    _, _, grid = RiskTable.grid(MUNICIPIOS)
+    return grid.sample(n_rows, random_state=seed).astype(str).reset_index(drop=True)
+
+
+def test_lookup_matches_the_model(table):
+    assert len(table) == 3 * 5760
+    frame = records(table)
+    found, predictions, probabilities = table.lookup(frame)
+    assert found.all()
+    high = score_frame(frame)
+    np.testing.assert_allclose(probabilities[:, 1], high, rtol=1e-6)  # la última clase, no la segunda
+    expected = np.column_stack([(1 - high) * 0.75, (1 - high) * 0.25, high]).argmax(axis=1)
+    np.testing.assert_array_equal(predictions, expected)
+
+    prediction, probability = table.lookup_record(frame.iloc[0].to_dict())
+    assert prediction == expected[0]
+    assert probability[1] == pytest.approx(high[0], rel=1e-6)
+
+
+def test_unknown_pairs_and_values_miss(table):
+    frame = records(table, n_rows=4)
+    frame.loc[0, ['Departamento', 'Municipio']] = ['VALLE', 'MEDELLIN']  # municipio de otro departamento
+    frame.loc[1, 'Municipio'] = 'PASTO'  # fuera del catálogo de la tabla
+    frame.loc[2, 'Genero'] = 'Otro'
+    found, predictions, _ = table.lookup(frame)
+    np.testing.assert_array_equal(found, [False, False, False, True])
+    assert len(predictions) == 1
+    assert table.lookup_record(frame.iloc[0].to_dict()) is None
+    assert table.lookup_record(frame.iloc[1].to_dict()) is None
+
+
+def test_save_and_load_round_trip(table, tmp_path):
+    path = str(tmp_path / 'tabla.npz')
+    table.save(path)
+    loaded = RiskTable.load(path)
+    assert loaded.version == 'v1'
+    np.testing.assert_array_equal(loaded.predictions, table.predictions)
+    np.testing.assert_array_equal(loaded.probabilities, table.probabilities)
+    frame = records(table, seed=1)
+    for got, expected in zip(loaded.lookup(frame), table.lookup(frame)):
+        np.testing.assert_array_equal(got, expected)
+
+
+def wait_for(manager):
+    deadline = time.time() + 30
+    while manager.building is not None and time.time() < deadline:
+        time.sleep(0.02)
+    assert manager.error is None
+
+
+def test_new_version_keeps_the_old_table_until_rebuilt(tmp_path):
+    manager = RiskTableManager('fuente', str(tmp_path), MUNICIPIOS)
+    assert manager.current('v1') is None
+    manager.build(Client(), 'v1')
+    wait_for(manager)
+    assert manager.current('v1').version == 'v1'
+
+    gate = threading.Event()
+    assert manager.current('v2', Client(gate)) is None
+    assert manager.building == 'v2'
+    # Mientras se calcula la nueva, la anterior sigue en disco y vale para su versión
+    assert RiskTable.load(manager.path).version == 'v1'
+    assert manager.current('v1') is not None
+    manager.current('v2')
+    gate.set()
+    wait_for(manager)
+
+    assert manager.current('v2').version == 'v2'
+    assert RiskTableManager('fuente', str(tmp_path), MUNICIPIOS).current('v2').version == 'v2'
+    assert os.listdir(tmp_path) == [os.path.basename(manager.path)]
+
+
+def test_stale_build_does_not_replace_the_table(tmp_path):
+    manager = RiskTableManager('fuente', str(tmp_path), MUNICIPIOS)
+    manager.build(Client(), 'v1')
+    wait_for(manager)
+
+    gate = threading.Event()
+    manager.current('v2', Client(gate))
+    # /health vuelve a reportar v1 antes de que termine el cálculo de v2
+    assert manager.current('v1').version == 'v1'
+    gate.set()
+    wait_for(manager)
+    assert manager.table.version == 'v1'
+    assert RiskTable.load(manager.path).version == 'v1'
+
+
+def test_failed_build_is_not_retried_on_every_call(tmp_path):
+    class Failing:
+        calls = 0
+
+        def batch_predict(self, chunk, **kwargs):
+            Failing.calls += 1
+            return LocalResponse({'error': 'falla'}, predictions=None)
+
+    manager = RiskTableManager('fuente', str(tmp_path), MUNICIPIOS)
+    manager.build(Client(), 'v1')
+    wait_for(manager)
+
+    manager.current('v2', Failing(), max_retries=0)
+    deadline = time.time() + 10
+    while manager.building is not None and time.time() < deadline:
+        time.sleep(0.02)
+    assert manager.error
+    calls = Failing.calls
+    assert manager.current('v2', Failing()) is None
+    assert manager.building is None and Failing.calls == calls
+    assert manager.current('v1').version == 'v1'
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from session_data import MB, MIN_SPILL_BYTES, SessionFrames
+
+
+def frame_of(n_bytes, seed=0):
+    rng = np.random.default_rng(seed)
+    n_rows = n_bytes // 9  # 8 bytes del float + 1 del código de la categoría
+    return pd.DataFrame({
+        'valor': rng.random(n_rows),
+        'zona': pd.Categorical(rng.choice(['Urbana', 'Rural'], size=n_rows)),
+    })
+
+
+def test_spill_owner_and_reload_round_trip():
+    frames = SessionFrames()
+    frame = frame_of(2 * MB)
+    frames.put('sesion', 'datos', frame)
+    in_memory_before = frames.usage('sesion')[0]
+    assert in_memory_before > 0 and frames.usage('sesion')[1] == 0
+
+    frames.spill_owner('sesion')
+    in_memory, on_disk = frames.usage('sesion')
+    assert in_memory == 0 and on_disk > 0 and frames.spills == 1
+
+    reloaded = frames.get('sesion', 'datos')
+    pd.testing.assert_frame_equal(reloaded, frame)
+    assert frames.reloads == 1
+    # Recargado: cuenta solo en memoria aunque el archivo se conserve
+    assert frames.usage('sesion') == (in_memory_before, 0)
+
+    # Volver a liberarlo no reescribe el archivo
+    frames.spill_owner('sesion')
+    assert frames.usage('sesion') == (0, on_disk)
+
+
+def test_session_budget_spills_least_recently_used():
+    frames = SessionFrames(session_budget=5 * MB)
+    frames.put('sesion', 'a', frame_of(2 * MB, seed=1))
+    frames.put('sesion', 'b', frame_of(2 * MB, seed=2))
+    frames.get('sesion', 'a')  # 'b' queda como la menos reciente
+    frames.put('sesion', 'c', frame_of(2 * MB, seed=3))
+
+    assert frames.spills == 1
+    in_memory, on_disk = frames.usage('sesion')
+    assert on_disk > 0 and in_memory <= 5 * MB
+    pd.testing.assert_frame_equal(frames.get('sesion', 'b'), frame_of(2 * MB, seed=2))
+    # Recargar 'b' libera la menos reciente ('a'); cada DataFrame cuenta en un solo lugar
+    assert frames.spills == 2
+    in_memory, on_disk = frames.usage('sesion')
+    assert in_memory <= 5 * MB
+    # 'b' conserva su archivo, pero solo el de 'a' cuenta en disco
+    assert len(os.listdir(frames.directory)) == 2
+    assert on_disk == os.path.getsize(frames._entries['sesion']['a'].path)
+
+
+def test_small_frames_are_not_spilled_by_budget():
+    frames = SessionFrames(session_budget=0)
+    small = frame_of(MIN_SPILL_BYTES // 4)
+    frames.put('sesion', 'a', small)
+    frames.put('sesion', 'b', small.copy())
+    assert frames.spills == 0
+
+
+def test_process_budget_spans_owners():
+    frames = SessionFrames(process_budget=3 * MB)
+    frames.put('uno', 'datos', frame_of(2 * MB, seed=1))
+    frames.put('dos', 'datos', frame_of(2 * MB, seed=2))
+    assert frames.usage('uno')[0] == 0
+    assert frames.usage('dos')[0] > 0
+
+
+def test_discard_removes_spill_file():
+    frames = SessionFrames()
+    frames.put('sesion', 'datos', frame_of(2 * MB))
+    frames.spill_owner('sesion')
+    assert os.listdir(frames.directory)
+    frames.discard('sesion', 'datos')
+    assert not os.listdir(frames.directory)
+    assert frames.get('sesion', 'datos') is None
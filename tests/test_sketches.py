@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from sketches import HyperLogLog, SpaceSaving
+
+
+def test_hyperloglog_estimate_within_error_bound():
+    values = np.array([f'id-{i}' for i in range(50_000)], dtype=object)
+    sketch = HyperLogLog()
+    for block in np.array_split(np.concatenate([values, values[::2]]), 7):
+        sketch.update(block)
+    assert abs(sketch.estimate() - len(values)) <= 4 * sketch.relative_error * len(values)
+
+
+def test_hyperloglog_small_cardinality_and_merge():
+    left = HyperLogLog().update(['a', 'b', 'c'])
+    right = HyperLogLog().update(['c', 'd'])
+    assert left.estimate() == 3
+    assert left.merge(right).estimate() == 4
+    assert HyperLogLog().estimate() == 0
+
+
+def zipf_values(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.Series(rng.zipf(1.3, size=n) % 500).astype(str).to_numpy(dtype=object)
+
+
+def assert_space_saving_bounds(sketch, values):
+    true_counts = pd.Series(values).value_counts()
+    top = sketch.top()
+    assert sketch.total == len(values)
+    for value, row in top.iterrows():
+        true = true_counts.get(value, 0)
+        assert row['count'] - row['error'] <= true <= row['count']
+    unlisted = true_counts[~true_counts.index.isin(top.index)]
+    assert (unlisted <= sketch.min_count).all()
+
+
+def test_space_saving_bounds_over_blocks():
+    values = zipf_values(20_000, seed=1)
+    sketch = SpaceSaving(k=30)
+    for block in np.array_split(values, 10):
+        sketch.update(block)
+    assert_space_saving_bounds(sketch, values)
+
+
+def test_space_saving_bounds_after_merge():
+    first, second = zipf_values(10_000, seed=2), zipf_values(10_000, seed=3)
+    left, right = SpaceSaving(k=30), SpaceSaving(k=30)
+    for block in np.array_split(first, 5):
+        left.update(block)
+    for block in np.array_split(second, 5):
+        right.update(block)
+    assert_space_saving_bounds(left.merge(right), np.concatenate([first, second]))
+
+
+def test_space_saving_exact_when_few_values():
+    sketch = SpaceSaving(k=10).update(['a', 'b', 'a', 'c', 'a', 'b'])
+    top = sketch.top()
+    assert top['count'].to_dict() == {'a': 3, 'b': 2, 'c': 1}
+    assert (top['error'] == 0).all() and sketch.min_count == 0
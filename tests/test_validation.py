@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from synthetic import generate_population
+from validation import MISSING, OK, UNKNOWN, rejected_rows, validate_batch
+
+
+def batch():
+    data = generate_population(6, seed=21).astype(object)
+    data.loc[1, 'Genero'] = 'X'
+    data.loc[2, 'Municipio'] = None
+    data.loc[3, 'Zona'] = '   '
+    data.loc[4, 'Grupo_etario'] = 'Desconocido'
+    data.loc[4, 'Nivel_Sisben'] = None
+    data.loc[5, 'Genero'] = ' Femenino '  # los espacios sobrantes no invalidan el valor
+    return data
+
+
+def test_valid_mask_and_error_codes():
+    result = validate_batch(batch())
+    np.testing.assert_array_equal(result.valid_mask, [True, False, False, False, False, True])
+    assert result.n_rejected == 4
+    assert result.errors.loc[1, 'Genero'] == UNKNOWN
+    assert result.errors.loc[2, 'Municipio'] == MISSING
+    assert result.errors.loc[3, 'Zona'] == MISSING
+    assert result.errors.loc[4, ['Grupo_etario', 'Nivel_Sisben']].tolist() == [UNKNOWN, MISSING]
+    assert (result.errors.loc[[0, 5]] == OK).all(axis=None)
+
+
+def test_unknown_municipio_is_not_rejected():
+    data = batch().iloc[[0]].copy()
+    data['Municipio'] = 'CUALQUIER MUNICIPIO'
+    assert validate_batch(data).valid_mask.all()
+
+
+def test_summary_and_rejected_rows_report_each_problem():
+    data = batch()
+    result = validate_batch(data)
+    summary = result.summary()
+    assert summary.loc['Genero'].tolist() == [0, 1]
+    assert summary.loc['Zona'].tolist() == [1, 0]
+    assert int(summary.to_numpy().sum()) == 5
+
+    rejected = rejected_rows(data, result)
+    assert list(rejected.index) == [1, 2, 3, 4]
+    assert rejected.loc[1, 'errores'] == 'Genero: fuera de vocabulario'
+    assert rejected.loc[4, 'errores'] == 'Grupo_etario: fuera de vocabulario; Nivel_Sisben: valor faltante'
+    pd.testing.assert_frame_equal(rejected.drop(columns='errores'), data.loc[[1, 2, 3, 4]])
@@ -0,0 +1,59 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic import generate_population
+from wire_format import (ARROW, COLUMNAR_JSON, RECORDS, available_formats, decode_batch, decode_predictions,
+                         encode_batch, encode_predictions, negotiate)
+
+
+class FakeResponse:
+    """Respuesta con la interfaz de ``requests`` (que descomprime el gzip al leer)."""
+
+    def __init__(self, body, headers):
+        self.headers = headers
+        self.content = body
+        if headers.get('Content-Encoding') == 'gzip':
+            self.content = gzip.decompress(body)
+
+    def json(self):
+        return json.loads(self.content)
+
+
+@pytest.mark.parametrize('fmt', available_formats())
+def test_batch_round_trip(fmt):
+    frame = generate_population(200, seed=7)
+    body, headers = encode_batch(frame, fmt)
+    decoded = decode_batch(body, headers['Content-Type'], headers.get('Content-Encoding'))
+    assert list(decoded.columns) == list(frame.columns)
+    pd.testing.assert_frame_equal(decoded.astype(str).reset_index(drop=True),
+                                  frame.astype(str).reset_index(drop=True))
+
+
+@pytest.mark.parametrize('fmt', available_formats())
+def test_predictions_round_trip(fmt):
+    rng = np.random.default_rng(0)
+    predictions = rng.integers(0, 2, size=500)
+    probabilities = rng.random((500, 2))
+    body, headers = encode_predictions(predictions, probabilities, fmt)
+    decoded_predictions, decoded_probabilities = decode_predictions(FakeResponse(body, headers))
+    np.testing.assert_array_equal(np.asarray(decoded_predictions), predictions)
+    tolerance = {ARROW: 1e-6, COLUMNAR_JSON: 1e-6, RECORDS: 0}[fmt]
+    np.testing.assert_allclose(np.asarray(decoded_probabilities, dtype=float), probabilities, atol=tolerance)
+
+
+@pytest.mark.parametrize('fmt', available_formats())
+def test_predictions_without_probabilities(fmt):
+    body, headers = encode_predictions(np.array([0, 1, 1]), None, fmt)
+    predictions, probabilities = decode_predictions(FakeResponse(body, headers))
+    np.testing.assert_array_equal(np.asarray(predictions), [0, 1, 1])
+    assert probabilities is None
+
+
+def test_negotiate_falls_back_to_records():
+    assert negotiate(None) == RECORDS
+    assert negotiate(['formato-desconocido']) == RECORDS
+    assert negotiate([RECORDS, COLUMNAR_JSON]) == COLUMNAR_JSON
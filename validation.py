@@ -0,0 +1,78 @@
+"""Validación vectorizada de lotes contra el vocabulario del modelo.
+
+Cada columna se valida sobre sus valores únicos (códigos de categoría) y el
+resultado se propaga a las filas con un ``take``, así que el costo por fila
+es constante. Los errores se guardan como una matriz de códigos por fila y
+columna; solo las filas sin errores se envían a la API.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from categorical import FEATURE_VOCABULARIES, REQUIRED_COLUMNS, category_codes
+from metrics import timer
+
+OK = 0
+MISSING = 1
+UNKNOWN = 2
+
+ERROR_LABELS = {MISSING: 'valor faltante', UNKNOWN: 'fuera de vocabulario'}
+
+
+@dataclass
+class ValidationResult:
+    errors: pd.DataFrame  # códigos de error (int8) por fila y columna
+
+    @property
+    def valid_mask(self):
+        return (self.errors.to_numpy() == OK).all(axis=1)
+
+    @property
+    def n_rejected(self):
+        return int((~self.valid_mask).sum())
+
+    def summary(self):
+        """Conteo de errores por columna y tipo."""
+        values = self.errors.to_numpy()
+        return pd.DataFrame(
+            {label: (values == code).sum(axis=0) for code, label in ERROR_LABELS.items()},
+            index=pd.Index(self.errors.columns, name='Columna')
+        )
+
+
+def validate_batch(data, columns=REQUIRED_COLUMNS, vocabularies=FEATURE_VOCABULARIES):
+    """Valida cada fila de ``data`` contra los vocabularios del formulario.
+
+    Un valor es inválido si falta (nulo o vacío) o, en las columnas con
+    vocabulario fijo, si no pertenece a él. Las columnas sin vocabulario
+    (``Municipio``) solo se validan por faltantes.
+    """
+    errors = {}
+    with timer('validacion', rows=len(data)):
+        for col in columns:
+            codes, labels = category_codes(data[col])
+            normalized = pd.Index([str(label).strip() for label in labels], dtype=object)
+            status = np.full(len(labels) + 1, MISSING, dtype=np.int8)  # el último cubre el código -1
+            present = normalized != ''
+            status[:-1][present] = OK
+            vocabulary = vocabularies.get(col)
+            if vocabulary is not None:
+                status[:-1][present & ~normalized.isin(vocabulary)] = UNKNOWN
+            errors[col] = status[codes]
+    return ValidationResult(pd.DataFrame(errors, index=data.index))
+
+
+def rejected_rows(data, result):
+    """Filas rechazadas con una columna ``errores`` que describe cada problema."""
+    mask = ~result.valid_mask
+    rejected = data[mask].copy()
+    errors = result.errors[mask]
+    description = np.full(len(rejected), '', dtype=object)
+    for col in errors.columns:
+        codes = errors[col].to_numpy()
+        for code, label in ERROR_LABELS.items():
+            hit = codes == code
+            description[hit] = description[hit] + f"{col}: {label}; "
+    rejected['errores'] = [text.rstrip('; ') for text in description]
+    return rejected
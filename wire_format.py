@@ -0,0 +1,208 @@
+"""Formatos de transmisión para ``/batch_predict``.
+
+- ``records``: el formato original, ``{"records": [{columna: valor, ...}, ...]}``.
+- ``columnar-json``: una entrada por columna con su diccionario de categorías y
+  el arreglo de códigos enteros, comprimido con gzip.
+- ``arrow``: tabla Arrow IPC con columnas dictionary-encoded (requiere
+  ``pyarrow``, que ya instala Streamlit).
+
+El cliente elige el mejor formato que anuncie la API en ``/health``
+(``batch_formats``) y vuelve a ``records`` si la API lo rechaza.
+"""
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+
+from categorical import category_codes
+from metrics import timer
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow es opcional
+    pa = None
+
+RECORDS = 'records'
+COLUMNAR_JSON = 'columnar-json'
+ARROW = 'arrow'
+
+CONTENT_TYPES = {
+    RECORDS: 'application/json',
+    COLUMNAR_JSON: 'application/vnd.salud.columnar+json',
+    ARROW: 'application/vnd.apache.arrow.stream',
+}
+
+
+class UnsupportedFormatError(ValueError):
+    pass
+
+
+def available_formats():
+    """Formatos que este cliente sabe codificar, del más al menos compacto."""
+    formats = [COLUMNAR_JSON, RECORDS]
+    if pa is not None:
+        formats.insert(0, ARROW)
+    return formats
+
+
+def negotiate(server_formats):
+    """Mejor formato común con la API (``records`` si no anuncia ninguno)."""
+    server_formats = set(server_formats or [RECORDS])
+    for fmt in available_formats():
+        if fmt in server_formats:
+            return fmt
+    return RECORDS
+
+
+def format_of(content_type):
+    content_type = (content_type or '').split(';')[0].strip()
+    for fmt, candidate in CONTENT_TYPES.items():
+        if candidate == content_type:
+            return fmt
+    return RECORDS
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+# --- Solicitudes ---
+
+def encode_batch(frame, fmt=RECORDS):
+    """Codifica un bloque; devuelve ``(cuerpo, cabeceras)``."""
+    with timer('serializacion', rows=len(frame)):
+        return _encode_batch(frame, fmt)
+
+
+def _encode_batch(frame, fmt):
+    if fmt == RECORDS:
+        records = frame.astype(object).where(frame.notna(), None).to_dict('records')
+        body = json.dumps({"records": records}, default=_json_default).encode('utf-8')
+        return body, {'Content-Type': CONTENT_TYPES[RECORDS]}
+
+    if fmt == COLUMNAR_JSON:
+        columns = {}
+        for col in frame.columns:
+            codes, labels = category_codes(frame[col])
+            columns[col] = {"categories": [str(label) for label in labels], "codes": codes.tolist()}
+        payload = {"format": COLUMNAR_JSON, "n_rows": len(frame), "columns": columns}
+        body = gzip.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), compresslevel=5)
+        headers = {'Content-Type': CONTENT_TYPES[COLUMNAR_JSON], 'Content-Encoding': 'gzip',
+                   'Accept': CONTENT_TYPES[COLUMNAR_JSON]}
+        return body, headers
+
+    if fmt == ARROW:
+        if pa is None:
+            raise UnsupportedFormatError("pyarrow no está instalado")
+        arrays = []
+        for col in frame.columns:
+            codes, labels = category_codes(frame[col])
+            indices = pa.array(codes.astype(np.int32), mask=codes < 0)
+            dictionary = pa.array([str(label) for label in labels], type=pa.string())
+            arrays.append(pa.DictionaryArray.from_arrays(indices, dictionary))
+        table = pa.Table.from_arrays(arrays, names=[str(col) for col in frame.columns])
+        return _arrow_bytes(table), {'Content-Type': CONTENT_TYPES[ARROW], 'Accept': CONTENT_TYPES[ARROW]}
+
+    raise UnsupportedFormatError(f"Formato desconocido: {fmt}")
+
+
+def decode_batch(body, content_type, content_encoding=None):
+    """Inverso de ``encode_batch`` (usado por la API simulada): DataFrame."""
+    if content_encoding == 'gzip':
+        body = gzip.decompress(body)
+    fmt = format_of(content_type)
+
+    if fmt == RECORDS:
+        return pd.DataFrame(json.loads(body)["records"])
+
+    if fmt == COLUMNAR_JSON:
+        payload = json.loads(body)
+        data = {}
+        for col, encoded in payload["columns"].items():
+            data[col] = pd.Categorical.from_codes(encoded["codes"], categories=encoded["categories"])
+        return pd.DataFrame(data, index=pd.RangeIndex(payload["n_rows"]))
+
+    if pa is None:
+        raise UnsupportedFormatError("pyarrow no está instalado")
+    with pa.ipc.open_stream(body) as reader:
+        return reader.read_all().to_pandas()
+
+
+# --- Respuestas ---
+
+def encode_predictions(predictions, probabilities, fmt=RECORDS):
+    """Codifica ``predictions``/``probabilities``; devuelve ``(cuerpo, cabeceras)``."""
+    predictions = np.asarray(predictions, dtype=np.int64)
+    if fmt == ARROW and pa is not None:
+        arrays = [pa.array(predictions.astype(np.int8))]
+        names = ['prediction']
+        if probabilities is not None:
+            probabilities = np.asarray(probabilities, dtype=np.float32)
+            for k in range(probabilities.shape[1]):
+                arrays.append(pa.array(probabilities[:, k]))
+                names.append(f'probability_{k}')
+        table = pa.Table.from_arrays(arrays, names=names)
+        return _arrow_bytes(table), {'Content-Type': CONTENT_TYPES[ARROW]}
+
+    if fmt == COLUMNAR_JSON:
+        payload = {"format": COLUMNAR_JSON, "predictions": predictions.tolist()}
+        if probabilities is not None:
+            payload["probabilities"] = {"columns": np.asarray(probabilities).T.round(6).tolist()}
+        body = gzip.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), compresslevel=5)
+        return body, {'Content-Type': CONTENT_TYPES[COLUMNAR_JSON], 'Content-Encoding': 'gzip'}
+
+    payload = {"predictions": predictions.tolist()}
+    if probabilities is not None:
+        payload["probabilities"] = np.asarray(probabilities).tolist()
+    return json.dumps(payload).encode('utf-8'), {'Content-Type': CONTENT_TYPES[RECORDS]}
+
+
+def decode_predictions(response):
+    """Lee la respuesta de ``/batch_predict`` en cualquiera de los formatos.
+
+    Devuelve ``(predicciones, probabilidades)``; las probabilidades pueden
+    ser ``None`` si la API no las incluye.
+    """
+    with timer('deserializacion'):
+        return _decode_predictions(response)
+
+
+def _decode_predictions(response):
+    # Respuestas del modelo local (``local_model``): ya son arreglos
+    arrays = getattr(response, 'arrays', None)
+    if arrays is not None:
+        return arrays
+
+    fmt = format_of(response.headers.get('Content-Type'))
+
+    if fmt == ARROW:
+        if pa is None:
+            raise UnsupportedFormatError("pyarrow no está instalado")
+        with pa.ipc.open_stream(response.content) as reader:
+            table = reader.read_all()
+        predictions = table.column('prediction').to_numpy()
+        prob_columns = [name for name in table.column_names if name.startswith('probability_')]
+        probabilities = None
+        if prob_columns:
+            probabilities = np.column_stack([table.column(name).to_numpy() for name in prob_columns])
+        return predictions, probabilities
+
+    # requests ya descomprime el Content-Encoding gzip
+    result = response.json()
+    probabilities = result.get('probabilities')
+    if fmt == COLUMNAR_JSON and probabilities is not None:
+        probabilities = np.asarray(probabilities["columns"], dtype=float).T
+    return result.get('predictions', []), probabilities
+
+
+def _arrow_bytes(table):
+    options = None
+    if pa.Codec.is_available('zstd'):
+        options = pa.ipc.IpcWriteOptions(compression='zstd')
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()